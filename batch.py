@@ -0,0 +1,150 @@
+from contextlib import ExitStack, asynccontextmanager
+from dataclasses import dataclass, field, asdict
+from pathlib import Path
+from typing import AsyncIterator
+import asyncio
+import time
+
+from pydantic_ai.models.wrapper import WrapperModel
+
+from fred_client import fred_request_limit
+from fred_scheduler import Priority, fred_priority
+from orchestrator import resolve_series, load_series, generate_and_execute_sql
+from resolution_cache import normalize_question
+from search_agent import keyword_agent, series_picker_agent
+from query_agent import sql_agent, answer_agent
+from single_flight import SingleFlight
+
+import logfire
+
+BATCH_LLM_CONCURRENCY = 2       # Model requests in flight at once across the batch
+BATCH_FRED_CONCURRENCY = 4      # FRED API requests in flight at once across the batch
+BATCH_AGENTS = [keyword_agent, series_picker_agent, sql_agent, answer_agent]
+
+
+@dataclass
+class QuestionResult:
+    index: int
+    question: str
+    answer: str | None = None
+    series_id: str | None = None
+    error: str | None = None
+    timings: dict[str, float] = field(default_factory=dict)   # stage -> seconds
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+
+class LimitedModel(WrapperModel):
+    """Model wrapper that holds a semaphore slot for the duration of every request"""
+
+    def __init__(self, wrapped, slots: asyncio.Semaphore):
+        super().__init__(wrapped)
+        self.slots = slots
+
+    async def request(self, messages, model_settings, model_request_parameters):
+        async with self.slots:
+            return await super().request(messages, model_settings, model_request_parameters)
+
+    @asynccontextmanager
+    async def request_stream(self, messages, model_settings, model_request_parameters, run_context=None):
+        async with self.slots:
+            async with super().request_stream(messages, model_settings, model_request_parameters, run_context) as response:
+                yield response
+
+
+async def answer_question(
+    index: int,
+    question: str,
+    llm_slots: asyncio.Semaphore,
+    fred_slots: asyncio.Semaphore,
+    flights: SingleFlight,
+) -> QuestionResult:
+    """
+    Answer one question of a batch, sharing series resolution and loading with the rest of the batch.
+
+    Args:
+        index (int): Position of the question in the batch
+        question (str): The user question
+        llm_slots (asyncio.Semaphore): Limits model requests across the batch
+        fred_slots (asyncio.Semaphore): Limits FRED API requests across the batch
+        flights (SingleFlight): Work shared between the questions of the batch
+
+    Returns:
+        QuestionResult: The answer, or the error, with per-stage timings
+    """
+    result = QuestionResult(index=index, question=question)
+    # Limits are set per task, so they apply to everything the task runs without leaking to the caller
+    fred_request_limit.set(fred_slots)
+    # Batch questions yield FRED's rate limit to interactive ones
+    fred_priority.set(Priority.BATCH)
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        for agent in BATCH_AGENTS:
+            stack.enter_context(agent.override(model=LimitedModel(agent.model, llm_slots)))
+        try:
+            stage_start = time.perf_counter()
+            series = await flights.run(f"resolve:{normalize_question(question) or question}", lambda: resolve_series(question))
+            result.timings["resolve"] = time.perf_counter() - stage_start
+            if series is None:
+                result.error = "No series chosen"
+                return result
+            result.series_id = series["id"]
+
+            stage_start = time.perf_counter()
+            database_info = await flights.run(f"load:{series['id']}", lambda: load_series(series["id"]))
+            result.timings["load"] = time.perf_counter() - stage_start
+            if database_info is None:
+                result.error = f"Could not load series {series['id']}"
+                return result
+
+            stage_start = time.perf_counter()
+            result.answer = await generate_and_execute_sql(database_info, question)
+            result.timings["answer"] = time.perf_counter() - stage_start
+        except Exception as e:
+            logfire.error(f"Batch question {index} failed: {e}")
+            result.error = str(e)
+        finally:
+            result.timings["total"] = time.perf_counter() - start
+    return result
+
+
+async def run_batch(
+    questions: list[str],
+    llm_concurrency: int = BATCH_LLM_CONCURRENCY,
+    fred_concurrency: int = BATCH_FRED_CONCURRENCY,
+) -> AsyncIterator[QuestionResult]:
+    """
+    Answer many questions concurrently, yielding results as they complete.
+
+    Questions that resolve to the same series share one keyword search, one observation
+    pull and one ingest: identical keyword searches and series loads that overlap in
+    time are collapsed into a single call, and later ones hit the caches and the series store.
+
+    Args:
+        questions (list[str]): The user questions
+        llm_concurrency (int): Maximum model requests in flight at once
+        fred_concurrency (int): Maximum FRED API requests in flight at once
+
+    Yields:
+        QuestionResult: One result per question, in order of completion
+    """
+    llm_slots = asyncio.Semaphore(llm_concurrency)
+    fred_slots = asyncio.Semaphore(fred_concurrency)
+    flights = SingleFlight()
+    tasks = [
+        asyncio.create_task(answer_question(i, question, llm_slots, fred_slots, flights))
+        for i, question in enumerate(questions)
+    ]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def read_questions(path: Path) -> list[str]:
+    """Read one question per line, skipping blank lines and # comments"""
+    with open(path, "r") as f:
+        return [line.strip() for line in f if line.strip() and not line.lstrip().startswith("#")]
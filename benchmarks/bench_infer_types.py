@@ -0,0 +1,45 @@
+"""
+Compare per-column type inference (process_data.infer_type) with the single-pass
+batched engine (process_data.infer_types) on the fixture CSVs in tests/.
+
+Run from the repository root:
+
+    python benchmarks/bench_infer_types.py --repeat 50
+"""
+from pathlib import Path
+import argparse
+import timeit
+import csv
+import sys
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from process_data import infer_type, infer_types
+
+FIXTURES = sorted((ROOT / "tests").glob("*.csv"))
+
+
+def per_column(headers: list[str], rows: list[list[str]]) -> dict:
+    """The inference get_csv_schema did before infer_types: one infer_type call per column"""
+    return {header: infer_type([row[i] for row in rows if i < len(row)]) for i, header in enumerate(headers)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    for path in FIXTURES:
+        with open(path, "r", newline="") as f:
+            reader = csv.reader(f)
+            headers = next(reader)
+            rows = list(reader)
+        print(f"{path.name}: {len(rows)} rows x {len(headers)} columns")
+        for name, infer in [("infer_type", per_column), ("infer_types", infer_types)]:
+            best = min(timeit.repeat(lambda: infer(headers, rows), number=1, repeat=args.repeat))
+            print(f"  {name:>12}: {best * 1e3:.2f} ms best of {args.repeat}, {len(rows) * len(headers) / best / 1e6:.2f}M values/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Compare extract-then-read ingestion (process_data.zipfile_to_csv + series_store.ingest_csv)
+with streaming ingestion (series_store.ingest_zip) on a synthetic multi-vintage FRED zip.
+
+Run from the repository root:
+
+    python benchmarks/bench_ingest.py --rows 1000000 --vintages 4
+"""
+from datetime import date, timedelta
+from pathlib import Path
+import argparse
+import tempfile
+import zipfile
+import random
+import time
+import sys
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from process_data import zipfile_to_csv
+from series_store import ingest_csv, ingest_zip, connect
+
+SERIES_ID = "BENCH"
+
+
+def make_zip(zip_path: Path, rows: int, vintages: int) -> None:
+    """Write a zip with one "obs. by real-time period" CSV per vintage, `rows` rows in total"""
+    start = date(1950, 1, 1)
+    rows_per_vintage = rows // vintages
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        for v in range(vintages):
+            realtime_start = (date(2020, 1, 1) + timedelta(days=30 * v)).isoformat()
+            lines = [f"period_start_date,{SERIES_ID},realtime_start_date,realtime_end_date\n"]
+            for i in range(rows_per_vintage):
+                value = f"{random.uniform(0, 10):.2f}" if i % 50 else "."
+                lines.append(f"{start + timedelta(days=i)},{value},{realtime_start},\n")
+            zip_ref.writestr(f"obs._by_real-time_period_{v}.csv", "".join(lines))
+
+
+def extract_then_read(zip_path: Path, work_dir: Path) -> None:
+    db_path = work_dir / "extract.duckdb"
+    for i, csv_path in enumerate(zipfile_to_csv(zip_path, work_dir / "csv")):
+        if i == 0:
+            ingest_csv(csv_path, SERIES_ID, db_path)
+        else:
+            connect(db_path).execute("INSERT INTO bench SELECT * FROM read_csv(?, header = true, nullstr = ['', '.'])", [str(csv_path)])
+
+
+def stream(zip_path: Path, work_dir: Path) -> None:
+    ingest_zip(zip_path, SERIES_ID, work_dir / "stream.duckdb")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--vintages", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp_dir = Path(tmp)
+        zip_path = tmp_dir / f"{SERIES_ID}.zip"
+        make_zip(zip_path, args.rows, args.vintages)
+        print(f"{args.rows} rows in {args.vintages} vintages, zip {zip_path.stat().st_size / 1e6:.1f} MB")
+        for name, ingest in [("extract-then-read", extract_then_read), ("stream", stream)]:
+            timings = []
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                ingest(zip_path, tmp_dir)
+                timings.append(time.perf_counter() - start)
+            best = min(timings)
+            print(f"{name:>18}: {best:.3f}s best of {args.repeat}, {args.rows / best / 1e6:.2f}M rows/s")
+
+
+if __name__ == "__main__":
+    main()
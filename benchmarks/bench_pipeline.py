@@ -0,0 +1,334 @@
+"""
+Benchmark the question pipeline end to end without FRED or Ollama.
+
+A local stand-in FRED server serves series/search results, observation zips
+generated on the fly and empty incremental updates, and every agent's model is
+replaced by a FunctionModel that answers after a fixed latency. Questions run
+through the orchestrator's own stages (resolve_series, load_series and
+generate_and_execute_sql) over a grid of series sizes and concurrency levels.
+
+Each series is asked about three times: an average, which the SQL templates
+answer, a median, which needs the SQL and answer agents, and the average again,
+which is served by the resolution cache and an incremental pull. Series are named
+with distinct code words as well as ids, so that no question is close enough to
+another series' question for the resolution cache to mix them up. Every question
+is timed per orchestrator stage, and the finer stages recorded by metrics.stage,
+e.g. keyword gen, search, pick, download, ingest, sql gen and execute, are
+reported as means, with how often the fast paths were taken. Questions that fail,
+or resolve to the wrong series, are reported and make the exit status 1.
+
+Run from the repository root:
+
+    python benchmarks/bench_pipeline.py --rows 1000 100000 --concurrency 1 8 -o results.json
+    python benchmarks/bench_pipeline.py --compare results.json
+
+Results are written as JSON with one entry per (rows, concurrency) run, so runs of
+different commits can be compared with --compare.
+"""
+from contextlib import ExitStack
+from datetime import date, timedelta
+from pathlib import Path
+import statistics
+import argparse
+import tempfile
+import zipfile
+import asyncio
+import random
+import json
+import time
+import sys
+import io
+import os
+import re
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from tests.fred_stub import FredStub
+
+STAGES = ["resolve", "load", "answer"]
+QUESTION_SHAPES = [
+    "What was the average value of the {name} benchmark series {series_id}?",     # SQL template
+    "What was the median value of the {name} benchmark series {series_id}?",      # SQL and answer agents
+    "What was the average value of the {name} benchmark series {series_id}?",     # Resolution cache and incremental pull
+]
+CODE_WORDS = [
+    "alfa", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel", "india", "juliett", "kilo", "lima", "mike",
+    "november", "oscar", "papa", "quebec", "romeo", "sierra", "tango", "uniform", "victor", "whiskey", "xray", "yankee", "zulu",
+]
+
+
+def series_name(index: int) -> str:
+    """Code words spelling an index in base 26, e.g. "bravo bravo" for 27"""
+    words = []
+    while True:
+        index, digit = divmod(index, len(CODE_WORDS))
+        words.append(CODE_WORDS[digit])
+        if not index:
+            return " ".join(words)
+
+
+def make_observations_csv(rows: int) -> str:
+    """Body of an "obs. by real-time period" CSV with `rows` current observations, without the header"""
+    start = date(1950, 1, 1)
+    lines = []
+    for i in range(rows):
+        value = f"{random.uniform(0, 10):.2f}" if i % 50 else "."
+        lines.append(f"{start + timedelta(days=i)},{value},2020-01-01,\n")
+    return "".join(lines)
+
+
+def make_zip(series_id: str, body: str) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        header = f"period_start_date,{series_id},realtime_start_date,realtime_end_date\n"
+        zip_ref.writestr("obs._by_real-time_period.csv", header + body)
+    return buffer.getvalue()
+
+
+def start_fred(rows_by_series: dict[str, int], names: dict[str, str]) -> FredStub:
+    """Serve search results naming the series in the search text, and zips of the configured size"""
+    bodies = {rows: make_observations_csv(rows) for rows in set(rows_by_series.values())}
+    stub = FredStub()
+
+    def search(params: dict) -> dict:
+        series_id = params["search_text"].split()[-1]
+        title = f"{names[series_id].title()} benchmark series {series_id}"
+        return {"seriess": [{"id": series_id, "title": title, "frequency_short": "D", "popularity": 1}]}
+
+    stub.route("series/search", search)
+
+    def observations(params: dict):
+        if params.get("file_type") == "json":
+            return {"observations": []}     # Incremental pulls find nothing new
+        return make_zip(params["series_id"], bodies[rows_by_series[params["series_id"]]])
+
+    stub.route("series/observations", observations)
+    stub.start()
+    return stub
+
+
+def _prompt_text(messages) -> str:
+    return "\n".join(
+        part.content for message in messages for part in message.parts
+        if part.part_kind in ("system-prompt", "user-prompt") and isinstance(part.content, str)
+    )
+
+
+def stub_models(latency: float) -> dict:
+    """FunctionModels standing in for each agent's model, answering after `latency` seconds"""
+    from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart
+    from pydantic_ai.models.function import FunctionModel
+
+    async def keywords(messages, info):
+        await asyncio.sleep(latency)
+        series_id = re.search(r"benchmark series (\w+)", _prompt_text(messages)).group(1)
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, {"keywords": [f"benchmark series {series_id}"]})])
+
+    async def pick(messages, info):
+        await asyncio.sleep(latency)
+        match = re.search(r"title: (.+)\n\t- id: (\w+)", _prompt_text(messages))
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, {"title": match.group(1), "id": match.group(2)})])
+
+    async def sql(messages, info):
+        await asyncio.sleep(latency)
+        prompt = _prompt_text(messages)
+        relation_name = re.search(r"The table name is (\w+)", prompt).group(1)
+        series_id = re.search(r"benchmark series (\w+)", prompt).group(1)
+        return ModelResponse(parts=[TextPart(f'SELECT MEDIAN("{series_id}") FROM {relation_name}')])
+
+    async def answer(messages, info):
+        await asyncio.sleep(latency)
+        result = re.search(r"Result: (.+)", _prompt_text(messages)).group(1)
+        return ModelResponse(parts=[TextPart(f"The median is {result}")])
+
+    return {
+        "keyword": FunctionModel(keywords),
+        "pick": FunctionModel(pick),
+        "sql": FunctionModel(sql),
+        "answer": FunctionModel(answer),
+    }
+
+
+async def answer(question: str, series_id: str, timings: dict[str, list[float]]) -> None:
+    from orchestrator import resolve_series, load_series, generate_and_execute_sql
+
+    stage_start = time.perf_counter()
+
+    def lap(stage: str) -> None:
+        nonlocal stage_start
+        now = time.perf_counter()
+        timings[stage].append(now - stage_start)
+        stage_start = now
+
+    series = await resolve_series(question)
+    if series is None or series["id"] != series_id:
+        raise RuntimeError(f"{question!r} resolved to {series and series['id']}")
+    lap("resolve")
+    database_info = await load_series(series["id"])
+    lap("load")
+    if await generate_and_execute_sql(database_info, question) is None:
+        raise RuntimeError(f"No answer to {question!r}")
+    lap("answer")
+
+
+def summarize(durations: list[float]) -> dict:
+    ordered = sorted(durations)
+    return {
+        "count": len(ordered),
+        "mean": statistics.fmean(ordered),
+        "p50": ordered[len(ordered) // 2],
+        "p95": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+        "max": ordered[-1],
+    }
+
+
+def stage_means(snapshot: dict) -> dict[str, float]:
+    """Mean seconds of every stage timed by metrics.stage, over all its labels"""
+    totals: dict[str, list[float]] = {}
+    for item in snapshot["histograms"].get("stage_seconds", []):
+        total = totals.setdefault(item["labels"]["stage"], [0.0, 0])
+        total[0] += item["sum"]
+        total[1] += item["count"]
+    return {stage: seconds / count for stage, (seconds, count) in totals.items() if count}
+
+
+def outcomes(snapshot: dict, name: str) -> dict[str, float]:
+    return {item["labels"]["outcome"]: item["value"] for item in snapshot["counters"].get(name, [])}
+
+
+async def run(rows: int, concurrency: int, names: dict[str, str], stub: FredStub) -> dict:
+    from metrics import metrics
+
+    metrics.reset()
+    timings = {stage: [] for stage in STAGES}
+    failures = []
+    slots = asyncio.Semaphore(concurrency)
+    series_ids = list(names)
+    requests_before = len(stub.requests)
+
+    async def ask(series_id: str) -> None:
+        # The questions about one series run in order, so the later ones find its resolution and table
+        for shape in QUESTION_SHAPES:
+            question = shape.format(name=names[series_id], series_id=series_id)
+            async with slots:
+                try:
+                    await answer(question, series_id, timings)
+                except Exception as e:
+                    failures.append({"question": question, "error": f"{type(e).__name__}: {e}"})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(ask(series_id) for series_id in series_ids))
+    wall = time.perf_counter() - start
+    snapshot = metrics.snapshot()
+    means = stage_means(snapshot)
+    asked = len(series_ids) * len(QUESTION_SHAPES)
+    observation_requests = [params for endpoint, params in stub.requests[requests_before:] if endpoint == "series/observations"]
+    return {
+        "rows": rows,
+        "concurrency": concurrency,
+        "questions": asked,
+        "failures": failures,
+        "wall": wall,
+        "throughput": asked / wall,                # questions per second
+        "rows_per_second": rows / means["ingest"] if means.get("ingest") else None,
+        "stages": {stage: summarize(durations) for stage, durations in timings.items()},
+        "stage_means": means,
+        "fast_path": outcomes(snapshot, "fast_path_total"),
+        "resolution_cache": outcomes(snapshot, "resolution_cache_total"),
+        "downloads": {
+            "full": sum(1 for params in observation_requests if params.get("file_type") != "json"),
+            "incremental": sum(1 for params in observation_requests if params.get("file_type") == "json"),
+        },
+    }
+
+
+def print_run(result: dict, baseline: dict | None = None) -> None:
+    print(f"rows={result['rows']} concurrency={result['concurrency']}: "
+          f"{result['throughput']:.2f} questions/s over {result['questions']} questions")
+    for stage, stats in result["stages"].items():
+        line = f"  {stage:>12}: p50 {stats['p50'] * 1000:8.1f} ms  p95 {stats['p95'] * 1000:8.1f} ms"
+        baseline_p50 = baseline["stages"].get(stage, {}).get("p50") if baseline is not None else None
+        if baseline_p50:
+            line += f"  ({stats['p50'] / baseline_p50:.2f}x baseline p50)"
+        print(line)
+    print("  stage means: " + ", ".join(f"{stage} {seconds * 1000:.1f} ms" for stage, seconds in result["stage_means"].items()))
+    print(f"  fast path: {result['fast_path']}, resolution cache: {result['resolution_cache']}, downloads: {result['downloads']}")
+    for failure in result["failures"]:
+        print(f"  failed: {failure['question']} ({failure['error']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="Observations per series")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16], help="Questions in flight at once")
+    parser.add_argument("--questions", type=int, default=16, help="Series per run, each asked about once per question shape")
+    parser.add_argument("--model-latency", type=float, default=0.05, help="Seconds each stub model takes to answer")
+    parser.add_argument("-o", "--output", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Results JSON of an earlier run to compare against")
+    args = parser.parse_args()
+
+    output = Path(args.output).resolve() if args.output else None
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {(run["rows"], run["concurrency"]): run for run in json.load(f)["runs"]}
+
+    grid = [(rows, concurrency) for rows in args.rows for concurrency in args.concurrency]
+    names_by_run = [{f"R{run_id}Q{i}": series_name(run_id * args.questions + i) for i in range(args.questions)} for run_id in range(len(grid))]
+    names = {series_id: name for run_names in names_by_run for series_id, name in run_names.items()}
+    rows_by_series = {series_id: rows for (rows, _), run_names in zip(grid, names_by_run) for series_id in run_names}
+    stub = start_fred(rows_by_series, names)
+    original_dir = Path.cwd()
+    work_dir = tempfile.TemporaryDirectory()
+    # The pipeline keeps its caches and store under data/ relative to the working directory
+    # and reads its configuration at import time, so both are set up before importing it
+    os.chdir(work_dir.name)
+    Path("md_output").mkdir()
+    os.environ.update({
+        "FRED_API_URL": stub.url,
+        "FRED_API_KEY": "benchmark",
+        "OLLAMA_BASE_URL": "http://127.0.0.1:9/v1",
+        "LOGFIRE_SEND_TO_LOGFIRE": "false",
+        "LOGFIRE_CONSOLE": "false",
+    })
+    # The stand-in FRED does not throttle, so the rate limit would only measure itself
+    os.environ.setdefault("FRED_RATE_LIMIT", "0")
+    from search_agent import keyword_agent, series_picker_agent
+    from query_agent import sql_agent, answer_agent
+
+    models = stub_models(args.model_latency)
+    results = []
+    try:
+        with ExitStack() as stack:
+            stack.enter_context(keyword_agent.override(model=models["keyword"]))
+            stack.enter_context(series_picker_agent.override(model=models["pick"]))
+            stack.enter_context(sql_agent.override(model=models["sql"]))
+            stack.enter_context(answer_agent.override(model=models["answer"]))
+            for (rows, concurrency), run_names in zip(grid, names_by_run):
+                result = asyncio.run(run(rows, concurrency, run_names, stub))
+                results.append(result)
+                print_run(result, baseline.get((rows, concurrency)))
+    finally:
+        stub.stop()
+        os.chdir(original_dir)
+        work_dir.cleanup()
+
+    if output:
+        report = {
+            "meta": {
+                "python": sys.version.split()[0],
+                "model_latency": args.model_latency,
+                "questions": args.questions,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "runs": results,
+        }
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {output}")
+    if any(result["failures"] for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
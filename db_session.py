@@ -0,0 +1,125 @@
+from contextlib import contextmanager
+from pathlib import Path
+import threading
+import queue
+import duckdb
+import logfire
+
+SERIES_DB_PATH = Path("data/fred.duckdb")
+SESSION_POOL_SIZE = 4           # Concurrent agent runs that can query at once
+RESULTS_DATABASE = "results"    # In-memory database attached to every session, holding query results kept by result_shaping
+
+_sessions: dict[Path, "DuckDBSession"] = {}
+_sessions_lock = threading.Lock()
+
+
+class DuckDBSession:
+    """
+    Long-lived DuckDB connection to the series store with a small pool of cursors.
+
+    DuckDB connections are not safe to share between threads, so each query borrows
+    its own cursor from the pool and returns it afterwards. Views registered through
+    the session are created once and remembered for the lifetime of the process.
+    An in-memory database named RESULTS_DATABASE is attached for tables that every
+    cursor can read but that should not be written to the database file.
+
+    Parameters
+    ----------
+    db_path : Path
+        Path to the DuckDB database file
+    pool_size : int, optional
+        Maximum number of cursors handed out at once. Defaults to SESSION_POOL_SIZE
+    """
+
+    def __init__(self, db_path: Path, pool_size: int = SESSION_POOL_SIZE):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.connection = duckdb.connect(self.db_path)
+        self.connection.execute(f"ATTACH ':memory:' AS {RESULTS_DATABASE}")
+        self.pool_size = pool_size
+        self._cursors: queue.LifoQueue[duckdb.DuckDBPyConnection] = queue.LifoQueue()
+        self._created = 0
+        self._views: set[str] = set()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def cursor(self):
+        """Borrow a cursor from the pool, blocking while all of them are in use"""
+        with self._lock:
+            if self._cursors.empty() and self._created < self.pool_size:
+                self._cursors.put(self.connection.cursor())
+                self._created += 1
+        cursor = self._cursors.get()
+        try:
+            yield cursor
+        finally:
+            self._cursors.put(cursor)
+
+    def execute(self, sql: str, parameters: list | None = None) -> list[tuple]:
+        """
+        Run a query on a pooled cursor and fetch all rows
+
+        Parameters
+        ----------
+        sql : str
+            SQL query
+        parameters : list, optional
+            Prepared statement parameters
+
+        Returns
+        -------
+        list[tuple]
+            Result rows
+        """
+        with self.cursor() as cursor:
+            return cursor.execute(sql, parameters).fetchall()
+
+    def register_view(self, view_name: str, select_sql: str) -> str:
+        """
+        Create a view once per session
+
+        Parameters
+        ----------
+        view_name : str
+            Name of the view
+        select_sql : str
+            SELECT statement the view is defined as
+
+        Returns
+        -------
+        str
+            Name of the view
+        """
+        with self._lock:
+            if view_name in self._views:
+                return view_name
+            self.connection.execute(f"CREATE OR REPLACE VIEW {view_name} AS {select_sql}")
+            self._views.add(view_name)
+        logfire.info(f"Registered view {view_name}")
+        return view_name
+
+    def close(self) -> None:
+        self.connection.close()
+
+
+def get_session(db_path: Path = SERIES_DB_PATH) -> DuckDBSession:
+    """
+    Get the process-wide session for a database file
+
+    Parameters
+    ----------
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    DuckDBSession
+        Session shared by every caller using the same file
+    """
+    db_path = Path(db_path)
+    with _sessions_lock:
+        session = _sessions.get(db_path)
+        if session is None:
+            session = DuckDBSession(db_path)
+            _sessions[db_path] = session
+    return session
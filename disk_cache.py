@@ -0,0 +1,134 @@
+from pathlib import Path
+import threading
+import sqlite3
+import json
+import time
+
+
+class DiskCache:
+    """
+    Persistent key/value cache stored in a SQLite file.
+
+    Entries expire after `ttl` seconds. Expired entries younger than `ttl + stale_ttl`
+    are still returned, flagged as stale, so callers can serve them while refreshing
+    in the background. Once more than `max_entries` are stored, the least recently
+    used entries are evicted.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the SQLite file. Parent directories are created on first use.
+    ttl : float
+        Seconds an entry stays fresh
+    max_entries : int
+        Maximum number of entries kept on disk
+    stale_ttl : float, optional
+        Seconds after expiry during which a stale entry may still be served. Defaults to 0 (disabled)
+    clock : Callable[[], float], optional
+        Time source, mainly for tests. Defaults to time.time
+    """
+
+    def __init__(self, path: Path, ttl: float, max_entries: int, stale_ttl: float = 0, clock=time.time):
+        self.path = Path(path)
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.stale_ttl = stale_ttl
+        self.clock = clock
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, created REAL NOT NULL, accessed REAL NOT NULL)"
+            )
+        return self._conn
+
+    def get(self, key: str) -> tuple[object, bool] | None:
+        """
+        Look up a key
+
+        Parameters
+        ----------
+        key : str
+            Cache key
+
+        Returns
+        -------
+        tuple[object, bool] | None
+            The cached value and whether it is still fresh, or None on a miss
+        """
+        now = self.clock()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT value, created FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl + self.stale_ttl:
+                self.misses += 1
+                return None
+            conn.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        fresh = now - row[1] <= self.ttl
+        if fresh:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return json.loads(row[0]), fresh
+
+    def set(self, key: str, value: object) -> None:
+        """
+        Store a JSON-serializable value, evicting least recently used entries if over capacity
+
+        Parameters
+        ----------
+        key : str
+            Cache key
+        value : object
+            JSON-serializable value to store
+        """
+        now = self.clock()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created, accessed) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), now, now),
+            )
+            conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def items(self) -> list[tuple[str, object]]:
+        """
+        All entries that can still be served, fresh or stale, without touching their LRU position
+
+        Returns
+        -------
+        list[tuple[str, object]]
+            (key, value) pairs
+        """
+        oldest = self.clock() - self.ttl - self.stale_ttl
+        with self._lock:
+            rows = self._connect().execute("SELECT key, value FROM cache WHERE created >= ?", (oldest,)).fetchall()
+        return [(key, json.loads(value)) for key, value in rows]
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self) -> dict:
+        """Hit, stale hit and miss counts since this cache was created"""
+        return {"hits": self.hits, "stale_hits": self.stale_hits, "misses": self.misses}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connect().execute("DELETE FROM cache")
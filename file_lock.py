@@ -0,0 +1,86 @@
+from contextlib import asynccontextmanager, contextmanager
+from pathlib import Path
+import asyncio
+import time
+import os
+
+if os.name == "nt":
+    import msvcrt
+
+    def _try_lock(fd: int) -> bool:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            return False
+
+    def _unlock(fd: int) -> None:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+else:
+    import fcntl
+
+    def _try_lock(fd: int) -> bool:
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except BlockingIOError:
+            return False
+
+    def _unlock(fd: int) -> None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+
+LOCK_POLL_INTERVAL = 0.05
+
+
+def _open_lock_file(path: Path) -> int:
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    return os.open(path, os.O_CREAT | os.O_RDWR)
+
+
+@contextmanager
+def file_lock(path: Path, poll_interval: float = LOCK_POLL_INTERVAL):
+    """
+    Hold an exclusive lock on a lock file, shared across processes
+
+    Parameters
+    ----------
+    path : Path
+        Path to the lock file. Created if missing and left in place afterwards.
+    poll_interval : float, optional
+        Seconds between attempts while another process holds the lock
+    """
+    fd = _open_lock_file(path)
+    try:
+        while not _try_lock(fd):
+            time.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
+
+
+@asynccontextmanager
+async def async_file_lock(path: Path, poll_interval: float = LOCK_POLL_INTERVAL):
+    """
+    Hold an exclusive lock on a lock file, shared across processes, without blocking the event loop
+
+    Parameters
+    ----------
+    path : Path
+        Path to the lock file. Created if missing and left in place afterwards.
+    poll_interval : float, optional
+        Seconds between attempts while another process holds the lock
+    """
+    fd = _open_lock_file(path)
+    try:
+        while not _try_lock(fd):
+            await asyncio.sleep(poll_interval)
+        try:
+            yield
+        finally:
+            _unlock(fd)
+    finally:
+        os.close(fd)
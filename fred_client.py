@@ -0,0 +1,147 @@
+from dotenv import load_dotenv
+from contextvars import ContextVar
+import asyncio
+import threading
+import weakref
+import os
+import httpx
+import logfire
+
+from metrics import metrics
+from fred_scheduler import (
+    FRED_RATE_LIMIT, FRED_RATE_BURST, FRED_RATE_STATE_PATH, FRED_MAX_RETRIES, RETRY_STATUSES,
+    RateScheduler, backoff_delay, retry_after,
+)
+
+load_dotenv()
+
+FRED_API_URL = os.getenv("FRED_API_URL", "https://api.stlouisfed.org/fred")
+FRED_MAX_CONNECTIONS = 10       # Upper bound on concurrent sockets to FRED
+FRED_MAX_KEEPALIVE = 5          # Idle connections kept open for reuse
+FRED_TIMEOUT = 30.0
+
+# httpx.AsyncClient connections are bound to the event loop that opened them,
+# so one pooled client is kept per running loop.
+_clients: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient] = weakref.WeakKeyDictionary()
+_sync_loop: asyncio.AbstractEventLoop | None = None
+# Optional cap on in-flight FRED requests for the current context, e.g. set by batch.run_batch
+fred_request_limit: ContextVar[asyncio.Semaphore | None] = ContextVar("fred_request_limit", default=None)
+_sync_loop_lock = threading.Lock()
+# Paces every FRED request of every process sharing the API key
+fred_scheduler = RateScheduler(FRED_RATE_LIMIT, FRED_RATE_BURST, FRED_RATE_STATE_PATH)
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Get the shared keep-alive client for the running event loop
+
+    Returns
+    -------
+    httpx.AsyncClient
+        Pooled client reused by every FRED request made from this loop
+    """
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=FRED_MAX_CONNECTIONS,
+                max_keepalive_connections=FRED_MAX_KEEPALIVE,
+            ),
+            timeout=FRED_TIMEOUT,
+        )
+        _clients[loop] = client
+    return client
+
+
+async def close_client() -> None:
+    """Close the pooled client of the running event loop, if one was opened"""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
+
+
+async def _send(endpoint: str, params: dict) -> httpx.Response:
+    limit = fred_request_limit.get()
+    if limit is None:
+        return await get_client().get(f"{FRED_API_URL}/{endpoint}", params=params)
+    async with limit:
+        return await get_client().get(f"{FRED_API_URL}/{endpoint}", params=params)
+
+
+async def fred_get(endpoint: str, params: dict) -> httpx.Response:
+    """
+    Send a GET request to a FRED API endpoint over the shared connection pool.
+
+    Every attempt waits for a token from fred_scheduler first. Throttled (429) and server
+    error responses, and connection errors, are retried up to FRED_MAX_RETRIES times after
+    a jittered exponential backoff, or after the server's Retry-After delay. A 429 also
+    pauses the other requests of every process for that delay.
+
+    Parameters
+    ----------
+    endpoint : str
+        Endpoint path relative to FRED_API_URL, e.g. "series/search"
+    params : dict
+        Query parameters. The api_key is added automatically.
+
+    Returns
+    -------
+    httpx.Response
+        Raw response from the FRED API, which is still an error response if every retry failed
+
+    Raises
+    ------
+    httpx.TransportError
+        If the last attempt could not reach the FRED API
+    """
+    params = {**params, "api_key": str(os.getenv("FRED_API_KEY"))}
+    for attempt in range(FRED_MAX_RETRIES + 1):
+        await fred_scheduler.acquire()
+        try:
+            response = await _send(endpoint, params)
+        except httpx.TransportError as e:
+            if attempt == FRED_MAX_RETRIES:
+                raise
+            reason, delay = type(e).__name__, backoff_delay(attempt)
+        else:
+            metrics.inc("requests_total", endpoint=endpoint, status=response.status_code)
+            metrics.inc("bytes_downloaded_total", len(response.content), endpoint=endpoint)
+            if response.status_code not in RETRY_STATUSES or attempt == FRED_MAX_RETRIES:
+                return response
+            reason, delay = str(response.status_code), backoff_delay(attempt, retry_after(response.headers.get("Retry-After")))
+            if response.status_code == 429:
+                await asyncio.to_thread(fred_scheduler.penalize, delay)
+        metrics.inc("retries_total", endpoint=endpoint, reason=reason)
+        logfire.info(f"Retrying FRED {endpoint} in {delay:.2f}s after {reason} (attempt {attempt + 1})")
+        await asyncio.sleep(delay)
+
+
+def _get_sync_loop() -> asyncio.AbstractEventLoop:
+    global _sync_loop
+    with _sync_loop_lock:
+        if _sync_loop is None:
+            _sync_loop = asyncio.new_event_loop()
+            threading.Thread(target=_sync_loop.run_forever, name="fred-client", daemon=True).start()
+    return _sync_loop
+
+
+def run_sync(coro):
+    """
+    Run a coroutine to completion from synchronous code.
+
+    The coroutine runs on a long-lived background loop, so sync callers share one
+    connection pool across calls and can call in even when another loop is running
+    in the current thread.
+
+    Parameters
+    ----------
+    coro : Coroutine
+        Coroutine to run
+
+    Returns
+    -------
+    Any
+        Result of the coroutine
+    """
+    return asyncio.run_coroutine_threadsafe(coro, _get_sync_loop()).result()
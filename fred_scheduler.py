@@ -0,0 +1,206 @@
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from itertools import count
+from pathlib import Path
+import threading
+import weakref
+import asyncio
+import heapq
+import random
+import json
+import time
+import os
+
+from file_lock import file_lock
+from metrics import metrics
+
+FRED_RATE_LIMIT = float(os.getenv("FRED_RATE_LIMIT", 2.0))     # Requests per second across every process, 0 disables
+FRED_RATE_BURST = int(os.getenv("FRED_RATE_BURST", 10))        # Requests that may be sent at once after a quiet spell
+FRED_RATE_STATE_PATH = Path(os.getenv("FRED_RATE_STATE_PATH", "data/cache/fred_rate.json"))
+FRED_MAX_RETRIES = 5
+FRED_BACKOFF_BASE = 0.5         # Seconds before the first retry, doubled on each further one
+FRED_BACKOFF_MAX = 60.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+# Lane of the FRED requests made in the current context, e.g. set to BATCH by batch.run_batch
+fred_priority: ContextVar[Priority] = ContextVar("fred_priority", default=Priority.INTERACTIVE)
+
+
+class _PriorityGate:
+    """Lock of one event loop handed to the waiter with the best (priority, arrival) next"""
+
+    def __init__(self):
+        self._busy = False
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._arrivals = count()
+
+    async def acquire(self, priority: int) -> None:
+        if not self._busy and not self._waiters:
+            self._busy = True
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._arrivals), waiter))
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()      # Handed over just as we were cancelled
+            raise
+
+    def release(self) -> None:
+        while self._waiters:
+            _, _, waiter = heapq.heappop(self._waiters)
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._busy = False
+
+
+class RateScheduler:
+    """
+    Token bucket shared by every process that uses the same state file, with priority lanes.
+
+    The bucket holds up to `burst` tokens and refills at `rate` tokens per second. Each
+    request reserves a token under a file lock, letting the count go negative, and waits
+    until its token is due, so processes are served in the order they asked. Within a
+    process, requests reserve one at a time, in priority order, so an interactive request
+    takes the next token ahead of batch requests that were already waiting.
+
+    Parameters
+    ----------
+    rate : float
+        Tokens added per second. 0 or less disables the scheduler
+    burst : int
+        Most tokens the bucket holds
+    state_path : Path
+        JSON file holding the bucket, locked through a '.lock' file next to it
+    clock : Callable[[], float], optional
+        Wall clock shared by the processes. Defaults to time.time
+    """
+
+    def __init__(self, rate: float, burst: int, state_path: Path, clock=time.time):
+        self.rate = rate
+        self.burst = burst
+        self.state_path = Path(state_path)
+        self.lock_path = self.state_path.with_name(f"{self.state_path.name}.lock")
+        self.clock = clock
+        self._gates: weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _PriorityGate] = weakref.WeakKeyDictionary()
+        self._gates_lock = threading.Lock()
+
+    def _gate(self) -> _PriorityGate:
+        loop = asyncio.get_running_loop()
+        with self._gates_lock:
+            gate = self._gates.get(loop)
+            if gate is None:
+                gate = self._gates[loop] = _PriorityGate()
+        return gate
+
+    def _update(self, change) -> float:
+        """Refill the bucket, apply `change` to it under the lock and return what `change` returns"""
+        with file_lock(self.lock_path):
+            now = self.clock()
+            try:
+                state = json.loads(self.state_path.read_text())
+            except (FileNotFoundError, ValueError):
+                state = {"tokens": self.burst, "updated": now}
+            state["tokens"] = min(self.burst, state["tokens"] + max(now - state["updated"], 0) * self.rate)
+            state["updated"] = max(now, state["updated"])
+            result = change(state, now)
+            tmp_path = self.state_path.with_name(f".{self.state_path.name}.{os.getpid()}.tmp")
+            tmp_path.write_text(json.dumps(state))
+            os.replace(tmp_path, self.state_path)
+        return result
+
+    def _reserve(self) -> float:
+        def reserve(state: dict, now: float) -> float:
+            state["tokens"] -= 1
+            # Refill only starts once a pause from penalize is over
+            return max(state["updated"] - now, 0) + max(-state["tokens"] / self.rate, 0)
+        return self._update(reserve)
+
+    def penalize(self, delay: float) -> None:
+        """Stop every process from sending for `delay` seconds, e.g. after the server answered 429"""
+        if self.rate <= 0:
+            return
+
+        def pause(state: dict, now: float) -> None:
+            state["tokens"] = min(state["tokens"], 0)
+            state["updated"] = max(state["updated"], now + delay)
+        self._update(pause)
+
+    async def acquire(self, priority: Priority | None = None) -> float:
+        """
+        Wait for a token
+
+        Parameters
+        ----------
+        priority : Priority, optional
+            Lane of the request. Defaults to the fred_priority of the current context
+
+        Returns
+        -------
+        float
+            Seconds waited
+        """
+        if self.rate <= 0:
+            return 0.0
+        priority = fred_priority.get() if priority is None else priority
+        start = time.perf_counter()
+        gate = self._gate()
+        await gate.acquire(priority)
+        try:
+            wait = await asyncio.to_thread(self._reserve)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        finally:
+            gate.release()
+        waited = time.perf_counter() - start
+        metrics.observe("rate_wait_seconds", waited, priority=priority.name.lower())
+        return waited
+
+
+def retry_after(value: str | None) -> float | None:
+    """Seconds to wait from a Retry-After header, given as seconds or as an HTTP date"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+def backoff_delay(attempt: int, retry_after_seconds: float | None = None, base: float = FRED_BACKOFF_BASE, cap: float = FRED_BACKOFF_MAX) -> float:
+    """
+    Seconds to wait before retrying a request
+
+    Parameters
+    ----------
+    attempt : int
+        Retries already made
+    retry_after_seconds : float, optional
+        Delay the server asked for. It is honoured, plus up to `base` of jitter so
+        that clients told the same delay do not all come back at once
+    base : float, optional
+        Delay before the first retry. Defaults to FRED_BACKOFF_BASE
+    cap : float, optional
+        Longest delay. Defaults to FRED_BACKOFF_MAX
+
+    Returns
+    -------
+    float
+        A delay drawn uniformly up to base * 2 ** attempt ("full jitter"), or the server's delay
+    """
+    if retry_after_seconds is not None:
+        return min(retry_after_seconds, cap) + random.uniform(0, base)
+    return random.uniform(0, min(base * 2 ** attempt, cap))
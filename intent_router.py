@@ -0,0 +1,309 @@
+from dataclasses import dataclass
+from datetime import date
+from pathlib import Path
+import re
+import duckdb
+
+from db_session import SERIES_DB_PATH, get_session
+from series_store import SUMMARY_TABLE
+from progress import SqlGenerated, emit
+
+import logfire
+
+INTENT_KINDS = ["latest", "value_in_year", "average", "minimum", "maximum", "yoy_change"]
+
+# Checked in order; a question matching more than one kind is left to the LLM
+INTENT_PATTERNS = {
+    "yoy_change": re.compile(r"\b(year[- ]over[- ]year|yoy|y/y|annual change|(change|compared?|grow\w*) (from|since|to|with|over) (a|one|the previous|the prior|last) year)\b"),
+    "maximum": re.compile(r"\b(peak\w*|highest|maximum|max|record high|largest)\b"),
+    "minimum": re.compile(r"\b(lowest|minimum(?! wage)|min|trough|record low|smallest)\b"),
+    "average": re.compile(r"\b(average|mean)\b"),
+    "latest": re.compile(r"\b(latest|most recent|current(ly)?|right now|today|last (reported|available|observed)|newest)\b"),
+}
+# Shapes the templates do not cover
+UNSUPPORTED_PATTERN = re.compile(
+    r"\b(compare[ds]?|comparison|correlat\w*|versus|vs|ratio|median|percentile|standard deviation|variance|volatil\w*"
+    r"|trend|forecast\w*|predict\w*|month[- ]over[- ]month|quarter[- ]over[- ]quarter|sum|each|every|per year"
+    # Changes over a period, which the whole-year templates would answer with a level;
+    # year-over-year phrases (YOY_PHRASE_PATTERN) are taken out before this is checked
+    r"|chang\w*|increas\w*|decreas\w*|ris(e|es|en|ing)|rose|fall(s|en|ing)?|fell|drop\w*|declin\w*|grow\w*|grew"
+    r"|difference|differ|inflation)\b"
+)
+# A year-over-year phrase with the change word it qualifies, e.g. "year-over-year change"
+YOY_PHRASE_PATTERN = re.compile(
+    rf"(?:{INTENT_PATTERNS['yoy_change'].pattern})(?: (?:percent(?:age)? )?(?:change|growth|increase|decrease|rise|fall))?"
+)
+YEAR = r"((?:19|20)\d{2})"
+# Parts of a year and points in one, e.g. "March of 2023" or "the end of 2020", which the
+# whole-year templates would answer with the wrong figure
+SUB_YEAR_PATTERN = re.compile(
+    r"\b(january|february|march|april|may(?= (?:of )?(?:19|20)\d{2})|june|july|august|september|october|november|december"
+    r"|jan|feb|apr|jun|jul|aug|sept?|oct|nov|dec|quarter\w*|q[1-4]|half|h[12]"
+    r"|spring|summer|autumn|winter|fall(?= (?:of )?(?:19|20)\d{2})"
+    r"|start\w*|beginning|end(ed|ing)?|middle|mid|early|late|as of)\b"
+)
+RANGE_PATTERNS = [
+    (re.compile(rf"\bbetween {YEAR} and {YEAR}\b"), "range"),
+    (re.compile(rf"\bfrom {YEAR} (?:to|through|until|till|-) {YEAR}\b"), "range"),
+    (re.compile(rf"\b{YEAR}\s*(?:-|to|through)\s*{YEAR}\b"), "range"),
+    (re.compile(rf"\bsince {YEAR}\b"), "since"),
+    (re.compile(rf"\b(?:in|during|for|of) {YEAR}\b"), "year"),
+]
+
+
+@dataclass
+class Intent:
+    kind: str                       # One of INTENT_KINDS
+    start_year: int | None = None   # First year included, None for the start of the series
+    end_year: int | None = None     # Last year included, None for the end of the series
+
+
+def parse_intent(question: str) -> Intent | None:
+    """
+    Recognize the common question shapes that a SQL template can answer
+
+    Parameters
+    ----------
+    question : str
+        The user question
+
+    Returns
+    -------
+    Intent | None
+        The intent, or None if the question is not one of the known shapes or is ambiguous
+    """
+    text = question.lower()
+    if UNSUPPORTED_PATTERN.search(YOY_PHRASE_PATTERN.sub(" ", text)):
+        return None
+    years = re.findall(rf"\b{YEAR}\b", text)
+    if years and SUB_YEAR_PATTERN.search(text):
+        return None
+
+    start_year = end_year = None
+    for pattern, shape in RANGE_PATTERNS:
+        match = pattern.search(text)
+        if match is None:
+            continue
+        start_year = int(match.group(1))
+        end_year = int(match.group(2)) if shape == "range" else start_year if shape == "year" else None
+        break
+    if len(set(years)) > len({start_year, end_year} - {None}):
+        return None     # A year in a phrasing we do not parse
+    if start_year is not None and end_year is not None and start_year > end_year:
+        return None
+
+    kinds = [kind for kind, pattern in INTENT_PATTERNS.items() if pattern.search(text)]
+    if len(kinds) > 1:
+        return None
+    if kinds:
+        kind = kinds[0]
+    elif start_year is not None and start_year == end_year:
+        kind = "value_in_year"
+    else:
+        return None
+    if kind == "latest" and start_year is not None:
+        return None
+    if kind == "value_in_year" and start_year != end_year:
+        return None
+    return Intent(kind=kind, start_year=start_year, end_year=end_year)
+
+
+def _series_columns(db_schema: dict) -> tuple[str, str] | None:
+    types = db_schema["types"]
+    date_columns = [column for column in db_schema["columns"] if types[column] == "DATE" and not column.startswith("realtime")]
+    value_columns = [column for column in db_schema["columns"] if types[column] in ("DOUBLE", "FLOAT", "BIGINT", "INTEGER", "DECIMAL")]
+    if len(date_columns) != 1 or len(value_columns) != 1:
+        return None
+    return date_columns[0], value_columns[0]
+
+
+def _compile_summary_intent(intent: Intent, summary: dict) -> tuple[str, list] | None:
+    periods_table = summary["periods_table"]
+    conditions = ["period_type = 'year'"]
+    parameters = []
+    if intent.start_year is not None:
+        conditions.append("period_start >= ?")
+        parameters.append(date(intent.start_year, 1, 1))
+    if intent.end_year is not None:
+        conditions.append("period_start < ?")
+        parameters.append(date(intent.end_year + 1, 1, 1))
+    where = " AND ".join(conditions)
+
+    if intent.kind == "latest":
+        return f"SELECT latest_date, latest_value FROM {SUMMARY_TABLE} WHERE table_name = ?", [summary["table_name"]]
+    if intent.kind in ("value_in_year", "average"):
+        return (
+            "SELECT SUM(average * observations) / SUM(observations), SUM(observations), MIN(first_date), MAX(last_date) "
+            f"FROM {periods_table} WHERE {where}"
+        ), parameters
+    if intent.kind == "maximum":
+        return f"SELECT maximum_date, maximum FROM {periods_table} WHERE {where} ORDER BY maximum DESC, maximum_date DESC LIMIT 1", parameters
+    if intent.kind == "minimum":
+        return f"SELECT minimum_date, minimum FROM {periods_table} WHERE {where} ORDER BY minimum ASC, minimum_date DESC LIMIT 1", parameters
+    return None
+
+
+def compile_intent(intent: Intent, relation_name: str, db_schema: dict, summary: dict | None = None) -> tuple[str, list] | None:
+    """
+    Compile an intent into a parameterized SQL query against a series table or view
+
+    With a summary, intents over whole years read the materialized summary of the series
+    instead of scanning its observations.
+
+    Parameters
+    ----------
+    intent : Intent
+        The parsed intent
+    relation_name : str
+        Table or view holding the series
+    db_schema : dict
+        Schema of the relation, as returned by series_store.get_table_schema
+    summary : dict, optional
+        Summary of the series, as returned by series_store.get_series_summary
+
+    Returns
+    -------
+    tuple[str, list] | None
+        The SQL query and its parameters, or None if the relation does not look like a single series
+    """
+    if summary is not None:
+        compiled = _compile_summary_intent(intent, summary)
+        if compiled is not None:
+            return compiled
+    columns = _series_columns(db_schema)
+    if columns is None:
+        return None
+    date_column, value_column = columns
+
+    series_conditions = [f'"{value_column}" IS NOT NULL']
+    if "realtime_end_date" in db_schema["columns"]:
+        series_conditions.append("realtime_end_date IS NULL")     # Current vintage only; a no-op on the _current views
+    conditions = list(series_conditions)
+    parameters = []
+    if intent.start_year is not None:
+        conditions.append(f'"{date_column}" >= ?')
+        parameters.append(date(intent.start_year, 1, 1))
+    if intent.end_year is not None:
+        conditions.append(f'"{date_column}" < ?')
+        parameters.append(date(intent.end_year + 1, 1, 1))
+    where = " AND ".join(conditions)
+    selected = f'SELECT "{date_column}" AS period, "{value_column}" AS value FROM {relation_name} WHERE {where}'
+
+    if intent.kind == "latest":
+        sql = f"{selected} ORDER BY period DESC LIMIT 1"
+    elif intent.kind in ("value_in_year", "average"):
+        sql = f"SELECT AVG(value), COUNT(value), MIN(period), MAX(period) FROM ({selected})"
+    elif intent.kind == "maximum":
+        sql = f"{selected} ORDER BY value DESC, period DESC LIMIT 1"
+    elif intent.kind == "minimum":
+        sql = f"{selected} ORDER BY value ASC, period DESC LIMIT 1"
+    elif intent.kind == "yoy_change":
+        # The year-earlier observation is looked up over the whole series, so the range only limits the later one
+        history_where = " AND ".join(series_conditions)
+        sql = (
+            f"WITH selected AS ({selected}), "
+            f'history AS (SELECT "{date_column}" AS period, "{value_column}" AS value FROM {relation_name} WHERE {history_where}) '
+            "SELECT selected.period, selected.value, history.period, history.value FROM selected "
+            "JOIN history ON history.period = selected.period - INTERVAL 1 YEAR "
+            "ORDER BY selected.period DESC LIMIT 1"
+        )
+    else:
+        return None
+    return sql, parameters
+
+
+def _describe_range(intent: Intent) -> str:
+    if intent.start_year is None:
+        return "over the whole series"
+    if intent.end_year is None:
+        return f"since {intent.start_year}"
+    if intent.start_year == intent.end_year:
+        return f"in {intent.start_year}"
+    return f"from {intent.start_year} to {intent.end_year}"
+
+
+def format_answer(intent: Intent, series_name: str, rows: list[tuple]) -> str | None:
+    """
+    Phrase the result of a compiled intent as an answer
+
+    Parameters
+    ----------
+    intent : Intent
+        The parsed intent
+    series_name : str
+        Name of the series to use in the answer
+    rows : list[tuple]
+        Rows returned by the query from compile_intent
+
+    Returns
+    -------
+    str | None
+        The answer, or None if the query found no observations
+    """
+    if not rows or rows[0][0] is None:
+        return None
+    row = rows[0]
+    when = _describe_range(intent)
+    if intent.kind == "latest":
+        return f"The latest value of {series_name} is {row[1]:g} ({row[0].isoformat()})."
+    if intent.kind in ("value_in_year", "average"):
+        average, count, first, last = row
+        if count == 1:
+            return f"The value of {series_name} {when} is {average:g} ({first.isoformat()})."
+        return f"The average value of {series_name} {when} is {average:g} ({count} observations from {first.isoformat()} to {last.isoformat()})."
+    if intent.kind in ("maximum", "minimum"):
+        extreme = "highest" if intent.kind == "maximum" else "lowest"
+        return f"The {extreme} value of {series_name} {when} is {row[1]:g}, reached on {row[0].isoformat()}."
+    if intent.kind == "yoy_change":
+        period, value, previous_period, previous_value = row
+        change = value - previous_value
+        percent = f" ({change / previous_value:+.2%})" if previous_value else ""
+        return (
+            f"{series_name} changed by {change:+g}{percent} year over year, "
+            f"from {previous_value:g} on {previous_period.isoformat()} to {value:g} on {period.isoformat()}."
+        )
+    return None
+
+
+def answer_from_intent(
+    question: str, relation_name: str, db_schema: dict, db_path: Path = SERIES_DB_PATH, summary: dict | None = None
+) -> str | None:
+    """
+    Answer a question from a SQL template, without a model call
+
+    Parameters
+    ----------
+    question : str
+        The user question
+    relation_name : str
+        Table or view holding the series
+    db_schema : dict
+        Schema of the relation, as returned by series_store.get_table_schema
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+    summary : dict, optional
+        Summary of the series, as returned by series_store.get_series_summary
+
+    Returns
+    -------
+    str | None
+        The answer, or None if the question needs the LLM
+    """
+    intent = parse_intent(question)
+    if intent is None:
+        return None
+    compiled = compile_intent(intent, relation_name, db_schema, summary)
+    if compiled is None:
+        return None
+    sql, parameters = compiled
+    emit(SqlGenerated(sql=sql, source="template"))
+    try:
+        rows = get_session(db_path).execute(sql, parameters)
+    except duckdb.Error as e:
+        logfire.error(f"Intent query failed, falling back to the LLM: {e}")
+        return None
+    series_name = summary["value_column"] if summary is not None else _series_columns(db_schema)[1]
+    answer = format_answer(intent, series_name, rows)
+    if answer is not None:
+        logfire.info(f"Answered {intent.kind} intent from template: {answer}")
+    return answer
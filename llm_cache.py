@@ -0,0 +1,141 @@
+from contextlib import asynccontextmanager
+from dataclasses import replace
+from functools import cache
+from pathlib import Path
+import hashlib
+import json
+import os
+
+from pydantic import TypeAdapter
+from pydantic_ai.messages import ModelMessagesTypeAdapter, ModelRequest, ModelResponse, RetryPromptPart
+from pydantic_ai.models import ModelRequestParameters
+from pydantic_ai.models.wrapper import WrapperModel
+from pydantic_ai.usage import RequestUsage
+
+from disk_cache import DiskCache
+from metrics import metrics
+
+LLM_CACHE_PATH = Path("data/cache/llm.sqlite")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", 30 * 24 * 60 * 60))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 5000))
+# on: serve cached responses and cache new ones, off: always call the model,
+# record: always call the model and cache the response, replay: only serve cached responses
+LLM_CACHE_MODE = os.getenv("FRED_LLM_CACHE", "on")
+LLM_CACHE_MODES = ("on", "off", "record", "replay")
+# Fields that differ between otherwise identical requests
+VOLATILE_FIELDS = {"timestamp", "run_id", "conversation_id", "provider_response_id", "provider_details", "usage"}
+
+llm_cache = DiskCache(LLM_CACHE_PATH, ttl=LLM_CACHE_TTL, max_entries=LLM_CACHE_MAX_ENTRIES)
+metrics.register_collector("llm_cache", lambda: {f"cache_{name}": count for name, count in llm_cache.stats().items()})
+
+
+@cache
+def _parameters_adapter() -> TypeAdapter:
+    return TypeAdapter(ModelRequestParameters)
+
+
+def _strip_volatile(value):
+    if isinstance(value, dict):
+        return {key: _strip_volatile(item) for key, item in value.items() if key not in VOLATILE_FIELDS}
+    if isinstance(value, list):
+        return [_strip_volatile(item) for item in value]
+    return value
+
+
+def request_key(model_name: str, messages: list, model_settings, model_request_parameters: ModelRequestParameters) -> str:
+    """
+    Content address of a model request
+
+    Parameters
+    ----------
+    model_name : str
+        Name of the model the request is for
+    messages : list[ModelMessage]
+        The conversation sent, including the system prompt
+    model_settings : ModelSettings | None
+        Settings of the request, e.g. temperature
+    model_request_parameters : ModelRequestParameters
+        Tools and output schema of the request
+
+    Returns
+    -------
+    str
+        SHA-256 of everything that can change the response, ignoring timestamps and run ids
+    """
+    request = {
+        "model": model_name,
+        "messages": _strip_volatile(ModelMessagesTypeAdapter.dump_python(messages, mode="json")),
+        "settings": model_settings,
+        "parameters": _strip_volatile(_parameters_adapter().dump_python(model_request_parameters, mode="json")),
+    }
+    return hashlib.sha256(json.dumps(request, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _is_retry(messages: list) -> bool:
+    """Whether the request sends back the previous response because it was rejected"""
+    return bool(messages) and isinstance(messages[-1], ModelRequest) and any(isinstance(part, RetryPromptPart) for part in messages[-1].parts)
+
+
+class CachedModel(WrapperModel):
+    """
+    Model wrapper answering repeated requests from a disk cache.
+
+    Requests are keyed with request_key and responses stored in a DiskCache, which bounds
+    the number of entries by evicting the least recently used. A cached response is
+    returned with empty usage, since no tokens were spent on it. Streamed requests are
+    passed through to the model.
+
+    In "on" mode, a response that the agent rejected, e.g. invalid SQL sent back with a
+    RetryPromptPart, is deleted, and the response to the retry is not stored. A failed run
+    then leaves nothing behind that would replay the failure.
+
+    Parameters
+    ----------
+    wrapped : Model
+        Model that answers cache misses
+    agent : str
+        Agent name the cache metrics are labelled with
+    cache : DiskCache, optional
+        Where responses are stored. Defaults to llm_cache
+    mode : str, optional
+        One of LLM_CACHE_MODES. Defaults to LLM_CACHE_MODE
+    """
+
+    def __init__(self, wrapped, agent: str, cache: DiskCache | None = None, mode: str | None = None):
+        super().__init__(wrapped)
+        self.agent = agent
+        self.cache = cache if cache is not None else llm_cache
+        self.mode = mode or LLM_CACHE_MODE
+        if self.mode not in LLM_CACHE_MODES:
+            raise ValueError(f"LLM cache mode must be one of {', '.join(LLM_CACHE_MODES)}, not {self.mode!r}")
+
+    async def request(self, messages, model_settings, model_request_parameters):
+        if self.mode == "off":
+            return await super().request(messages, model_settings, model_request_parameters)
+        key = request_key(self.model_name, messages, model_settings, model_request_parameters)
+        retry = self.mode == "on" and _is_retry(messages)
+        if retry:
+            # messages[-2] is the rejected response, to the request made of the messages before it
+            self.cache.delete(request_key(self.model_name, messages[:-2], model_settings, model_request_parameters))
+            metrics.inc("llm_cache_total", agent=self.agent, outcome="rejected")
+        if self.mode in ("on", "replay"):
+            cached = self.cache.get(key)
+            if cached is not None:
+                metrics.inc("llm_cache_total", agent=self.agent, outcome="hit")
+                response: ModelResponse = ModelMessagesTypeAdapter.validate_python([cached[0]])[0]
+                return replace(response, usage=RequestUsage())
+            metrics.inc("llm_cache_total", agent=self.agent, outcome="miss")
+            if self.mode == "replay":
+                raise LookupError(f"No recorded response for {self.agent} request {key[:12]} in replay mode")
+        response = await super().request(messages, model_settings, model_request_parameters)
+        if retry:
+            return response
+        self.cache.set(key, ModelMessagesTypeAdapter.dump_python([response], mode="json")[0])
+        return response
+
+    @asynccontextmanager
+    async def request_stream(self, messages, model_settings, model_request_parameters, run_context=None):
+        if self.mode == "replay":
+            raise LookupError(f"Streamed {self.agent} requests cannot be replayed")
+        async with super().request_stream(messages, model_settings, model_request_parameters, run_context) as response:
+            yield response
@@ -1,5 +1,79 @@
-def main():
-    print("Hello from fred-interrogator!")
+import argparse
+import asyncio
+import json
+import sys
+
+
+async def ask(question: str) -> None:
+    from orchestrator import orchestrator_agent
+
+    result = await orchestrator_agent.run(question)
+    print(result.output)
+
+
+async def ask_streaming(question: str) -> None:
+    from orchestrator import stream_question
+    from progress import AnswerDelta, Answer
+
+    async for event in stream_question(question):
+        if isinstance(event, AnswerDelta):
+            print(event.text, end="", flush=True)
+        elif isinstance(event, Answer):
+            print()
+        else:
+            print(json.dumps(event.to_dict()), file=sys.stderr, flush=True)
+
+
+async def batch(questions: list[str], llm_concurrency: int, fred_concurrency: int, output) -> None:
+    from batch import run_batch
+
+    async for result in run_batch(questions, llm_concurrency, fred_concurrency):
+        output.write(json.dumps(result.to_dict()) + "\n")
+        output.flush()
+
+
+def main(argv: list[str] | None = None):
+    from batch import BATCH_LLM_CONCURRENCY, BATCH_FRED_CONCURRENCY, read_questions
+
+    parser = argparse.ArgumentParser(prog="fred-interrogator", description="Answer questions using data pulled from FRED.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    ask_parser = commands.add_parser("ask", help="Answer a single question")
+    ask_parser.add_argument("question")
+    ask_parser.add_argument("--stream", action="store_true", help="Report progress on stderr and print the answer as it is generated")
+
+    batch_parser = commands.add_parser("batch", help="Answer many questions concurrently, printing JSON lines as they complete")
+    batch_parser.add_argument("questions", nargs="*", help="Questions to answer")
+    batch_parser.add_argument("-f", "--file", help="File with one question per line")
+    batch_parser.add_argument("-o", "--output", help="Write results to this file instead of stdout")
+    batch_parser.add_argument("--llm-concurrency", type=int, default=BATCH_LLM_CONCURRENCY)
+    batch_parser.add_argument("--fred-concurrency", type=int, default=BATCH_FRED_CONCURRENCY)
+    batch_parser.add_argument("--metrics", help="Write pipeline metrics in the Prometheus text format to this file")
+
+    args = parser.parse_args(argv)
+    from runtime import configure_telemetry
+
+    configure_telemetry()
+    if args.command == "ask":
+        asyncio.run(ask_streaming(args.question) if args.stream else ask(args.question))
+        return
+
+    questions = list(args.questions)
+    if args.file:
+        questions += read_questions(args.file)
+    if not questions:
+        parser.error("batch needs questions or --file")
+    output = open(args.output, "w") if args.output else sys.stdout
+    try:
+        asyncio.run(batch(questions, args.llm_concurrency, args.fred_concurrency, output))
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    if args.metrics:
+        from metrics import metrics
+
+        with open(args.metrics, "w") as f:
+            f.write(metrics.to_prometheus())
 
 
 if __name__ == "__main__":
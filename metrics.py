@@ -0,0 +1,247 @@
+from collections.abc import Callable
+from contextlib import asynccontextmanager, contextmanager
+from bisect import bisect_left
+import threading
+import random
+import time
+import os
+
+from pydantic_ai import ModelRetry
+from pydantic_ai.models.wrapper import WrapperModel
+
+import logfire
+
+METRICS_PREFIX = "fred_"
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+PAYLOAD_LOG_SAMPLE_RATE = float(os.getenv("FRED_PAYLOAD_LOG_SAMPLE_RATE", 0.01))   # Share of large payloads logged
+PAYLOAD_LOG_MAX_CHARS = 2000
+
+
+def _label_key(labels: dict) -> tuple:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    pairs = labels + extra
+    if not pairs:
+        return ""
+    escaped = (
+        (name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+class Metrics:
+    """
+    In-process registry of counters, stage histograms and collected gauges.
+
+    Counters and histograms are keyed by name and labels. Gauges are read from collectors,
+    callables returning a dict of numbers, whenever a snapshot or export is taken, so
+    components like caches keep their own counts and are only asked when needed.
+    """
+
+    def __init__(self, buckets: tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: dict[str, dict[tuple, float]] = {}
+        self._histograms: dict[str, dict[tuple, dict]] = {}
+        self._collectors: dict[str, Callable[[], dict]] = {}
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Add `value` to a counter"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Record a value, e.g. a duration in seconds, in a histogram"""
+        key = _label_key(labels)
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            index = bisect_left(self.buckets, value)
+            if index < len(self.buckets):
+                histogram["buckets"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def register_collector(self, name: str, collector: Callable[[], dict]) -> None:
+        """Report the numbers returned by `collector` as gauges labelled with `name`"""
+        with self._lock:
+            self._collectors[name] = collector
+
+    @contextmanager
+    def stage(self, stage: str, **attributes):
+        """Time a pipeline stage into the stage histogram, inside a logfire span"""
+        start = time.perf_counter()
+        outcome = "ok"
+        with logfire.span("stage {stage}", stage=stage, **attributes):
+            try:
+                yield
+            except BaseException:
+                outcome = "error"
+                raise
+            finally:
+                self.observe("stage_seconds", time.perf_counter() - start, stage=stage, outcome=outcome)
+
+    def snapshot(self) -> dict:
+        """
+        Current values of every metric
+
+        Returns
+        -------
+        dict
+            'counters' and 'gauges' map a metric name to a list of {'labels', 'value'}, and
+            'histograms' to a list of {'labels', 'count', 'sum', 'buckets'} with cumulative
+            bucket counts keyed by upper bound
+        """
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {
+                name: {key: {**h, "buckets": list(h["buckets"])} for key, h in series.items()}
+                for name, series in self._histograms.items()
+            }
+            collectors = dict(self._collectors)
+        gauges = {}
+        for source, collector in collectors.items():
+            try:
+                values = collector()
+            except Exception as e:
+                logfire.error(f"Metrics collector {source} failed: {e}")
+                continue
+            for name, value in values.items():
+                gauges.setdefault(name, []).append({"labels": {"source": source}, "value": value})
+        return {
+            "counters": {
+                name: [{"labels": dict(key), "value": value} for key, value in series.items()]
+                for name, series in counters.items()
+            },
+            "histograms": {
+                name: [
+                    {
+                        "labels": dict(key),
+                        "count": h["count"],
+                        "sum": h["sum"],
+                        "buckets": dict(zip(self.buckets, _cumulative(h["buckets"]))),
+                    }
+                    for key, h in series.items()
+                ]
+                for name, series in histograms.items()
+            },
+            "gauges": gauges,
+        }
+
+    def to_prometheus(self) -> str:
+        """Render a snapshot in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, series in sorted(snapshot["counters"].items()):
+            lines.append(f"# TYPE {METRICS_PREFIX}{name} counter")
+            for item in series:
+                lines.append(f"{METRICS_PREFIX}{name}{_format_labels(_label_key(item['labels']))} {item['value']:g}")
+        for name, series in sorted(snapshot["histograms"].items()):
+            lines.append(f"# TYPE {METRICS_PREFIX}{name} histogram")
+            for item in series:
+                labels = _label_key(item["labels"])
+                for bound, count in item["buckets"].items():
+                    lines.append(f"{METRICS_PREFIX}{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {count}")
+                lines.append(f"{METRICS_PREFIX}{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {item['count']}")
+                lines.append(f"{METRICS_PREFIX}{name}_sum{_format_labels(labels)} {item['sum']:g}")
+                lines.append(f"{METRICS_PREFIX}{name}_count{_format_labels(labels)} {item['count']}")
+        for name, series in sorted(snapshot["gauges"].items()):
+            lines.append(f"# TYPE {METRICS_PREFIX}{name} gauge")
+            for item in series:
+                lines.append(f"{METRICS_PREFIX}{name}{_format_labels(_label_key(item['labels']))} {item['value']:g}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        """Drop every counter and histogram; collectors stay registered"""
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+def _cumulative(counts: list[int]) -> list[int]:
+    total, cumulative = 0, []
+    for count in counts:
+        total += count
+        cumulative.append(total)
+    return cumulative
+
+
+metrics = Metrics()
+
+
+def log_payload(message: str, payload: Callable[[], object], sample_rate: float | None = None, **attributes) -> None:
+    """
+    Log a large payload for a sample of calls only.
+
+    The payload is only built and formatted for the sampled calls, and is truncated
+    to PAYLOAD_LOG_MAX_CHARS.
+
+    Parameters
+    ----------
+    message : str
+        Log message template, formatted with the attributes
+    payload : Callable[[], object]
+        Returns the payload to log
+    sample_rate : float, optional
+        Share of calls that log. Defaults to PAYLOAD_LOG_SAMPLE_RATE
+    **attributes
+        Attributes attached to the log record
+    """
+    if random.random() >= (PAYLOAD_LOG_SAMPLE_RATE if sample_rate is None else sample_rate):
+        return
+    text = str(payload())
+    if len(text) > PAYLOAD_LOG_MAX_CHARS:
+        text = f"{text[:PAYLOAD_LOG_MAX_CHARS]}... ({len(text)} chars)"
+    logfire.debug(message, payload=text, **attributes)
+
+
+def model_retry(agent: str, message: str) -> ModelRetry:
+    """Count a retry of `agent` and build the ModelRetry to raise"""
+    metrics.inc("llm_retries_total", agent=agent)
+    return ModelRetry(message)
+
+
+class InstrumentedModel(WrapperModel):
+    """Model wrapper counting requests, failures and tokens per agent"""
+
+    def __init__(self, wrapped, agent: str):
+        super().__init__(wrapped)
+        self.agent = agent
+
+    def _record(self, response) -> None:
+        usage = response.usage
+        metrics.inc("llm_tokens_total", usage.input_tokens or 0, agent=self.agent, kind="input")
+        metrics.inc("llm_tokens_total", usage.output_tokens or 0, agent=self.agent, kind="output")
+
+    async def request(self, messages, model_settings, model_request_parameters):
+        metrics.inc("llm_requests_total", agent=self.agent)
+        start = time.perf_counter()
+        try:
+            response = await super().request(messages, model_settings, model_request_parameters)
+        except Exception:
+            metrics.inc("llm_request_errors_total", agent=self.agent)
+            raise
+        finally:
+            metrics.observe("llm_request_seconds", time.perf_counter() - start, agent=self.agent)
+        self._record(response)
+        return response
+
+    @asynccontextmanager
+    async def request_stream(self, messages, model_settings, model_request_parameters, run_context=None):
+        metrics.inc("llm_requests_total", agent=self.agent)
+        start = time.perf_counter()
+        try:
+            async with super().request_stream(messages, model_settings, model_request_parameters, run_context) as response:
+                yield response
+            self._record(response.get())
+        except Exception:
+            metrics.inc("llm_request_errors_total", agent=self.agent)
+            raise
+        finally:
+            metrics.observe("llm_request_seconds", time.perf_counter() - start, agent=self.agent)
@@ -1,33 +1,83 @@
-from pydantic_ai import Agent
-from pydantic_ai.models.openai import OpenAIChatModel
-from pydantic_ai.providers.ollama import OllamaProvider
+from pydantic_ai import Agent, AgentRunResultEvent, FinalResultEvent, PartDeltaEvent, PartStartEvent
+from pydantic_ai.messages import TextPart, TextPartDelta
+from typing import AsyncIterator
 
-from search_agent import get_seriess_from_question, pick_series
-from pull_fred import pull_observations
-from process_data import zipfile_to_csv, get_csv_schema
-from query_agent import DatabaseInfo, get_sql_query, execute_sql_agent
+from search_agent import find_series, get_seriess_from_question, pick_seriess
+from pull_fred import pull_observations_async
+from series_store import get_table_schema, get_series_summary, register_series
+from query_agent import DatabaseInfo, answer_with_sql
+from resolution_cache import RESOLUTION_CACHE_PATH, ResolutionCache
+from intent_router import answer_from_intent
+from panel import build_panel
+from metrics import metrics
+from progress import ProgressEvent, SeriesChosen, DataLoaded, AnswerDelta, Answer, emit, progress_sink
+from runtime import agent_model
 
+import asyncio
 import logfire
 
-logfire.configure()
-logfire.instrument_pydantic_ai()
-
-ollama_model = OpenAIChatModel(
-    model_name='granite4:7b-a1b-h',
-    provider=OllamaProvider(),  
+resolution_cache = ResolutionCache(RESOLUTION_CACHE_PATH)
+metrics.register_collector(
+    "resolution_cache", lambda: {f"cache_{name}": count for name, count in resolution_cache.cache.stats().items()}
 )
 
 orchestrator_agent = Agent(
-    model=ollama_model,
+    model=agent_model("orchestrator_agent"),
     output_type=str,
     system_prompt="""\
 You are an agent that orchestrates the execution of agents.
 You are given a user question.
 You should use the 'get_data_from_question' tool to get the DatabaseInfo required to answer the question.
+If the question compares or relates several series, use the 'get_panel_from_question' tool instead.
 Use the DatabaseInfo in the 'generate_and_execute_sql' tool to answer the question.
 """
 )
 
+async def resolve_series(question: str) -> dict | None:
+    """
+    Pick the FRED series that answers a question, from the resolution cache if possible.
+
+    Args:
+        question (str): The user question
+
+    Returns:
+        dict | None: The chosen series as {"title": ..., "id": ...}, or None if no series was chosen
+    """
+    with metrics.stage("resolve"):
+        series = resolution_cache.get(question)
+        metrics.inc("resolution_cache_total", outcome="miss" if series is None else "hit")
+        cached = series is not None
+        if series is None:
+            series = await find_series(question)
+            if series is None:
+                logfire.error("No series chosen")
+                return None
+            resolution_cache.put(question, series)
+    emit(SeriesChosen(series_id=series["id"], title=series["title"], cached=cached))
+    return series
+
+async def load_series(series_id: str) -> DatabaseInfo | None:
+    """
+    Pull a series into the series store and register its view.
+
+    Args:
+        series_id (str): The FRED series ID
+
+    Returns:
+        DatabaseInfo | None: The database information of the series, or None if the pull failed
+    """
+    with metrics.stage("load", series_id=series_id):
+        observations_results = await pull_observations_async(series_id, incremental=True)
+        if observations_results["success"] is False:
+            return None
+
+        table_name = observations_results["table_name"]
+        view_name = register_series(series_id)
+        db_schema = get_table_schema(view_name)
+        summary = get_series_summary(table_name)
+    emit(DataLoaded(table_name=table_name, rows=summary["observations"] if summary else None, series_ids=[series_id]))
+    return DatabaseInfo(table_name=table_name, db_schema=db_schema, view_name=view_name, summary=summary)
+
 @orchestrator_agent.tool_plain
 async def get_data_from_question(question: str) -> DatabaseInfo | None:
     """
@@ -40,23 +90,54 @@ async def get_data_from_question(question: str) -> DatabaseInfo | None:
     Returns:
         DatabaseInfo: The database information where the data is stored. Used in the 'generate_and_execute_sql' tool
     """
-    
-    seriess = await get_seriess_from_question(question)
-    series = await pick_series(question, seriess)
+    series = await resolve_series(question)
     if series is None:
-        logfire.error("No series chosen")
         return None
-    
-    observations_results = pull_observations(series["id"])
-    if observations_results["success"] is False:
+    return await load_series(series["id"])
+
+async def load_panel(seriess: list[dict]) -> DatabaseInfo | None:
+    """
+    Pull several series concurrently and align them in one panel table.
+
+    Args:
+        seriess (list[dict]): The series as {"title": ..., "id": ...}
+
+    Returns:
+        DatabaseInfo | None: The database information of the panel, or None if a pull failed
+    """
+    results = await asyncio.gather(*(pull_observations_async(series["id"], incremental=True) for series in seriess))
+    failed = [series["id"] for series, result in zip(seriess, results) if result["success"] is False]
+    if failed:
+        logfire.error(f"Could not pull {', '.join(failed)}")
         return None
-    
-    csv_path = zipfile_to_csv(observations_results["zip_path"])
-    if csv_path is None:
+
+    panel = await asyncio.to_thread(build_panel, seriess)
+    emit(DataLoaded(table_name=panel["table_name"], rows=panel["row_count"], series_ids=[series["id"] for series in seriess]))
+    db_schema = get_table_schema(panel["table_name"])
+    return DatabaseInfo(table_name=panel["table_name"], db_schema=db_schema, panel=panel)
+
+@orchestrator_agent.tool_plain
+async def get_panel_from_question(question: str) -> DatabaseInfo | None:
+    """
+    This function takes a user question about several series and pulls all of them from FRED into one table
+    with a column per series, and returns the DatabaseInfo where the data is stored.
+
+    Args:
+        question (str): The user question
+
+    Returns:
+        DatabaseInfo: The database information where the data is stored. Used in the 'generate_and_execute_sql' tool
+    """
+    seriess_md = await get_seriess_from_question(question)
+    seriess = await pick_seriess(question, seriess_md)
+    if not seriess:
+        logfire.error("No series chosen")
         return None
-    
-    db_schema = get_csv_schema(csv_path[0])
-    return DatabaseInfo(csv_path=csv_path[0], db_schema=db_schema)
+    for series in seriess:
+        emit(SeriesChosen(series_id=series["id"], title=series["title"]))
+    if len(seriess) == 1:
+        return await load_series(seriess[0]["id"])
+    return await load_panel(seriess)
 
 @orchestrator_agent.tool_plain
 async def generate_and_execute_sql(database_info: DatabaseInfo, question: str) -> str | None:
@@ -70,6 +151,77 @@ async def generate_and_execute_sql(database_info: DatabaseInfo, question: str) -
     Returns:
         str: The answer to the user question. Returns None if there if the SQL query fails.
     """
-    answer = await execute_sql_agent.run(question, deps=database_info)
-    logfire.info(answer.output)
-    return answer.output
\ No newline at end of file
+    with metrics.stage("answer"):
+        # Common question shapes are answered from SQL templates; the agents are the fallback
+        answer = await asyncio.to_thread(
+            answer_from_intent,
+            question,
+            database_info.relation_name,
+            database_info.db_schema,
+            database_info.db_path,
+            database_info.summary,
+        )
+        metrics.inc("fast_path_total", outcome="miss" if answer is None else "hit")
+        if answer is not None:
+            return answer
+        answer = await answer_with_sql(database_info, question)
+    logfire.info(f"Answer: {answer}")
+    return answer
+
+async def stream_question(question: str) -> AsyncIterator[ProgressEvent]:
+    """
+    Answer a question with the orchestrator agent, reporting progress as it goes.
+
+    Events are yielded as the stages complete: SeriesChosen, DataLoaded and SqlGenerated, then the
+    final answer as AnswerDelta events while the model streams it, and a last Answer event with the
+    whole answer. Closing the iterator early, or cancelling the task consuming it, cancels the run.
+
+    Args:
+        question (str): The user question
+
+    Yields:
+        ProgressEvent: The progress of the run
+    """
+    loop = asyncio.get_running_loop()
+    events: asyncio.Queue[ProgressEvent | None] = asyncio.Queue()
+
+    def sink(event: ProgressEvent) -> None:
+        loop.call_soon_threadsafe(events.put_nowait, event)
+
+    async def run() -> None:
+        # Set inside the task, so the sink only sees this run's stages
+        progress_sink.set(sink)
+        text, answering = "", False
+        async with orchestrator_agent.run_stream_events(question) as stream:
+            async for event in stream:
+                if isinstance(event, PartStartEvent) and isinstance(event.part, TextPart):
+                    text = event.part.content
+                    if answering and text:
+                        sink(AnswerDelta(text=text))
+                elif isinstance(event, PartDeltaEvent) and isinstance(event.delta, TextPartDelta):
+                    if answering:
+                        sink(AnswerDelta(text=event.delta.content_delta))
+                    else:
+                        text += event.delta.content_delta
+                elif isinstance(event, FinalResultEvent):
+                    # Text before the final result may belong to a response that goes on to call tools
+                    answering = True
+                    if text:
+                        sink(AnswerDelta(text=text))
+                elif isinstance(event, AgentRunResultEvent):
+                    logfire.info(f"Answer: {event.result.output}")
+                    sink(Answer(text=event.result.output))
+
+    task = asyncio.create_task(run())
+    task.add_done_callback(lambda _: loop.call_soon_threadsafe(events.put_nowait, None))
+    try:
+        while (event := await events.get()) is not None:
+            yield event
+        task.result()
+    finally:
+        task.cancel()
+        # Wait for the run to unwind, so no tool work outlives the stream. asyncio.wait does not
+        # raise the run's own cancellation, so a cancellation of the consumer still propagates
+        await asyncio.wait([task])
+        if not task.cancelled():
+            task.exception()    # Retrieved so an error while unwinding is not reported as never retrieved
@@ -0,0 +1,103 @@
+from pathlib import Path
+import logfire
+
+from series_store import SERIES_DB_PATH, connect, get_series_summary, series_table_name
+
+# FRED frequency codes from finest to coarsest
+FREQUENCY_ORDER = ["D", "W", "BW", "M", "Q", "SA", "A"]
+# Period a date falls in at each harmonized frequency; finer frequencies are aligned as-of instead
+PERIOD_EXPRESSIONS = {
+    "M": "date_trunc('month', period_start_date)::DATE",
+    "Q": "date_trunc('quarter', period_start_date)::DATE",
+    "SA": "make_date(year(period_start_date), CASE WHEN month(period_start_date) <= 6 THEN 1 ELSE 7 END, 1)",
+    "A": "date_trunc('year', period_start_date)::DATE",
+}
+FREQUENCY_NAMES = {
+    "D": "daily", "W": "weekly", "BW": "biweekly", "M": "monthly", "Q": "quarterly", "SA": "semiannual", "A": "annual",
+}
+
+
+def panel_table_name(series_ids: list[str]) -> str:
+    return "panel_" + "_".join(sorted(series_table_name(series_id) for series_id in series_ids))
+
+
+def build_panel(seriess: list[dict], db_path: Path = SERIES_DB_PATH) -> dict:
+    """
+    Build a wide table with one column per series, aligned on a common date column.
+
+    Series are harmonized to the coarsest frequency among them by averaging every
+    observation in a period, e.g. monthly series become quarterly averages next to a
+    quarterly series. When every series is daily, weekly or biweekly, the other series are
+    joined as of each date of the first one, i.e. their latest value on or before it, and
+    the panel has the frequency of the first one.
+    Only current-vintage observations are used.
+
+    Parameters
+    ----------
+    seriess : list[dict]
+        Series already in the series store, as {"title": ..., "id": ...}
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    dict
+        'table_name' of the panel, its 'frequency' code, its 'row_count', and 'series', the
+        series with the 'column' holding them and their own 'frequency' code
+    """
+    summaries = [get_series_summary(series_table_name(series["id"]), db_path) for series in seriess]
+    missing = [series["id"] for series, summary in zip(seriess, summaries) if summary is None]
+    if missing:
+        raise ValueError(f"Series not in the store: {', '.join(missing)}")
+    frequencies = [summary["frequency"] or "A" for summary in summaries]
+    frequency = max(frequencies, key=FREQUENCY_ORDER.index)
+    if frequency not in PERIOD_EXPRESSIONS:
+        # Aligned as of the dates of the first series, so the panel has its frequency
+        frequency = frequencies[0]
+    table_name = panel_table_name([series["id"] for series in seriess])
+
+    aligned = []
+    for i, summary in enumerate(summaries):
+        current = f'"{summary["value_column"]}" IS NOT NULL AND realtime_end_date IS NULL'
+        period = PERIOD_EXPRESSIONS.get(frequency, "period_start_date")
+        aligned.append(
+            f's{i} AS (SELECT {period} AS period, AVG("{summary["value_column"]}") AS value '
+            f'FROM {summary["table_name"]} WHERE {current} GROUP BY 1)'
+        )
+    columns = ", ".join(f's{i}.value AS "{series["id"]}"' for i, series in enumerate(seriess))
+    if frequency in PERIOD_EXPRESSIONS:
+        periods = " UNION ".join(f"SELECT period FROM s{i}" for i in range(len(seriess)))
+        joins = " ".join(f"LEFT JOIN s{i} ON s{i}.period = periods.period" for i in range(len(seriess)))
+        select = f"SELECT periods.period AS period_start_date, {columns} FROM ({periods}) AS periods {joins}"
+    else:
+        joins = " ".join(f"ASOF LEFT JOIN s{i} ON s0.period >= s{i}.period" for i in range(1, len(seriess)))
+        select = f"SELECT s0.period AS period_start_date, {columns} FROM s0 {joins}"
+
+    conn = connect(db_path)
+    conn.execute(f"CREATE OR REPLACE TABLE {table_name} AS WITH {', '.join(aligned)} {select} ORDER BY period_start_date")
+    row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    logfire.info(f"Built {FREQUENCY_NAMES[frequency]} panel {table_name} with {row_count} rows")
+    return {
+        "table_name": table_name,
+        "frequency": frequency,
+        "row_count": row_count,
+        "series": [
+            {"title": series["title"], "id": series["id"], "column": series["id"], "frequency": series_frequency}
+            for series, series_frequency in zip(seriess, frequencies)
+        ],
+    }
+
+
+def describe_panel(panel: dict) -> str:
+    """Describe the columns of a panel for a prompt"""
+    lines = [
+        f"The table is a panel with one row per {FREQUENCY_NAMES[panel['frequency']]} period, keyed by period_start_date, "
+        "and one column per series:"
+    ]
+    for series in panel["series"]:
+        line = f'- "{series["column"]}": {series["title"]} ({FREQUENCY_NAMES[series["frequency"]]}'
+        if series["frequency"] != panel["frequency"]:
+            line += f", averaged to {FREQUENCY_NAMES[panel['frequency']]}" if panel["frequency"] in PERIOD_EXPRESSIONS else ", latest value as of each date"
+        lines.append(line + ")")
+    lines.append("A column is NULL for periods the series has no observation for. Quote the column names.")
+    return "\n".join(lines)
@@ -1,11 +1,30 @@
 import zipfile
 import logfire
 from pathlib import Path
+from collections import OrderedDict
 import csv
+import re
 from datetime import datetime
 import random
+import copy
+import os
 
-logfire.configure(send_to_logfire=True)
+from metrics import metrics
+
+SCHEMA_SAMPLE_SIZE = 100
+SCHEMA_CACHE_MAX_ENTRIES = 256
+
+# Checked in order, so the most specific type that matches every value wins
+TYPE_PATTERNS = {
+    'integer': re.compile(r'[+-]?\d+'),
+    'float': re.compile(r'[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?'),
+    'date': re.compile(r'\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])'),
+    'timestamp': re.compile(r'\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])([ T]\d{2}:\d{2}(:\d{2}(\.\d+)?)?)?'),
+}
+MISSING_VALUES = {'', '.'}
+
+# (resolved path, size, mtime_ns, sample_size) -> schema
+_schema_cache: OrderedDict[tuple, dict] = OrderedDict()
 
 def zipfile_to_csv(zip_path: Path, csv_path: Path = Path("data/csv")) -> list[Path]:
     """
@@ -49,45 +68,68 @@ def zipfile_to_csv(zip_path: Path, csv_path: Path = Path("data/csv")) -> list[Pa
     return unzipped_files
 
 
-def get_csv_schema(filepath):
+def get_csv_schema(filepath, sample_size: int = SCHEMA_SAMPLE_SIZE):
     """
     Get the schema of a CSV file.
 
+    Rows are sampled with a single-pass reservoir sampler, so memory stays constant
+    regardless of file size. Schemas are cached by path, size and modification time,
+    so asking again about an unchanged file skips inference entirely.
+
     Parameters
     ----------
     filepath : Path
         Path to the CSV file to get the schema of
 
+    sample_size : int, optional
+        Number of rows to sample to infer the types of the columns. Defaults to 100
+
     Returns
     -------
     dict
         A dictionary containing the schema of the CSV file.
-        The dictionary will have three keys: 'columns', 'types', and 'sample_size'.
+        The dictionary will have four keys: 'columns', 'types', 'nullable' and 'sample_size'.
         The value for 'columns' will be a list of column names.
         The value for 'types' will be a dictionary where the keys are column names and the values are the inferred types of the columns.
+        The value for 'nullable' will be a dictionary where the keys are column names and the values are whether missing values were sampled.
         The value for 'sample_size' will be the number of rows that were sampled to infer the types of the columns.
     """
-    with open(filepath, 'r') as f:
+    stat = os.stat(filepath)
+    cache_key = (str(Path(filepath).resolve()), stat.st_size, stat.st_mtime_ns, sample_size)
+    if cache_key in _schema_cache:
+        _schema_cache.move_to_end(cache_key)
+        return copy.deepcopy(_schema_cache[cache_key])
+
+    with metrics.stage("schema"), open(filepath, 'r') as f:
         reader = csv.reader(f)
         
         # Get headers
         headers = next(reader)
         
-        # Randomly sample 100 rows to infer types
-        rows = list(reader)
-        sample_rows = random.sample(rows, min(100, len(rows)))
-        
-        # Infer types for each column
-        schema = {}
-        for i, header in enumerate(headers):
-            column_values = [row[i] for row in sample_rows if i < len(row)]
-            schema[header] = infer_type(column_values)
+        # Reservoir sample rows to infer types (Algorithm R)
+        sample_rows = []
+        rows_scanned = 0
+        for i, row in enumerate(reader):
+            rows_scanned = i + 1
+            if i < sample_size:
+                sample_rows.append(row)
+            else:
+                j = random.randint(0, i)
+                if j < sample_size:
+                    sample_rows[j] = row
+        metrics.inc("csv_rows_scanned_total", rows_scanned)
         
-        return {
-            'columns': headers,
-            'types': schema,
-            'sample_size': len(sample_rows)
-        }
+    inferred = infer_types(headers, sample_rows)
+    result = {
+        'columns': headers,
+        'types': inferred['types'],
+        'nullable': inferred['nullable'],
+        'sample_size': len(sample_rows)
+    }
+    _schema_cache[cache_key] = result
+    if len(_schema_cache) > SCHEMA_CACHE_MAX_ENTRIES:
+        _schema_cache.popitem(last=False)
+    return copy.deepcopy(result)
 
 def infer_type(values):
     """
@@ -130,3 +172,52 @@ def infer_type(values):
         pass
     
     return 'string'
+
+
+def infer_types(headers: list[str], rows) -> dict:
+    """
+    Infer the types of all columns in a single pass over the rows.
+
+    Every column starts with all candidate types and drops a candidate the first time a
+    value fails its pattern, so each value is only checked against the candidates that
+    are still alive. FRED's "." marker and blank cells count as missing values.
+
+    Parameters
+    ----------
+    headers : list[str]
+        Column names
+    rows : Iterable[list[str]]
+        Rows of raw string values
+
+    Returns
+    -------
+    dict
+        A dictionary with two keys, 'types' and 'nullable'.
+        The value for 'types' maps each column name to one of 'integer', 'float', 'date',
+        'timestamp', 'string' or 'empty' (only missing values).
+        The value for 'nullable' maps each column name to whether missing values were seen.
+    """
+    candidates = [list(TYPE_PATTERNS) for _ in headers]
+    seen = [False] * len(headers)
+    nullable = [False] * len(headers)
+    for row in rows:
+        for i, value in enumerate(row[:len(headers)]):
+            value = value.strip()
+            if value in MISSING_VALUES:
+                nullable[i] = True
+                continue
+            seen[i] = True
+            alive = candidates[i]
+            if alive:
+                candidates[i] = [t for t in alive if TYPE_PATTERNS[t].fullmatch(value)]
+
+    types = {}
+    for i, header in enumerate(headers):
+        if not seen[i]:
+            types[header] = 'empty'
+        else:
+            types[header] = candidates[i][0] if candidates[i] else 'string'
+    return {
+        'types': types,
+        'nullable': dict(zip(headers, nullable)),
+    }
@@ -0,0 +1,60 @@
+from collections.abc import Callable
+from contextvars import ContextVar
+from dataclasses import dataclass, asdict
+from typing import ClassVar
+
+
+@dataclass
+class ProgressEvent:
+    """Something a streaming run reports as it happens"""
+    kind: ClassVar[str] = "progress"
+
+    def to_dict(self) -> dict:
+        return {"event": self.kind, **asdict(self)}
+
+
+@dataclass
+class SeriesChosen(ProgressEvent):
+    kind: ClassVar[str] = "series_chosen"
+    series_id: str
+    title: str
+    cached: bool = False            # Taken from the resolution cache
+
+
+@dataclass
+class DataLoaded(ProgressEvent):
+    kind: ClassVar[str] = "data_loaded"
+    table_name: str
+    rows: int | None
+    series_ids: list[str]
+
+
+@dataclass
+class SqlGenerated(ProgressEvent):
+    kind: ClassVar[str] = "sql_generated"
+    sql: str
+    source: str                     # "template" or "model"
+
+
+@dataclass
+class AnswerDelta(ProgressEvent):
+    kind: ClassVar[str] = "answer_delta"
+    text: str
+
+
+@dataclass
+class Answer(ProgressEvent):
+    kind: ClassVar[str] = "answer"
+    text: str
+
+
+# Receives the events of the current context, e.g. set by orchestrator.stream_question.
+# Must be safe to call from worker threads, since some stages run in asyncio.to_thread.
+progress_sink: ContextVar[Callable[[ProgressEvent], None] | None] = ContextVar("progress_sink", default=None)
+
+
+def emit(event: ProgressEvent) -> None:
+    """Report an event to the current context's sink, if anyone is listening"""
+    sink = progress_sink.get()
+    if sink is not None:
+        sink(event)
@@ -1,13 +1,116 @@
 from dotenv import load_dotenv
-import requests as r
+from urllib.parse import unquote_plus
+from datetime import date, timedelta
+from pathlib import Path
+import asyncio
+import zipfile
+import time
 import os
 import logfire
 
+from fred_client import FRED_API_URL, fred_get, run_sync
+from disk_cache import DiskCache
+from series_catalog import SERIES_CATALOG_PATH, SeriesCatalog
+from single_flight import SingleFlight
+from file_lock import async_file_lock
+from metrics import metrics, log_payload
+from series_store import SERIES_DB_PATH, series_table_name, has_table, ingest_zip, append_observations, get_observations_state
+from vintage_store import ingest_vintages_zip
+
 load_dotenv()
-logfire.configure(send_to_logfire=True)
 
 FRED_SEARCH_LIMIT = 20
-FRED_API_URL = "https://api.stlouisfed.org/fred"
+SEARCH_CACHE_PATH = Path("data/cache/search.sqlite")
+SEARCH_CACHE_TTL = float(os.getenv("FRED_SEARCH_CACHE_TTL", 24 * 60 * 60))
+SEARCH_CACHE_STALE_TTL = float(os.getenv("FRED_SEARCH_CACHE_STALE_TTL", 7 * 24 * 60 * 60))   # 0 disables stale-while-revalidate
+SEARCH_CACHE_MAX_ENTRIES = 1000
+FRED_REALTIME_OPEN_END = "9999-12-31"
+FRED_REALTIME_ORIGIN = "1776-07-04"     # Earliest real-time date FRED accepts, so every vintage is included
+
+search_cache = DiskCache(
+    SEARCH_CACHE_PATH,
+    ttl=SEARCH_CACHE_TTL,
+    max_entries=SEARCH_CACHE_MAX_ENTRIES,
+    stale_ttl=SEARCH_CACHE_STALE_TTL,
+)
+series_catalog = SeriesCatalog(SERIES_CATALOG_PATH)
+_revalidations: set[asyncio.Task] = set()
+_search_flights = SingleFlight()
+_download_flights = SingleFlight()
+_incremental_flights = SingleFlight()
+metrics.register_collector("search_cache", lambda: {f"cache_{name}": count for name, count in search_cache.stats().items()})
+
+def search_cache_key(keywords: str) -> str:
+    """
+    Normalize keywords into a search cache key, so "Unemployment+Rate" and " unemployment  rate" share an entry
+
+    Parameters
+    ----------
+    keywords : str
+        Keywords to search for, raw or URL-encoded
+
+    Returns
+    -------
+    str
+        Cache key including FRED_SEARCH_LIMIT
+    """
+    normalized = " ".join(unquote_plus(keywords).lower().split())
+    return f"{normalized}|limit={FRED_SEARCH_LIMIT}"
+
+async def _fetch_search(keywords: str) -> dict | None:
+    params = {
+        "search_text": unquote_plus(keywords),
+        "file_type": "json",
+        "limit": FRED_SEARCH_LIMIT,
+    }
+    try:
+        response = await fred_get("series/search", params)
+        response.raise_for_status()
+        response = response.json()
+    except Exception as e:
+        logfire.error(f"Error searching FRED: {e}")
+        return None
+    log_payload("FRED search response for {keywords}", lambda: response, keywords=keywords)
+    if "seriess" in response:
+        search_cache.set(search_cache_key(keywords), response)
+        series_catalog.add_seriess(response["seriess"])
+    return response
+
+async def search_keywords_async(keywords: str) -> dict | None:
+    """
+    Search for keywords in the Federal Reserve Economic Data (FRED) API without blocking the event loop
+
+    Parameters
+    ----------
+    keywords : str
+        Keywords to search for. May already be URL-encoded, e.g. by search_agent.sanitize_keywords.
+        Responses are served from search_cache when possible; stale entries are returned
+        immediately and refreshed in the background.
+
+    Returns
+    -------
+    dict | None
+        JSON response from the FRED API, or None if the request fails
+    """
+    with logfire.span("search_keywords {keywords}", keywords=keywords) as span:
+        cached = search_cache.get(search_cache_key(keywords))
+        outcome = "miss" if cached is None else "hit" if cached[1] else "stale"
+        metrics.inc("search_cache_total", outcome=outcome)
+        if cached is None:
+            span.set_attribute("cache", "miss")
+            # Concurrent searches for the same keywords share one request
+            response = await _search_flights.run(search_cache_key(keywords), lambda: _fetch_search(keywords))
+        else:
+            response, fresh = cached
+            span.set_attribute("cache", "hit" if fresh else "stale")
+            if not fresh and not _search_flights.in_flight(search_cache_key(keywords)):
+                # Revalidations share the flight of misses, so concurrent stale reads make one request
+                task = asyncio.create_task(_search_flights.run(search_cache_key(keywords), lambda: _fetch_search(keywords)))
+                _revalidations.add(task)
+                task.add_done_callback(_revalidations.discard)
+        for name, count in search_cache.stats().items():
+            span.set_attribute(f"cache_{name}", count)
+    return response
 
 def search_keywords(keywords: str) -> dict | None:
     """
@@ -23,14 +126,138 @@ def search_keywords(keywords: str) -> dict | None:
     dict | None
         JSON response from the FRED API, or None if the request fails
     """
-    keywords = keywords.replace(" ", "+")
-    api_key = str(os.getenv("FRED_API_KEY"))
-    url = f"{FRED_API_URL}/series/search?search_text={keywords}&api_key={api_key}&file_type=json&limit={FRED_SEARCH_LIMIT}"
-    response = r.get(url).json()
-    logfire.info(f"Response: {response}")
-    return response
+    return run_sync(search_keywords_async(keywords))
+
+def validate_zip(zip_path: Path) -> None:
+    """
+    Check that a downloaded observations zip is complete before it is published
+
+    Parameters
+    ----------
+    zip_path : Path
+        Path to the zip file
 
-def pull_observations(series_id: str) -> dict:
+    Raises
+    ------
+    zipfile.BadZipFile
+        If the file is not a zip or a member fails its CRC check
+    ValueError
+        If the zip holds no CSV files
+    """
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        bad_member = zip_ref.testzip()
+        if bad_member is not None:
+            raise zipfile.BadZipFile(f"Corrupt member {bad_member} in {zip_path}")
+        if not any(name.endswith(".csv") for name in zip_ref.namelist()):
+            raise ValueError(f"No CSV files found in {zip_path}")
+
+async def _fetch_observations_zip(series_id: str, vintages: bool = False) -> dict:
+    zip_path = Path(f"data/{series_id}_vintages.zip" if vintages else f"data/{series_id}.zip")
+    params = {"series_id": series_id, "file_type": "csv"}
+    if vintages:
+        params.update(realtime_start=FRED_REALTIME_ORIGIN, realtime_end=FRED_REALTIME_OPEN_END)
+    tmp_path = zip_path.with_name(f".{zip_path.name}.{os.getpid()}.tmp")
+    requested_at = time.time()
+    try:
+        async with async_file_lock(zip_path.with_name(f"{zip_path.name}.lock")):
+            # Another process may have published the zip while we waited for the lock
+            if zip_path.is_file() and zip_path.stat().st_mtime >= requested_at:
+                logfire.info(f"Zip file published by another process: {zip_path}")
+                return {"success": True, "zip_path": str(zip_path)}
+
+            response = await fred_get("series/observations", params)
+            response.raise_for_status()
+            with open(tmp_path, "wb") as f:
+                f.write(response.content)
+            validate_zip(tmp_path)
+            os.replace(tmp_path, zip_path)
+        logfire.info(f"Zip file saved: {zip_path}")
+    except Exception as e:
+        logfire.error(f"Error saving zip file: {e}")
+        tmp_path.unlink(missing_ok=True)
+        return {"success": False, "error": e}
+    return {"success": True, "zip_path": str(zip_path)}
+
+async def _download_observations_zip(series_id: str) -> dict:
+    # Concurrent pulls of a series in this process share one download; other processes
+    # are serialized by the lock file and reuse the zip if it was published while they waited
+    with metrics.stage("download", series_id=series_id):
+        return await _download_flights.run(series_id, lambda: _fetch_observations_zip(series_id))
+
+async def _pull_observations_delta(series_id: str, table_name: str, state: dict, db_path: Path) -> dict:
+    observation_start = date.fromisoformat(state["last_period_start_date"]) + timedelta(days=1)
+    params = {
+        "series_id": series_id,
+        "file_type": "json",
+        "observation_start": observation_start.isoformat(),
+        "realtime_start": state["realtime_start"],
+        "realtime_end": FRED_REALTIME_OPEN_END,
+    }
+    try:
+        with metrics.stage("download", series_id=series_id):
+            response = await fred_get("series/observations", params)
+        observations = response.json()["observations"]
+    except Exception as e:
+        logfire.error(f"Error pulling new observations for {series_id}: {e}")
+        return {"success": False, "error": e}
+
+    rows = []
+    for observation in observations:
+        value = None if observation["value"] == "." else observation["value"]
+        realtime_end = None if observation["realtime_end"] == FRED_REALTIME_OPEN_END else observation["realtime_end"]
+        rows.append((observation["date"], value, observation["realtime_start"], realtime_end))
+    await asyncio.to_thread(append_observations, table_name, rows, db_path)
+    logfire.info(f"Appended {len(rows)} observations to {table_name} ({len(response.content)} bytes downloaded)")
+    return {"success": True, "table_name": table_name, "appended": len(rows)}
+
+async def pull_observations_async(series_id: str, incremental: bool = False, db_path: Path = SERIES_DB_PATH) -> dict:
+    """
+    Pull observations from the Federal Reserve Economic Data (FRED) API without blocking the event loop
+
+    Parameters
+    ----------
+    series_id : str
+        Series ID to pull observations for
+    incremental : bool, optional
+        If True, keep the series in the series store and only request observations newer than the
+        last period_start_date and realtime vintage stored there, appending them to its table. The
+        full zip is only downloaded, and streamed into the store, the first time. Defaults to False.
+    db_path : Path, optional
+        Series store used in incremental mode. Defaults to series_store.SERIES_DB_PATH
+
+    Returns
+    -------
+    dict
+        success or failure of downloading and saving data, with path to zip file.
+        In incremental mode the series table is returned as 'table_name', with the number of
+        rows 'appended' (None after a full download).
+    """
+    if not incremental:
+        return await _download_observations_zip(series_id)
+    # Two concurrent deltas would append the same rows twice, so they share one pull
+    return await _incremental_flights.run(
+        f"{Path(db_path).resolve()}:{series_id}", lambda: _pull_observations_incremental(series_id, db_path)
+    )
+
+async def _pull_observations_incremental(series_id: str, db_path: Path) -> dict:
+    table_name = series_table_name(series_id)
+    if has_table(table_name, db_path):
+        state = get_observations_state(table_name, db_path)
+        if state["last_period_start_date"]:
+            return await _pull_observations_delta(series_id, table_name, state, db_path)
+
+    result = await _download_observations_zip(series_id)
+    if result["success"] is False:
+        return result
+    try:
+        with metrics.stage("ingest", series_id=series_id):
+            await asyncio.to_thread(ingest_zip, Path(result["zip_path"]), series_id, db_path)
+    except Exception as e:
+        logfire.error(f"Error ingesting {result['zip_path']}: {e}")
+        return {"success": False, "error": e}
+    return {**result, "table_name": table_name, "appended": None}
+
+def pull_observations(series_id: str, incremental: bool = False, db_path: Path = SERIES_DB_PATH) -> dict:
     """
     Pull observations from the Federal Reserve Economic Data (FRED) API
 
@@ -38,22 +265,58 @@ def pull_observations(series_id: str) -> dict:
     ----------
     series_id : str
         Series ID to pull observations for
+    incremental : bool, optional
+        Only fetch observations newer than the local copy. See pull_observations_async.
 
     Returns
     -------
-    dict | None
+    dict
         success or failure of downloading and saving data, with path to zip file.
     """
+    return run_sync(pull_observations_async(series_id, incremental, db_path))
+
+async def pull_vintages_async(series_id: str, db_path: Path = SERIES_DB_PATH) -> dict:
+    """
+    Pull every vintage of a series from ALFRED into the vintage store, for point-in-time lookups
+    with vintage_store.get_snapshot
 
-    api_key = str(os.getenv("FRED_API_KEY"))
-    url = f"{FRED_API_URL}/series/observations?series_id={series_id}&api_key={api_key}&file_type=csv"
-    response = r.get(url)
-    zip_path = f"data/{series_id}.zip"
+    Parameters
+    ----------
+    series_id : str
+        Series ID to pull vintages for
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to series_store.SERIES_DB_PATH
+
+    Returns
+    -------
+    dict
+        success or failure of downloading and storing the vintages, with path to zip file
+        and the vintages table as 'table_name'.
+    """
+    with metrics.stage("download", series_id=series_id, vintages=True):
+        result = await _download_flights.run(f"{series_id}:vintages", lambda: _fetch_observations_zip(series_id, vintages=True))
+    if result["success"] is False:
+        return result
     try:
-        with open(zip_path, "wb") as f:
-            f.write(response.content)
-        logfire.info(f"Zip file saved: {zip_path}")
+        with metrics.stage("ingest", series_id=series_id, vintages=True):
+            table_name = await asyncio.to_thread(ingest_vintages_zip, Path(result["zip_path"]), series_id, db_path)
     except Exception as e:
-        logfire.error(f"Error saving zip file: {e}")
+        logfire.error(f"Error ingesting vintages {result['zip_path']}: {e}")
         return {"success": False, "error": e}
-    return {"success": True, "zip_path": zip_path}
\ No newline at end of file
+    return {**result, "table_name": table_name}
+
+def pull_vintages(series_id: str, db_path: Path = SERIES_DB_PATH) -> dict:
+    """
+    Pull every vintage of a series from ALFRED into the vintage store. See pull_vintages_async.
+
+    Parameters
+    ----------
+    series_id : str
+        Series ID to pull vintages for
+
+    Returns
+    -------
+    dict
+        success or failure of downloading and storing the vintages, with the vintages table as 'table_name'.
+    """
+    return run_sync(pull_vintages_async(series_id, db_path))
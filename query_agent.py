@@ -1,48 +1,61 @@
 from dataclasses import dataclass
 
-from pydantic import Field
-from pydantic_ai import Agent, RunContext, ModelRetry
-from pydantic_ai.models.openai import OpenAIChatModel
-from pydantic_ai.providers.ollama import OllamaProvider
-from urllib.parse import quote
+from pydantic_ai import Agent, RunContext
 from pathlib import Path
+import asyncio
+import re
 import duckdb
 
-from process_data import get_csv_schema
+from db_session import SERIES_DB_PATH, get_session
+from panel import describe_panel
+from metrics import metrics, log_payload, model_retry
+from progress import SqlGenerated, emit
+from result_shaping import ShapedResult, execute_shaped
+from runtime import agent_model
 
 import logfire
 
-logfire.configure()
-logfire.instrument_pydantic_ai()
-
-ollama_model = OpenAIChatModel(
-    model_name='granite4:7b-a1b-h',
-    provider=OllamaProvider(),  
-)
-
 @dataclass
 class DatabaseInfo():
-    csv_path: Path
+    table_name: str
     db_schema: dict
+    db_path: Path = SERIES_DB_PATH
+    view_name: str | None = None    # Registered in the db_session, queried instead of the table when set
+    summary: dict | None = None     # From series_store.get_series_summary
+    panel: dict | None = None       # From panel.build_panel, when the table aligns several series
+
+    @property
+    def relation_name(self) -> str:
+        return self.view_name or self.table_name
+
+    @property
+    def relation_names(self) -> list[str]:
+        """Tables and views queries may use"""
+        if self.summary is None:
+            return [self.relation_name]
+        return [self.relation_name, self.summary["periods_table"]]
+
+def describe_summary(summary: dict) -> str:
+    return f"""The series has {summary['observations']} observations (frequency {summary['frequency']}) from {summary['first_date']} to {summary['last_date']}.
+The latest observation is {summary['latest_value']} on {summary['latest_date']}.
+Yearly and quarterly aggregates are precomputed in the table {summary['periods_table']} with columns
+period_type ('year' or 'quarter'), period_start, observations, first_date, last_date, average, minimum, minimum_date,
+maximum, maximum_date and yoy_growth (growth of the average over the same period a year earlier, as a fraction).
+Prefer it to scanning the series for yearly or quarterly averages, minimums, maximums and growth.
+"""
 
 sql_agent = Agent(
-    model=ollama_model,
+    model=agent_model("sql_agent"),
     deps_type=DatabaseInfo,
     output_type=str,
 )
 
 @sql_agent.system_prompt
 async def get_system_prompt(ctx: RunContext[DatabaseInfo]) -> str:
-    db_schema = None
-    try:
-        relation = duckdb.read_csv(ctx.deps.csv_path)
-        db_schema = relation.columns
-    except Exception as e:
-        db_schema = ctx.deps.db_schema
-
+    db_schema = ctx.deps.db_schema["types"]
     system_prompt = f"""\
 You are an agent that generates SQL queries from user question.
-The table name is read_csv_auto('{str(ctx.deps.csv_path).replace('\\', '/')}'
+The table name is {ctx.deps.relation_name}
 The database schema is the following:
 
 {db_schema}
@@ -50,67 +63,111 @@ The database schema is the following:
 Use the user question provided to generate SQL queries to query a database.
 Respond with only the SQL query. Do not include any other text.
 """
+    if ctx.deps.summary is not None:
+        system_prompt += "\n" + describe_summary(ctx.deps.summary)
+    if ctx.deps.panel is not None:
+        system_prompt += "\n" + describe_panel(ctx.deps.panel)
     return system_prompt
 
+SQL_FENCE_PATTERN = re.compile(r"^\s*```(?:sql)?\s*(.*?)\s*```\s*$", re.DOTALL | re.IGNORECASE)
+
+def strip_sql(output: str) -> str:
+    """Remove a markdown code fence and trailing semicolons around a generated query"""
+    match = SQL_FENCE_PATTERN.match(output)
+    if match:
+        output = match.group(1)
+    return output.strip().rstrip(";").strip()
+
+def explain_sql(sql_query: str, db_path: Path = SERIES_DB_PATH) -> None:
+    """
+    Check that a query is a single SELECT that DuckDB can parse and bind against the store, without running it.
+
+    Args:
+        sql_query (str): The SQL query
+        db_path (Path): Path to the DuckDB database file
+
+    Raises:
+        ValueError: If the query is not exactly one SELECT statement
+        duckdb.Error: The parser or binder error for the query
+    """
+    statements = duckdb.extract_statements(sql_query)
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise ValueError("Respond with exactly one SELECT statement.")
+    get_session(db_path).execute(f"EXPLAIN {sql_query}")
+
 @sql_agent.output_validator
 async def validate_sql_query(ctx: RunContext[DatabaseInfo], output: str) -> str:
-    table_name = f"read_csv_auto('{str(ctx.deps.csv_path).replace('\\', '/')}'"
+    table_names = ctx.deps.relation_names
+    output = strip_sql(output or "")
     if not output:
-        raise ModelRetry("Please respond with an SQL query.")
-    if output.find(table_name) < 0:
-        raise ModelRetry(f"Please respond with an SQL query that uses the table name {table_name}.")
-    
+        raise model_retry("sql_agent", "Please respond with an SQL query.")
+    if not any(re.search(rf"\b{re.escape(table_name)}\b", output, re.IGNORECASE) for table_name in table_names):
+        raise model_retry("sql_agent", f"Please respond with an SQL query that uses the table name {' or '.join(table_names)}.")
+    try:
+        await asyncio.to_thread(explain_sql, output, ctx.deps.db_path)
+    except (ValueError, duckdb.Error) as e:
+        # The exact parser or binder error tells the model what to fix
+        raise model_retry("sql_agent", f"The SQL query is invalid:\n{e}\nPlease respond with a corrected SQL query.")
     return output
 
 
-execute_sql_agent = Agent(
-    model=ollama_model,
-    deps_type=DatabaseInfo,
+answer_agent = Agent(
+    model=agent_model("answer_agent"),
     output_type=str,
     system_prompt="""\
-You are an agent that generates, validates and executes SQL queries.
-Use the get_sql_query tool to generate SQL queries.
-Every time an SQL query is generated, validate it and execute it.
-Always use the execute_sql_query tool to execute the SQL query.
-If the generated SQL query fails to validate or fails to execute, try to modify the question and generate a new SQL query.
-
-Use the result of the SQL query to answer the user question.
+You are an agent that answers a user question from the result of an SQL query.
+You are given the question, the SQL query that was run and its result.
+Answer the question in one or two sentences using only the result. Include the relevant numbers and dates.
 """
 )
 
-@execute_sql_agent.tool
-async def get_sql_query(ctx: RunContext[DatabaseInfo], question: str) -> str:
+def execute_sql(database_info: DatabaseInfo, sql_query: str) -> ShapedResult:
     """
-    Runs the SQL agent to generate an SQL query based on the user question and database information.
+    Executes an SQL query on the series store, keeping only as much of the result as the answer prompt can hold.
 
     Args:
-        ctx (RunContext[DatabaseInfo]): The context containing the database information.
-        question (str): The user question.
+        database_info (DatabaseInfo): The database information of the series
+        sql_query (str): The SQL query to execute
 
     Returns:
-        str: The generated SQL query.
+        ShapedResult: The first and last rows of the result and statistics over all of it.
+            The full result can be fetched with result_shaping.fetch_result and its handle.
     """
-    result = await sql_agent.run(question, deps=ctx.deps)
-    sql_query = result.output
-    return sql_query
-
-
-@execute_sql_agent.tool_plain
-async def execute_sql_query(sql_query: str) -> str|None:
+    with metrics.stage("execute"):
+        result = execute_shaped(sql_query, database_info.db_path)
+    metrics.inc("sql_rows_returned_total", result.row_count)
+    if result.truncated:
+        metrics.inc("sql_results_truncated_total")
+    logfire.info(f"SQL execution returned {result.row_count} rows")
+    log_payload("SQL execution result", result.to_prompt)
+    return result
+
+async def answer_with_sql(database_info: DatabaseInfo, question: str) -> str | None:
     """
-    Executes the SQL query and returns the result.
+    Answers a question with one SQL query: the query is generated by the SQL agent, checked by DuckDB
+    before it is accepted, executed, and the result is phrased by the answer agent.
+    This takes two model calls unless the first query fails to validate.
 
     Args:
-        sql_query (str): The SQL query to execute.
+        database_info (DatabaseInfo): The database information of the series
+        question (str): The user question
 
     Returns:
-        str: The stringified result of the SQL query.
+        str | None: The answer, or None if the validated query still fails to execute
     """
-    sql_query.replace("\\", "") # sometimes read_csv_auto('tablename') escapes the '
+    with metrics.stage("sql gen"):
+        sql_query = (await sql_agent.run(question, deps=database_info)).output
+    emit(SqlGenerated(sql=sql_query, source="model"))
     try:
-        result = duckdb.sql(sql_query).fetchall()
-        logfire.info(f"SQL execution result: {str(result)}")
-        return str(result)
+        result = await asyncio.to_thread(execute_sql, database_info, sql_query)
     except duckdb.Error as e:
         logfire.error(f"SQL error: {e}")
-        return None
\ No newline at end of file
+        return None
+
+    prompt = f"""\
+Question: {question}
+SQL query: {sql_query}
+Result: {result.to_prompt()}
+"""
+    answer = await answer_agent.run(prompt)
+    return answer.output
@@ -0,0 +1,269 @@
+from collections import Counter
+from pathlib import Path
+import math
+import os
+import re
+import logfire
+
+from disk_cache import DiskCache
+
+RESOLUTION_CACHE_PATH = Path("data/cache/resolutions.sqlite")
+RESOLUTION_CACHE_TTL = float(os.getenv("RESOLUTION_CACHE_TTL", 30 * 24 * 60 * 60))
+RESOLUTION_CACHE_MAX_ENTRIES = int(os.getenv("RESOLUTION_CACHE_MAX_ENTRIES", 1000))
+RESOLUTION_SIMILARITY_THRESHOLD = float(os.getenv("RESOLUTION_SIMILARITY_THRESHOLD", 0.85))
+NGRAM_SIZE = 3
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "by", "did", "do", "does", "for", "from", "how", "in", "is",
+    "it", "me", "much", "of", "on", "over", "show", "tell", "that", "the", "to", "was", "were", "what",
+    "when", "which", "with",
+}
+# Years pick a slice of a series, not the series, so they are dropped before matching.
+# Other digits are kept so that e.g. M1 and M2 stay apart.
+YEAR_PATTERN = re.compile(r"\b(1[89]|20)\d{2}s?\b")
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+# Headline national series leave the country out of their titles, so these words add nothing to a question
+IMPLIED_WORDS = {"us", "u", "s", "usa", "united", "states", "america", "american", "national", "nationwide"}
+# Words naming a sex, group or place pick a different series when swapped for a similar-looking one,
+# so a near-match must use them exactly, like words with digits such as M2 or 10-year
+EXACT_WORDS = {
+    "men", "women", "male", "female", "males", "females", "black", "white", "hispanic", "latino", "asian", "african",
+    "youth", "teen", "teens", "adult", "adults", "veterans", "rural", "urban", "metro", "county", "city", "state",
+    "north", "south", "east", "west", "northeast", "midwest", "new", "alabama", "alaska", "arizona", "arkansas",
+    "california", "colorado", "connecticut", "delaware", "florida", "georgia", "hawaii", "idaho", "illinois", "indiana",
+    "iowa", "kansas", "kentucky", "louisiana", "maine", "maryland", "massachusetts", "michigan", "minnesota",
+    "mississippi", "missouri", "montana", "nebraska", "nevada", "hampshire", "jersey", "mexico", "york", "carolina",
+    "dakota", "ohio", "oklahoma", "oregon", "pennsylvania", "rhode", "island", "tennessee", "texas", "utah", "vermont",
+    "virginia", "washington", "wisconsin", "wyoming", "columbia", "puerto", "rico",
+}
+
+
+def normalize_question(question: str) -> str:
+    """
+    Reduce a question to its sorted content words, e.g.
+    "What is the US unemployment rate in 2023?" -> "rate unemployment us"
+
+    Parameters
+    ----------
+    question : str
+        User question
+
+    Returns
+    -------
+    str
+        Normalized question, used as the exact-match key
+    """
+    text = YEAR_PATTERN.sub(" ", question.lower())
+    tokens = {token for token in TOKEN_PATTERN.findall(text) if token not in STOPWORDS}
+    return " ".join(sorted(tokens))
+
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> Counter:
+    """Character n-grams of every word, padded so word boundaries count"""
+    grams = Counter()
+    for word in text.split():
+        padded = f" {word} "
+        grams.update(padded[i:i + n] for i in range(max(len(padded) - n + 1, 1)))
+    return grams
+
+
+def _within_edits(a: str, b: str, limit: int) -> bool:
+    """Whether a can be turned into b with at most `limit` insertions, deletions or substitutions"""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        if min(current) > limit:
+            return False
+        previous = current
+    return previous[-1] <= limit
+
+
+def spelling_variants(a: str, b: str) -> bool:
+    """Whether two words are the same word spelled differently, e.g. "labor" and "labour" or a typo"""
+    if a == b:
+        return True
+    if a in EXACT_WORDS or b in EXACT_WORDS or any(char.isdigit() for char in a + b):
+        return False
+    if a.rstrip("s") == b.rstrip("s"):
+        return True
+    shorter = min(len(a), len(b))
+    return shorter >= 4 and _within_edits(a, b, 1 if shorter < 8 else 2)
+
+
+def same_terms(key: str, other: str) -> bool:
+    """
+    Whether two normalized questions hold the same words, up to spelling variants and IMPLIED_WORDS
+
+    Parameters
+    ----------
+    key : str
+        Normalized question
+    other : str
+        Normalized question
+
+    Returns
+    -------
+    bool
+        True if every word of each pairs up with a spelling variant in the other
+    """
+    words = [word for word in key.split() if word not in IMPLIED_WORDS]
+    others = [word for word in other.split() if word not in IMPLIED_WORDS]
+    if len(words) != len(others):
+        return False
+    for word in words:
+        match = next((candidate for candidate in others if spelling_variants(word, candidate)), None)
+        if match is None:
+            return False
+        others.remove(match)
+    return True
+
+
+class ResolutionCache:
+    """
+    Cache of which series was picked for a question.
+
+    Lookups first try the normalized question as an exact key, then fall back to the
+    most similar cached question by cosine similarity of TF-IDF weighted character
+    n-grams, accepted only at or above `threshold` and if both questions hold the same
+    words up to spelling (see same_terms), so that "women" never matches "men" nor
+    "2-year" "10-year". Entries are stored in a DiskCache, which handles expiry and
+    LRU eviction.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the SQLite file
+    threshold : float, optional
+        Minimum cosine similarity for a fuzzy match. Defaults to RESOLUTION_SIMILARITY_THRESHOLD
+    max_entries : int, optional
+        Maximum number of questions kept. Defaults to RESOLUTION_CACHE_MAX_ENTRIES
+    ttl : float, optional
+        Seconds a resolution is kept. Defaults to RESOLUTION_CACHE_TTL
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        threshold: float = RESOLUTION_SIMILARITY_THRESHOLD,
+        max_entries: int = RESOLUTION_CACHE_MAX_ENTRIES,
+        ttl: float = RESOLUTION_CACHE_TTL,
+    ):
+        self.threshold = threshold
+        self.cache = DiskCache(path, ttl=ttl, max_entries=max_entries)
+        self._grams: dict[str, Counter] | None = None
+        self._postings: dict[str, set[str]] = {}
+
+    def _index(self) -> dict[str, Counter]:
+        if self._grams is None:
+            self._grams = {}
+            self._postings = {}
+            for key, _ in self.cache.items():
+                self._add(key)
+        return self._grams
+
+    def _add(self, key: str) -> None:
+        grams = char_ngrams(key)
+        self._grams[key] = grams
+        for gram in grams:
+            self._postings.setdefault(gram, set()).add(key)
+
+    def _remove(self, key: str) -> None:
+        for gram in self._grams.pop(key, {}):
+            self._postings[gram].discard(key)
+
+    def most_similar(self, question: str) -> tuple[str, float] | None:
+        """
+        Find the cached question most similar to a question
+
+        Parameters
+        ----------
+        question : str
+            User question
+
+        Returns
+        -------
+        tuple[str, float] | None
+            Normalized cached question and its cosine similarity, or None if nothing shares an n-gram
+        """
+        index = self._index()
+        query = char_ngrams(normalize_question(question))
+        candidates = set().union(*(self._postings.get(gram, set()) for gram in query))
+        if not candidates:
+            return None
+
+        total = len(index)
+        def idf(gram: str) -> float:
+            return math.log((1 + total) / (1 + len(self._postings.get(gram, ())))) + 1
+
+        def weights(grams: Counter) -> tuple[dict, float]:
+            weighted = {gram: count * idf(gram) for gram, count in grams.items()}
+            return weighted, math.sqrt(sum(w * w for w in weighted.values()))
+
+        query_weights, query_norm = weights(query)
+        best = None
+        for key in candidates:
+            key_weights, key_norm = weights(index[key])
+            dot = sum(w * key_weights.get(gram, 0.0) for gram, w in query_weights.items())
+            score = dot / (query_norm * key_norm)
+            if best is None or score > best[1]:
+                best = (key, score)
+        return best
+
+    def get(self, question: str) -> dict | None:
+        """
+        Look up the series resolved for a question or a similar one
+
+        Parameters
+        ----------
+        question : str
+            User question
+
+        Returns
+        -------
+        dict | None
+            The cached {"title": ..., "id": ...} series, or None on a miss
+        """
+        key = normalize_question(question)
+        if not key:
+            return None
+        cached = self.cache.get(key)
+        if cached is not None:
+            logfire.info(f"Resolution cache exact hit: {question} -> {cached[0]['series']['id']}")
+            return cached[0]["series"]
+
+        match = self.most_similar(question)
+        if match is None or match[1] < self.threshold:
+            return None
+        if not same_terms(key, match[0]):
+            logfire.info(f"Resolution cache near miss ({match[1]:.2f}): {question} differs from {match[0]}")
+            return None
+        cached = self.cache.get(match[0])
+        if cached is None:
+            # Expired or evicted since the index was built
+            self._remove(match[0])
+            return None
+        logfire.info(f"Resolution cache similar hit ({match[1]:.2f}): {question} -> {cached[0]['series']['id']}")
+        return cached[0]["series"]
+
+    def put(self, question: str, series: dict) -> None:
+        """
+        Remember the series resolved for a question
+
+        Parameters
+        ----------
+        question : str
+            User question
+        series : dict
+            {"title": ..., "id": ...} as returned by search_agent.pick_series
+        """
+        key = normalize_question(question)
+        if not key:
+            return
+        self.cache.set(key, {"question": question, "series": series})
+        index = self._index()
+        if key not in index:
+            self._add(key)
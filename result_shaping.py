@@ -0,0 +1,237 @@
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from pathlib import Path
+import threading
+import uuid
+import os
+
+from db_session import RESULTS_DATABASE, SERIES_DB_PATH, get_session
+
+RESULT_HEAD_ROWS = 20           # First rows of a result kept for the prompt
+RESULT_TAIL_ROWS = 10           # Last rows kept when the result is truncated
+RESULT_MAX_BYTES = int(os.getenv("RESULT_MAX_BYTES", 6000))  # Characters of rows kept for the prompt
+RESULT_FETCH_BATCH = 1024       # Rows fetched from DuckDB at a time
+RESULT_HANDLES_MAX = 64         # Results kept for fetch_result
+NUMERIC_TYPES = {
+    "TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT", "UINTEGER", "UBIGINT",
+    "UHUGEINT", "FLOAT", "DOUBLE", "DECIMAL",
+}
+FLOAT_TYPES = {"FLOAT", "DOUBLE"}
+# Other types with a minimum and maximum. Nested types such as STRUCT, MAP and lists only get NULL counts.
+ORDERED_TYPES = {
+    "VARCHAR", "DATE", "TIME", "TIMESTAMP", "TIMESTAMP_S", "TIMESTAMP_MS", "TIMESTAMP_NS", "TIMESTAMP WITH TIME ZONE",
+    "TIME WITH TIME ZONE", "INTERVAL", "BOOLEAN", "UUID",
+}
+
+
+@dataclass
+class ColumnStats:
+    count: int = 0                  # Non-NULL values
+    nulls: int = 0
+    minimum: object = None          # None for types without an order
+    maximum: object = None
+    mean: float | None = None       # None for non-numeric types. NaN values are left out of minimum, maximum and mean
+
+    def describe(self) -> str:
+        parts = []
+        if self.minimum is not None:
+            parts.append(f"min {self.minimum}, max {self.maximum}")
+        if self.mean is not None:
+            parts.append(f"mean {self.mean:.6g}")
+        if self.nulls:
+            parts.append(f"{self.nulls} NULL")
+        return ", ".join(parts) or f"{self.count} values"
+
+
+def _column_stats(cursor, sql: str, description: list) -> dict[str, ColumnStats]:
+    """Statistics of every column of a query result, computed by DuckDB in one more pass over the query"""
+    aliases = [f"c{i}" for i in range(len(description))]
+    expressions, layout = [], []
+    for alias, (_, type_code, *_) in zip(aliases, description):
+        base_type = str(type_code).split("(")[0]
+        aggregates = ["count", "min", "max", "avg"] if base_type in NUMERIC_TYPES else ["count", "min", "max"] if base_type in ORDERED_TYPES else ["count"]
+        # NaN sorts above every number in DuckDB and makes the mean NaN
+        condition = f" FILTER (WHERE NOT isnan({alias}))" if base_type in FLOAT_TYPES else ""
+        expressions += [f"{aggregate}({alias})" + (condition if aggregate != "count" else "") for aggregate in aggregates]
+        layout.append(aggregates)
+    row = cursor.execute(f"SELECT count(*), {', '.join(expressions)} FROM ({sql}) AS result({', '.join(aliases)})").fetchone()
+    total, values = row[0], iter(row[1:])
+    stats = {}
+    for (name, *_), aggregates in zip(description, layout):
+        column = dict(zip(aggregates, values))
+        stats[name] = ColumnStats(
+            count=column["count"],
+            nulls=total - column["count"],
+            minimum=column.get("min"),
+            maximum=column.get("max"),
+            mean=column.get("avg"),
+        )
+    return stats
+
+
+@dataclass
+class ShapedResult:
+    """A query result cut down to fit a prompt, with statistics over every row if it was truncated"""
+    handle: str
+    columns: list[str]
+    head: list[tuple]
+    tail: list[tuple] = field(default_factory=list)
+    row_count: int = 0
+    stats: dict[str, ColumnStats] = field(default_factory=dict)
+
+    @property
+    def truncated(self) -> bool:
+        return len(self.head) + len(self.tail) < self.row_count
+
+    @property
+    def rows(self) -> list[tuple]:
+        """The rows kept, which are every row unless the result is truncated"""
+        return self.head + self.tail
+
+    def to_prompt(self) -> str:
+        """Compact text of the result for a prompt"""
+        if not self.truncated:
+            return str(self.head)
+        omitted = self.row_count - len(self.head) - len(self.tail)
+        lines = [
+            f"{self.row_count} rows with columns {', '.join(self.columns)}, truncated.",
+            f"First {len(self.head)} rows: {self.head}",
+            f"({omitted} rows omitted)",
+        ]
+        if self.tail:
+            lines.append(f"Last {len(self.tail)} rows: {self.tail}")
+        lines.append("Statistics over all rows:")
+        lines += [f"- {column}: {stats.describe()}" for column, stats in self.stats.items() if stats.count]
+        return "\n".join(lines)
+
+
+_handles: OrderedDict[str, Path] = OrderedDict()
+_handles_lock = threading.Lock()
+
+
+def _result_table(handle: str) -> str:
+    return f"{RESULTS_DATABASE}.result_{handle}"
+
+
+def _remember(handle: str, db_path: Path) -> None:
+    with _handles_lock:
+        _handles[handle] = Path(db_path)
+        evicted = []
+        while len(_handles) > RESULT_HANDLES_MAX:
+            evicted.append(_handles.popitem(last=False))
+    for old_handle, old_db_path in evicted:
+        get_session(old_db_path).execute(f"DROP TABLE IF EXISTS {_result_table(old_handle)}")
+
+
+def execute_shaped(
+    sql: str,
+    db_path: Path = SERIES_DB_PATH,
+    head_rows: int = RESULT_HEAD_ROWS,
+    tail_rows: int = RESULT_TAIL_ROWS,
+    max_bytes: int = RESULT_MAX_BYTES,
+    batch_size: int = RESULT_FETCH_BATCH,
+) -> ShapedResult:
+    """
+    Run a query and keep only as much of the result as a prompt can hold.
+
+    The full result is stored in a table of the session's in-memory RESULTS_DATABASE, kept
+    for fetch_result until RESULT_HANDLES_MAX newer results evict it, and read back in
+    batches, so the memory of this process stays bounded however large the result is.
+    The first rows are kept until head_rows or two thirds of max_bytes is reached, and the
+    last tail_rows rows that fit in the rest of max_bytes. Row sizes are measured as the
+    length of their text. If the result is truncated, minimum, maximum, mean and NULL
+    counts of every column are computed over all rows of the stored result by DuckDB.
+
+    Parameters
+    ----------
+    sql : str
+        SQL query
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+    head_rows : int, optional
+        Most rows kept from the start. Defaults to RESULT_HEAD_ROWS
+    tail_rows : int, optional
+        Most rows kept from the end. Defaults to RESULT_TAIL_ROWS
+    max_bytes : int, optional
+        Characters of rows kept in total. Defaults to RESULT_MAX_BYTES
+    batch_size : int, optional
+        Rows fetched at a time. Defaults to RESULT_FETCH_BATCH
+
+    Returns
+    -------
+    ShapedResult
+        The kept rows and statistics, with a handle for fetch_result
+    """
+    head_budget = max_bytes * 2 // 3
+    head, head_bytes = [], 0
+    tail: deque[tuple] = deque(maxlen=tail_rows)
+    row_count = 0
+    handle = uuid.uuid4().hex[:16]
+    table = _result_table(handle)
+    with get_session(db_path).cursor() as cursor:
+        cursor.execute(f"CREATE TABLE {table} AS {sql}")
+        cursor.execute(f"SELECT * FROM {table} ORDER BY rowid")
+        description = cursor.description
+        columns = [column[0] for column in description]
+        while batch := cursor.fetchmany(batch_size):
+            for row in batch:
+                row_count += 1
+                if len(head) < head_rows and len(head) == row_count - 1:
+                    size = len(repr(row))
+                    if not head or head_bytes + size <= head_budget:
+                        head.append(row)
+                        head_bytes += size
+                        continue
+                tail.append(row)
+
+        tail_budget = max_bytes - head_bytes
+        kept = []
+        for row in reversed(tail):
+            tail_budget -= len(repr(row))
+            if tail_budget < 0:
+                break
+            kept.append(row)
+        stats = _column_stats(cursor, f"SELECT * FROM {table}", description) if len(head) + len(kept) < row_count else {}
+    _remember(handle, db_path)
+    return ShapedResult(
+        handle=handle,
+        columns=columns,
+        head=head,
+        tail=kept[::-1],
+        row_count=row_count,
+        stats=stats,
+    )
+
+
+def fetch_result(handle: str, offset: int = 0, limit: int | None = None) -> list[tuple]:
+    """
+    Fetch the full result behind a shaped result, or a page of it
+
+    The rows are those the query returned when it ran, in the same order, however the
+    store changed since, so pages are stable with or without an ORDER BY.
+
+    Parameters
+    ----------
+    handle : str
+        ShapedResult.handle
+    offset : int, optional
+        Rows to skip. Defaults to 0
+    limit : int, optional
+        Most rows returned. Defaults to every row
+
+    Returns
+    -------
+    list[tuple]
+        Result rows
+
+    Raises
+    ------
+    KeyError
+        If the handle is unknown or was evicted
+    """
+    with _handles_lock:
+        db_path = _handles[handle]
+    selected = f"SELECT * FROM {_result_table(handle)} ORDER BY rowid"
+    if limit is None:
+        return get_session(db_path).execute(f"{selected} OFFSET ?", [offset])
+    return get_session(db_path).execute(f"{selected} LIMIT ? OFFSET ?", [limit, offset])
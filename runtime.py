@@ -0,0 +1,84 @@
+from collections.abc import Callable
+import threading
+import os
+
+from pydantic_ai.models import Model
+from pydantic_ai.models.wrapper import WrapperModel
+
+from metrics import InstrumentedModel
+from llm_cache import CachedModel
+
+import logfire
+
+OLLAMA_MODEL_NAME = os.getenv("OLLAMA_MODEL_NAME", "granite4:7b-a1b-h")
+
+_lock = threading.Lock()
+_telemetry_configured = False
+_model: Model | None = None
+
+
+def configure_telemetry() -> None:
+    """Configure logfire and instrument pydantic-ai, once per process"""
+    global _telemetry_configured
+    with _lock:
+        if _telemetry_configured:
+            return
+        logfire.configure()
+        logfire.instrument_pydantic_ai()
+        _telemetry_configured = True
+
+
+def get_model() -> Model:
+    """
+    The Ollama chat model shared by every agent, built on first use.
+
+    The OpenAI client and the Ollama provider are only imported and created here, so
+    importing the agent modules stays cheap and does not need OLLAMA_BASE_URL.
+
+    Returns
+    -------
+    Model
+        The shared model
+    """
+    global _model
+    configure_telemetry()
+    with _lock:
+        if _model is None:
+            from pydantic_ai.models.openai import OpenAIChatModel
+            from pydantic_ai.providers.ollama import OllamaProvider
+
+            _model = OpenAIChatModel(model_name=OLLAMA_MODEL_NAME, provider=OllamaProvider())
+        return _model
+
+
+class LazyModel(WrapperModel):
+    """
+    Model that builds the model it wraps the first time it is used.
+
+    When `model_name` is given it is reported without building the model, so e.g.
+    cache keys can be computed without a model server.
+    """
+
+    def __init__(self, factory: Callable[[], Model] = get_model, model_name: str | None = None):
+        Model.__init__(self)
+        self._factory = factory
+        self._model_name = model_name
+        self._wrapped: Model | None = None
+
+    @property
+    def wrapped(self) -> Model:
+        if self._wrapped is None:
+            self._wrapped = self._factory()
+        return self._wrapped
+
+    @property
+    def model_name(self) -> str:
+        return self._model_name or self.wrapped.model_name
+
+
+def agent_model(agent: str) -> Model:
+    """
+    The model for an agent: the shared model, built lazily and instrumented under the agent's name,
+    behind the LLM response cache so cached answers skip the model entirely
+    """
+    return CachedModel(InstrumentedModel(LazyModel(model_name=OLLAMA_MODEL_NAME), agent), agent)
@@ -1,35 +1,29 @@
 from dataclasses import dataclass
 
 from pydantic import BaseModel, Field
-from pydantic_ai import Agent, ModelRetry
-from pydantic_ai.models.openai import OpenAIChatModel
-from pydantic_ai.providers.ollama import OllamaProvider
+from pydantic_ai import Agent
 from typing import List
 from urllib.parse import quote
 import asyncio
 
-from pull_fred import search_keywords
+from pull_fred import FRED_SEARCH_LIMIT, search_keywords_async, series_catalog
+from series_catalog import catalog_entry
+from series_ranker import Candidate, dedupe_candidates, rank_candidates, confident_pick, within_budget
+from metrics import metrics, log_payload, model_retry
+from runtime import agent_model
 
 import logfire
 
-logfire.configure()
-logfire.instrument_pydantic_ai()
-
-
 FRED_MAX_SERIES_REQUESTS = 5
-MAX_SERIES_TO_PICK = 20         # Can increase if context size allows
+MAX_SERIES_TO_PICK = 20         # Hard cap; the list is otherwise sized by series_ranker.PICKER_TOKEN_BUDGET
+MAX_PANEL_SERIES = 4            # Most series picked for one comparative question
 
 class Keywords(BaseModel):
     """The overall structure representing a list of keywords"""
     keywords: List[str] = Field(description="The keywords to search for in the FRED API.")
 
-ollama_model = OpenAIChatModel(
-    model_name='granite4:7b-a1b-h',
-    provider=OllamaProvider(),  
-)
-
 keyword_agent = Agent(
-    model=ollama_model,
+    model=agent_model("keyword_agent"),
     output_type=Keywords,
     system_prompt="""\
 You are an agent that generates keywords from user input.
@@ -42,32 +36,42 @@ Respond ONLY with a JSON object containing 'keywords' list. No other text.
 @keyword_agent.output_validator
 async def validate_keywords(output: Keywords) -> Keywords:
     if not output.keywords and type(output.keywords) != list:
-        raise ModelRetry("Please respond with the list of keywords")
+        raise model_retry("keyword_agent", "Please respond with the list of keywords")
     return output
 
 async def search_series(keywords: str) -> List[dict]:
     """
-    This function takes a set of keywords and uses them to search the FRED API.
-    It then takes the results from the FRED API and formats them into markdown text.
-    The markdown text is a numbered list of the series found, with each item including the title and id of the series found.
-    If no results are found, it returns "No results found"
+    This function takes a set of keywords and uses them to search the local series catalog, then the FRED API.
+    The FRED API is only called when the catalog has too few results or the best one misses some of the keywords.
+    If the FRED API cannot be reached, whatever the catalog found is returned.
+    If no results are found, it returns an empty list.
 
     Args:
         keywords (str): The keywords to search for in the FRED API.
 
     Returns:
-        List[dict] | None: A list of the series as dicts, with each item including the title and id of the series found.
+        List[dict] | None: A list of the series as catalog entries, with each item including the title and id of the series found,
+            and the frequency, popularity and observation_end used to rank them.
     """
     logfire.info(f"Question String: {keywords}")
-    json_response = search_keywords(keywords)
-    if json_response:
-        seriess = json_response["seriess"]
-        output = []
-        for i in range(len(seriess)):
-            item = {"title": seriess[i]["title"], "id": seriess[i]["id"]}
-            output.append(item)
-        logfire.info(f"Tool Results: {output}")
+    with metrics.stage("search", keywords=keywords):
+        local_results = series_catalog.search(keywords, limit=FRED_SEARCH_LIMIT)
+        local_output = [entry for entry, _, _ in local_results]
+        if series_catalog.is_confident(local_results):
+            metrics.inc("search_source_total", source="catalog")
+            log_payload("Catalog results for {keywords}", lambda: local_output, keywords=keywords)
+            return local_output
+
+        json_response = await search_keywords_async(keywords)
+    if json_response and "seriess" in json_response:
+        output = [catalog_entry(series) for series in json_response["seriess"]]
+        metrics.inc("search_source_total", source="fred")
+        log_payload("FRED results for {keywords}", lambda: output, keywords=keywords)
         return output
+    if local_output:
+        metrics.inc("search_source_total", source="catalog_fallback")
+        logfire.info(f"FRED search failed, using {len(local_output)} catalog results")
+        return local_output
     logfire.error("No results found")
     return []
 
@@ -84,40 +88,67 @@ def sanitize_keywords(keywords: List[str]) -> List[str]:
         output.append(quote(keyword.replace(" ", "+"), safe="+"))
     return output
 
-async def get_seriess_from_question(question: str) -> str:
+async def rank_seriess_for_question(question: str) -> List[Candidate]:
     """
-    This function takes a user question and uses it to search the FRED API.
-    It takes the question and uses it to generate keywords, which are then used to search the FRED API.
-    The results from the FRED API are then formatted into markdown text.
-    The markdown text is a numbered list of the series found, with each item including the title and id of the series found.
-    If no results are found, it returns "No results found"
+    This function takes a user question, generates keywords from it and searches for each of them.
+    The results of every search are merged into one candidate per series id and ranked locally against the question.
 
     Args:
         question (str): The user question to search for in the FRED API.
 
     Returns:
-        str: A numbered list of the series in markdown format, with each item including the title and id of the series found.
+        List[Candidate]: The candidate series, best first.
     """
     logfire.info(f"Question: {question}")
-    result = await keyword_agent.run(question)
+    with metrics.stage("keyword gen"):
+        result = await keyword_agent.run(question)
     logfire.info(f"Keywords: {result.output.keywords}")
-    keywords = sanitize_keywords(result.output.keywords)
+    keywords = sanitize_keywords(result.output.keywords)[:FRED_MAX_SERIES_REQUESTS]
     async with asyncio.TaskGroup() as tg:
-        keywords = keywords[:FRED_MAX_SERIES_REQUESTS]
         tasks = [tg.create_task(search_series(keyword)) for keyword in keywords]
     series_lists = [task.result() for task in tasks] # This is a list of lists
-    series_list = [x for sublist in series_lists for x in sublist]
-    seriess_md = seriess_to_md(series_list[:MAX_SERIES_TO_PICK])
+    with metrics.stage("rank"):
+        ranked = rank_candidates(question, dedupe_candidates(series_lists), searches=len(series_lists))
+    metrics.inc("series_candidates_total", len(ranked))
+    return ranked
+
+def candidates_to_md(ranked: List[Candidate]) -> str:
+    """
+    Format the best candidates that fit the picker's token budget as a numbered markdown list,
+    and save it to md_output/seriess.md.
+
+    Args:
+        ranked (List[Candidate]): The candidates from 'rank_seriess_for_question'
+
+    Returns:
+        str: A numbered list of the series in markdown format, with each item including the title and id of the series.
+    """
+    seriess_md = seriess_to_md(within_budget(ranked, seriess_to_md, max_candidates=MAX_SERIES_TO_PICK))
     with open("md_output/seriess.md", "w") as f:
         f.write(seriess_md)
     return seriess_md
 
+async def get_seriess_from_question(question: str) -> str:
+    """
+    This function takes a user question and uses it to search the FRED API.
+    It takes the question and uses it to generate keywords, which are then used to search the FRED API.
+    The results are deduplicated, ranked against the question and formatted into markdown text.
+    The markdown text is a numbered list of the best series found, with each item including the title and id of the series found.
+
+    Args:
+        question (str): The user question to search for in the FRED API.
+
+    Returns:
+        str: A numbered list of the series in markdown format, with each item including the title and id of the series found.
+    """
+    return candidates_to_md(await rank_seriess_for_question(question))
+
 class Series(BaseModel):
     title: str = Field(description="The title of the series.")
     id: str = Field(description="The id of the series.")
 
 series_picker_agent = Agent(
-    model=ollama_model,
+    model=agent_model("series_picker_agent"),
     output_type=Series,
     system_prompt="""\
 You are an agent that picks one series from a list of series that best matches the question provided by the user.
@@ -129,7 +160,7 @@ Respond ONLY with a JSON object containing 'title' and 'id' fields. No other tex
 @series_picker_agent.output_validator
 async def validate_series(output: Series) -> Series:
     if not output.title or not output.id:
-        raise ModelRetry("Please respond with both a title and id.")
+        raise model_retry("series_picker_agent", "Please respond with both a title and id.")
     return output
 
 async def pick_series(question: str, seriess_md: str) -> dict | None:
@@ -142,8 +173,9 @@ Prefer series at the higher up on the list.
 Respond with ONLY a JSON object in this exact format, nothing else:
 {{"title": "Series Title Here", "id": "series-id-here"}}
 """
-    logfire.info(f"Prompt: {prompt}")
-    result = await series_picker_agent.run(prompt)
+    log_payload("Series picker prompt", lambda: prompt)
+    with metrics.stage("pick"):
+        result = await series_picker_agent.run(prompt)
     if result.output is None:
         logfire.error("No series chosen")
         return None
@@ -151,4 +183,75 @@ Respond with ONLY a JSON object in this exact format, nothing else:
     series = {}
     series["title"] = result.output.title
     series["id"] = result.output.id
-    return series
\ No newline at end of file
+    return series
+
+class SeriesList(BaseModel):
+    seriess: List[Series] = Field(description="The series needed to answer the question, most relevant first.")
+
+multi_series_picker_agent = Agent(
+    model=agent_model("multi_series_picker_agent"),
+    output_type=SeriesList,
+    system_prompt=f"""\
+You are an agent that picks the series from a list of series that are needed to answer a question comparing several series.
+Pick one series for each quantity the question is about, and at most {MAX_PANEL_SERIES} series.
+Prefer series at the higher up on the list.
+Respond ONLY with a JSON object containing a 'seriess' list of objects with 'title' and 'id' fields. No other text.
+"""
+)
+
+@multi_series_picker_agent.output_validator
+async def validate_seriess(output: SeriesList) -> SeriesList:
+    if not output.seriess:
+        raise model_retry("multi_series_picker_agent", "Please respond with at least one series.")
+    if any(not series.title or not series.id for series in output.seriess):
+        raise model_retry("multi_series_picker_agent", "Please respond with both a title and id for every series.")
+    return output
+
+async def pick_seriess(question: str, seriess_md: str) -> List[dict]:
+    """
+    Pick every series a comparative question needs from the search results.
+
+    Args:
+        question (str): The user question
+        seriess_md (str): The markdown list of series from 'get_seriess_from_question'
+
+    Returns:
+        List[dict]: The chosen series as {"title": ..., "id": ...}, without duplicates, at most MAX_PANEL_SERIES
+    """
+    prompt = f"""\
+Given a question {question}, pick the series needed to answer it from the following markdown list:
+
+{seriess_md}
+
+Prefer series at the higher up on the list.
+Respond with ONLY a JSON object in this exact format, nothing else:
+{{"seriess": [{{"title": "Series Title Here", "id": "series-id-here"}}]}}
+"""
+    log_payload("Multi series picker prompt", lambda: prompt)
+    with metrics.stage("pick"):
+        result = await multi_series_picker_agent.run(prompt)
+    seriess = {}
+    for series in result.output.seriess:
+        seriess.setdefault(series.id, {"title": series.title, "id": series.id})
+    logfire.info(f"Series: {list(seriess.values())}")
+    return list(seriess.values())[:MAX_PANEL_SERIES]
+
+async def find_series(question: str) -> dict | None:
+    """
+    Search for the series answering a question and pick one.
+    When the best ranked candidate clearly stands out, it is picked without calling the picker model.
+
+    Args:
+        question (str): The user question
+
+    Returns:
+        dict | None: The chosen series as {"title": ..., "id": ...}, or None if no series was chosen
+    """
+    ranked = await rank_seriess_for_question(question)
+    series = confident_pick(ranked)
+    if series is not None:
+        metrics.inc("series_pick_total", source="local")
+        logfire.info(f"Series picked locally: {series}")
+        return series
+    metrics.inc("series_pick_total", source="model")
+    return await pick_series(question, candidates_to_md(ranked))
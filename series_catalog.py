@@ -0,0 +1,205 @@
+from collections import Counter
+from urllib.parse import unquote_plus
+from pathlib import Path
+import threading
+import sqlite3
+import json
+import math
+import csv
+import re
+import logfire
+
+SERIES_CATALOG_PATH = Path("data/catalog.sqlite")
+CATALOG_MIN_RESULTS = 5         # Fewer local hits than this goes to the network
+CATALOG_MIN_COVERAGE = 1.0      # Share of query terms the best local hit must contain
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+CATALOG_FIELDS = ["id", "title", "frequency", "units", "seasonal_adjustment", "popularity", "observation_end"]
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def catalog_entry(series: dict) -> dict:
+    """
+    Pick the catalog fields out of a series from a FRED series/search response
+
+    Parameters
+    ----------
+    series : dict
+        Item of the 'seriess' list of a series/search response, or a seed file row
+
+    Returns
+    -------
+    dict
+        Entry with every field in CATALOG_FIELDS
+    """
+    return {
+        "id": series["id"],
+        "title": series["title"],
+        "frequency": series.get("frequency_short") or series.get("frequency"),
+        "units": series.get("units_short") or series.get("units"),
+        "seasonal_adjustment": series.get("seasonal_adjustment_short") or series.get("seasonal_adjustment"),
+        "popularity": int(series.get("popularity") or 0),
+        "observation_end": series.get("observation_end"),
+    }
+
+
+class SeriesCatalog:
+    """
+    Local catalog of FRED series metadata with BM25 ranked full-text search.
+
+    Entries are stored in SQLite. An inverted index over the title and id of every
+    entry is built in memory on first search and kept up to date as entries are added.
+
+    Parameters
+    ----------
+    path : Path
+        Path to the SQLite file. Parent directories are created on first use.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+        self._entries: dict[str, dict] | None = None
+        self._postings: dict[str, dict[str, int]] = {}
+        self._lengths: dict[str, int] = {}
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS series ("
+                "id TEXT PRIMARY KEY, title TEXT NOT NULL, frequency TEXT, units TEXT, "
+                "seasonal_adjustment TEXT, popularity INTEGER, observation_end TEXT)"
+            )
+        return self._conn
+
+    def _index(self) -> dict[str, dict]:
+        if self._entries is None:
+            self._entries = {}
+            self._postings = {}
+            self._lengths = {}
+            conn = self._connect()
+            for row in conn.execute(f"SELECT {', '.join(CATALOG_FIELDS)} FROM series"):
+                self._index_entry(dict(zip(CATALOG_FIELDS, row)))
+        return self._entries
+
+    def _index_entry(self, entry: dict) -> None:
+        series_id = entry["id"]
+        if series_id in self._entries:
+            for term in self._postings_terms(series_id):
+                del self._postings[term][series_id]
+        terms = Counter(tokenize(entry["title"]) + tokenize(series_id))
+        self._entries[series_id] = entry
+        self._lengths[series_id] = sum(terms.values())
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[series_id] = count
+
+    def _postings_terms(self, series_id: str) -> list[str]:
+        entry = self._entries[series_id]
+        return list(set(tokenize(entry["title"]) + tokenize(series_id)))
+
+    def add_seriess(self, seriess: list[dict]) -> int:
+        """
+        Add or update series, e.g. from a FRED series/search response
+
+        Parameters
+        ----------
+        seriess : list[dict]
+            Series metadata as returned in the 'seriess' list of a series/search response
+
+        Returns
+        -------
+        int
+            Number of series written
+        """
+        entries = [catalog_entry(series) for series in seriess]
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                f"INSERT OR REPLACE INTO series ({', '.join(CATALOG_FIELDS)}) VALUES ({', '.join('?' * len(CATALOG_FIELDS))})",
+                [[entry[field] for field in CATALOG_FIELDS] for entry in entries],
+            )
+            if self._entries is not None:
+                for entry in entries:
+                    self._index_entry(entry)
+        return len(entries)
+
+    def load_seed(self, seed_path: Path) -> int:
+        """
+        Bulk load series metadata from a seed file
+
+        Parameters
+        ----------
+        seed_path : Path
+            A JSON file holding a series/search response or a list of series, or a CSV
+            file with a header row using the field names of a series/search response
+
+        Returns
+        -------
+        int
+            Number of series loaded
+        """
+        seed_path = Path(seed_path)
+        with open(seed_path, "r", newline="") as f:
+            if seed_path.suffix == ".csv":
+                seriess = list(csv.DictReader(f))
+            else:
+                seriess = json.load(f)
+        if isinstance(seriess, dict):
+            seriess = seriess["seriess"]
+        count = self.add_seriess(seriess)
+        logfire.info(f"Loaded {count} series into the catalog from {seed_path}")
+        return count
+
+    def search(self, keywords: str, limit: int = 20) -> list[tuple[dict, float, float]]:
+        """
+        Rank catalog entries against keywords with BM25
+
+        Parameters
+        ----------
+        keywords : str
+            Keywords to search for, raw or URL-encoded
+        limit : int, optional
+            Maximum number of results. Defaults to 20
+
+        Returns
+        -------
+        list[tuple[dict, float, float]]
+            (entry, BM25 score, share of query terms the entry contains), best first.
+            Ties are broken by FRED popularity.
+        """
+        terms = list(dict.fromkeys(tokenize(unquote_plus(keywords))))
+        with self._lock:
+            entries = self._index()
+            if not terms or not entries:
+                return []
+            total = len(entries)
+            average_length = sum(self._lengths.values()) / total
+            scores: dict[str, float] = {}
+            matched: Counter = Counter()
+            for term in terms:
+                postings = self._postings.get(term, {})
+                if not postings:
+                    continue
+                idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+                for series_id, count in postings.items():
+                    length_norm = 1 - BM25_B + BM25_B * self._lengths[series_id] / average_length
+                    scores[series_id] = scores.get(series_id, 0.0) + idf * count * (BM25_K1 + 1) / (count + BM25_K1 * length_norm)
+                    matched[series_id] += 1
+            ranked = sorted(scores, key=lambda s: (scores[s], entries[s]["popularity"] or 0), reverse=True)
+            return [(entries[s], scores[s], matched[s] / len(terms)) for s in ranked[:limit]]
+
+    def is_confident(self, results: list[tuple[dict, float, float]]) -> bool:
+        """Whether local results are good enough to skip the network"""
+        return len(results) >= CATALOG_MIN_RESULTS and results[0][2] >= CATALOG_MIN_COVERAGE
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*) FROM series").fetchone()[0]
@@ -0,0 +1,170 @@
+from dataclasses import dataclass, field
+from datetime import date
+import os
+import re
+
+from resolution_cache import IMPLIED_WORDS, normalize_question
+from series_catalog import tokenize
+
+PICKER_TOKEN_BUDGET = int(os.getenv("PICKER_TOKEN_BUDGET", 400))   # Estimated tokens of the candidate list sent to the picker
+CHARS_PER_TOKEN = 4
+CONFIDENT_SCORE = 0.75          # A top candidate at least this good...
+CONFIDENT_MARGIN = 0.15         # ...and this far ahead of the next one...
+CONFIDENT_QUERY_COVERAGE = 1.0  # ...whose title has this share of the question's content words is picked without the model
+RECENCY_HORIZON_YEARS = 10      # Series that ended this long ago get no recency credit
+
+SCORE_WEIGHTS = {"lexical": 0.5, "popularity": 0.2, "hits": 0.1, "frequency": 0.1, "recency": 0.1}
+FREQUENCY_WORDS = {
+    "D": re.compile(r"\bdaily\b"),
+    "W": re.compile(r"\bweekly\b"),
+    "M": re.compile(r"\bmonthly\b"),
+    "Q": re.compile(r"\bquarterly\b"),
+    "A": re.compile(r"\b(annual|annually|yearly)\b"),
+}
+
+
+@dataclass
+class Candidate:
+    series: dict                    # Catalog entry, see series_catalog.catalog_entry
+    hits: int = 1                   # Number of keyword searches that returned the series
+    score: float = 0.0
+    components: dict[str, float] = field(default_factory=dict)
+
+
+def dedupe_candidates(result_lists: list[list[dict]]) -> list[Candidate]:
+    """
+    Merge the results of several keyword searches, keeping one candidate per series id
+
+    Parameters
+    ----------
+    result_lists : list[list[dict]]
+        Series returned by each search, best first
+
+    Returns
+    -------
+    list[Candidate]
+        Candidates in order of first appearance, with the number of searches that returned each
+    """
+    candidates: dict[str, Candidate] = {}
+    for results in result_lists:
+        for series_id in dict.fromkeys(series["id"] for series in results):
+            if series_id in candidates:
+                candidates[series_id].hits += 1
+        for series in results:
+            candidates.setdefault(series["id"], Candidate(series=series))
+    return list(candidates.values())
+
+
+def _recency(observation_end: str | None, today: date) -> float:
+    if not observation_end:
+        return 0.5
+    try:
+        end = date.fromisoformat(observation_end)
+    except ValueError:
+        return 0.5
+    years = (today - end).days / 365.25
+    return min(1.0, max(0.0, 1 - max(years - 1, 0) / RECENCY_HORIZON_YEARS))
+
+
+def rank_candidates(question: str, candidates: list[Candidate], searches: int = 1, today: date | None = None) -> list[Candidate]:
+    """
+    Score candidates for a question and sort them best first.
+
+    The score mixes how well the title and the question's content words overlap, FRED
+    popularity, how many keyword searches returned the series, whether its frequency matches
+    one named in the question, and how recently it was last updated. See SCORE_WEIGHTS.
+
+    Parameters
+    ----------
+    question : str
+        The user question
+    candidates : list[Candidate]
+        Candidates from dedupe_candidates
+    searches : int, optional
+        Number of keyword searches the candidates came from. Defaults to 1
+    today : date, optional
+        Reference date for recency. Defaults to today
+
+    Returns
+    -------
+    list[Candidate]
+        The candidates with scores, best first. Ties keep the search order.
+    """
+    today = today or date.today()
+    terms = set(normalize_question(question).split())
+    required_terms = terms - IMPLIED_WORDS
+    asked_frequency = next((code for code, pattern in FREQUENCY_WORDS.items() if pattern.search(question.lower())), None)
+    for candidate in candidates:
+        series = candidate.series
+        title_terms = set(tokenize(series["title"]))
+        shared = len(terms & title_terms)
+        query_coverage = shared / len(terms) if terms else 0.0
+        title_coverage = shared / len(title_terms) if title_terms else 0.0
+        frequency = series.get("frequency")
+        candidate.components = {
+            "lexical": (query_coverage + title_coverage) / 2,
+            "title_coverage": title_coverage,
+            "query_coverage": len(required_terms & title_terms) / len(required_terms) if required_terms else 0.0,
+            "popularity": min(int(series.get("popularity") or 0), 100) / 100,
+            "hits": (candidate.hits - 1) / (searches - 1) if searches > 1 else 0.0,
+            "frequency": 0.5 if asked_frequency is None or not frequency else float(frequency.startswith(asked_frequency)),
+            "recency": _recency(series.get("observation_end"), today),
+        }
+        candidate.score = sum(weight * candidate.components[name] for name, weight in SCORE_WEIGHTS.items())
+    return sorted(candidates, key=lambda candidate: candidate.score, reverse=True)
+
+
+def confident_pick(ranked: list[Candidate]) -> dict | None:
+    """
+    The top candidate if it is good enough to skip the picker model.
+
+    Its title must hold every content word of the question, bar IMPLIED_WORDS, so that e.g.
+    a national series is never picked for a question about one state or group.
+
+    Parameters
+    ----------
+    ranked : list[Candidate]
+        Candidates from rank_candidates
+
+    Returns
+    -------
+    dict | None
+        The series as {"title": ..., "id": ...}, or None if the model should pick
+    """
+    if not ranked:
+        return None
+    top = ranked[0]
+    runner_up = ranked[1].score if len(ranked) > 1 else 0.0
+    if top.components["title_coverage"] < 1.0 or top.components["query_coverage"] < CONFIDENT_QUERY_COVERAGE:
+        return None
+    if top.score < CONFIDENT_SCORE or top.score - runner_up < CONFIDENT_MARGIN:
+        return None
+    return {"title": top.series["title"], "id": top.series["id"]}
+
+
+def within_budget(ranked: list[Candidate], render, token_budget: int = PICKER_TOKEN_BUDGET, max_candidates: int | None = None) -> list[dict]:
+    """
+    Take the best candidates whose rendered list fits a token budget
+
+    Parameters
+    ----------
+    ranked : list[Candidate]
+        Candidates from rank_candidates
+    render : Callable[[list[dict]], str]
+        Renders a list of series the way it is sent to the model
+    token_budget : int, optional
+        Estimated tokens the list may take. Defaults to PICKER_TOKEN_BUDGET. The best candidate is always kept.
+    max_candidates : int, optional
+        Hard cap on the number of candidates
+
+    Returns
+    -------
+    list[dict]
+        The series that fit, best first
+    """
+    selected = []
+    for candidate in ranked[:max_candidates]:
+        if selected and len(render(selected + [candidate.series])) / CHARS_PER_TOKEN > token_budget:
+            break
+        selected.append(candidate.series)
+    return selected
@@ -0,0 +1,439 @@
+from datetime import date
+from pathlib import Path
+import threading
+import tempfile
+import zipfile
+import shutil
+import csv
+import io
+import os
+import re
+import duckdb
+import logfire
+
+from db_session import SERIES_DB_PATH, get_session
+from metrics import metrics
+
+STREAM_CHUNK_SIZE = 1 << 20
+SUMMARY_TABLE = "series_summary"
+SUMMARY_PERIOD_TYPES = ["year", "quarter"]
+# Largest average gap in days between observations for each FRED frequency code
+FREQUENCY_GAPS = [(1.5, "D"), (10, "W"), (20, "BW"), (45, "M"), (120, "Q"), (200, "SA")]
+
+# Refreshes write to the shared series_summary table, and concurrent DuckDB transactions
+# creating or writing it conflict, so they run one at a time
+_summary_lock = threading.Lock()
+
+
+def connect(db_path: Path = SERIES_DB_PATH) -> duckdb.DuckDBPyConnection:
+    """
+    Get a cursor on the series store.
+
+    DuckDB only allows one configuration per database file in a process, so every
+    cursor comes from the shared db_session.DuckDBSession of the file.
+
+    Parameters
+    ----------
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    duckdb.DuckDBPyConnection
+        Cursor on the series store
+    """
+    return get_session(db_path).connection.cursor()
+
+
+def series_table_name(series_id: str) -> str:
+    """
+    Get the store table name of a series, e.g. "LNS14000024" -> "lns14000024"
+
+    Parameters
+    ----------
+    series_id : str
+        FRED series ID
+
+    Returns
+    -------
+    str
+        Table name that can be used unquoted in SQL
+    """
+    table_name = re.sub(r"\W", "_", series_id).lower()
+    if table_name[0].isdigit():
+        table_name = f"series_{table_name}"
+    return table_name
+
+
+def _column_types(headers: list[str]) -> dict:
+    return {header: "DATE" if header.endswith("date") else "DOUBLE" for header in headers}
+
+
+def _load_csv(conn: duckdb.DuckDBPyConnection, table_name: str, source: str, columns: dict, replace: bool) -> None:
+    select = "SELECT * FROM read_csv(?, header = true, columns = ?, nullstr = ['', '.'])"
+    if replace:
+        conn.execute(f"CREATE OR REPLACE TABLE {table_name} AS {select}", [source, columns])
+    else:
+        conn.execute(f"INSERT INTO {table_name} {select}", [source, columns])
+
+
+def ingest_csv(csv_path: Path, series_id: str, db_path: Path = SERIES_DB_PATH) -> str:
+    """
+    Load an "obs. by real-time period" CSV into a typed table of the series store.
+
+    Dates are stored as DATE and the value column as DOUBLE, with FRED's "." marker
+    and empty cells stored as NULL, so queries never have to sniff or parse the CSV again.
+
+    Parameters
+    ----------
+    csv_path : Path
+        Path to the observations CSV
+    series_id : str
+        FRED series ID the CSV belongs to
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    str
+        Name of the table the series was written to
+    """
+    with open(csv_path, "r", newline="") as f:
+        headers = next(csv.reader(f))
+
+    table_name = series_table_name(series_id)
+    conn = connect(db_path)
+    _load_csv(conn, table_name, str(csv_path), _column_types(headers), replace=True)
+    row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    metrics.inc("rows_ingested_total", row_count)
+    logfire.info(f"Ingested {row_count} rows from {csv_path} into {table_name}")
+    refresh_summary(table_name, db_path)
+    return table_name
+
+
+def _stream_member(zip_path: Path, member: str, write_fd: int, errors: list) -> None:
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref, zip_ref.open(member) as src, os.fdopen(write_fd, "wb") as dst:
+            shutil.copyfileobj(src, dst, STREAM_CHUNK_SIZE)
+    except Exception as e:
+        errors.append(e)
+
+
+def _load_zip_member(conn: duckdb.DuckDBPyConnection, table_name: str, zip_path: Path, member: str, columns: dict, replace: bool) -> None:
+    if os.name != "posix":
+        # No /dev/fd to hand DuckDB a pipe, so extract to a temporary directory that is removed after loading
+        with tempfile.TemporaryDirectory() as tmp_dir, zipfile.ZipFile(zip_path, "r") as zip_ref:
+            _load_csv(conn, table_name, zip_ref.extract(member, tmp_dir), columns, replace)
+        return
+
+    # Decompress into a pipe that DuckDB's CSV reader consumes as it is written, so memory
+    # stays bounded by the pipe buffer and no extracted copy touches the disk
+    read_fd, write_fd = os.pipe()
+    errors = []
+    writer = threading.Thread(target=_stream_member, args=(zip_path, member, write_fd, errors), daemon=True)
+    writer.start()
+    try:
+        _load_csv(conn, table_name, f"/dev/fd/{read_fd}", columns, replace)
+    finally:
+        os.close(read_fd)   # unblocks the writer if DuckDB stopped reading early
+        writer.join()
+    if errors:
+        raise errors[0]
+
+
+def load_zip(conn: duckdb.DuckDBPyConnection, table_name: str, zip_path: Path) -> int:
+    """
+    Stream every CSV member of an observations zip into one typed table, replacing it
+
+    Parameters
+    ----------
+    conn : duckdb.DuckDBPyConnection
+        Cursor on the series store
+    table_name : str
+        Name of the table to create
+    zip_path : Path
+        Path to the zip file
+
+    Returns
+    -------
+    int
+        Number of rows in the table
+    """
+    with zipfile.ZipFile(zip_path, "r") as zip_ref:
+        csv_files = [f for f in zip_ref.namelist() if f.endswith(".csv")]
+        headers = {}
+        for member in csv_files:
+            with zip_ref.open(member) as f:
+                headers[member] = next(csv.reader(io.TextIOWrapper(f, newline="")))
+    if not csv_files:
+        raise ValueError(f"No CSV files found in {zip_path}")
+
+    for i, member in enumerate(csv_files):
+        _load_zip_member(conn, table_name, Path(zip_path), member, _column_types(headers[member]), replace=i == 0)
+    return conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+
+
+def ingest_zip(zip_path: Path, series_id: str, db_path: Path = SERIES_DB_PATH) -> str:
+    """
+    Load the CSV files of a FRED observations zip straight into a typed table of the series store,
+    without extracting them to disk.
+
+    Every CSV member is streamed into the same table, so multi-vintage archives that are split
+    across several files end up in one table.
+
+    Parameters
+    ----------
+    zip_path : Path
+        Path to the zip file downloaded by pull_fred.pull_observations
+    series_id : str
+        FRED series ID the zip belongs to
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    str
+        Name of the table the series was written to
+    """
+    table_name = series_table_name(series_id)
+    row_count = load_zip(connect(db_path), table_name, zip_path)
+    metrics.inc("rows_ingested_total", row_count)
+    logfire.info(f"Streamed {row_count} rows from {zip_path} into {table_name}")
+    refresh_summary(table_name, db_path)
+    return table_name
+
+
+def append_observations(table_name: str, rows: list[tuple], db_path: Path = SERIES_DB_PATH) -> None:
+    """
+    Append observation rows to a series table and refresh the summary from the first appended period
+
+    Parameters
+    ----------
+    table_name : str
+        Name of the table
+    rows : list[tuple]
+        Rows of (period_start_date, value, realtime_start_date, realtime_end_date) as ISO date
+        strings and float, with None for missing values
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+    """
+    if rows:
+        connect(db_path).executemany(
+            f"INSERT INTO {table_name} VALUES (?::DATE, ?::DOUBLE, ?::DATE, ?::DATE)", rows
+        )
+        metrics.inc("rows_ingested_total", len(rows))
+        refresh_summary(table_name, db_path, since=date.fromisoformat(str(min(row[0] for row in rows))))
+
+
+def get_observations_state(table_name: str, db_path: Path = SERIES_DB_PATH) -> dict:
+    """
+    Get the last period_start_date and the latest realtime vintage stored for a series
+
+    Parameters
+    ----------
+    table_name : str
+        Name of the table
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    dict
+        'last_period_start_date' and 'realtime_start' as ISO date strings, or None if the table is empty
+    """
+    last_period, realtime_start = connect(db_path).execute(
+        f"SELECT MAX(period_start_date), MAX(realtime_start_date) FROM {table_name}"
+    ).fetchone()
+    return {
+        "last_period_start_date": last_period.isoformat() if last_period else None,
+        "realtime_start": realtime_start.isoformat() if realtime_start else None,
+    }
+
+
+def has_table(table_name: str, db_path: Path = SERIES_DB_PATH) -> bool:
+    conn = connect(db_path)
+    result = conn.execute(
+        "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = ?", [table_name]
+    ).fetchone()
+    return result[0] > 0
+
+
+def get_table_schema(table_name: str, db_path: Path = SERIES_DB_PATH) -> dict:
+    """
+    Get the schema of a table in the series store
+
+    Parameters
+    ----------
+    table_name : str
+        Name of the table
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    dict
+        A dictionary with 'columns', a list of column names, and 'types', a dictionary
+        mapping each column name to its DuckDB type.
+    """
+    rows = connect(db_path).execute(f"DESCRIBE {table_name}").fetchall()
+    return {
+        "columns": [row[0] for row in rows],
+        "types": {row[0]: row[1] for row in rows},
+    }
+
+
+def register_series(series_id: str, db_path: Path = SERIES_DB_PATH) -> str:
+    """
+    Register the current-vintage view of a series in the shared session.
+
+    The view keeps the columns of the series table but only the rows that are still
+    current (realtime_end_date IS NULL), which is what most questions are about.
+    It is created once per process; later calls return the name straight away.
+
+    Parameters
+    ----------
+    series_id : str
+        FRED series ID
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    str
+        Name of the view
+    """
+    table_name = series_table_name(series_id)
+    return get_session(db_path).register_view(
+        f"{table_name}_current", f"SELECT * FROM {table_name} WHERE realtime_end_date IS NULL"
+    )
+
+
+def periods_table_name(table_name: str) -> str:
+    return f"{table_name}_periods"
+
+
+def _infer_frequency(observations: int, first_date: date | None, last_date: date | None) -> str | None:
+    if observations < 2:
+        return None
+    gap = (last_date - first_date).days / (observations - 1)
+    return next((code for max_gap, code in FREQUENCY_GAPS if gap <= max_gap), "A")
+
+
+def refresh_summary(table_name: str, db_path: Path = SERIES_DB_PATH, since: date | None = None) -> dict:
+    """
+    Materialize the summary of a series from its current-vintage observations.
+
+    Two tables are kept up to date: one row per series in SUMMARY_TABLE (row count, date range,
+    frequency, latest observation), and per-year and per-quarter aggregates (average, minimum,
+    maximum with their dates, year-over-year growth of the average) in the periods table of the
+    series, so aggregate questions read a few rows instead of scanning the history.
+
+    Parameters
+    ----------
+    table_name : str
+        Name of the series table
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+    since : date, optional
+        Earliest period that changed. Only the years from this one on are recomputed.
+        Defaults to None, which recomputes every period
+
+    Returns
+    -------
+    dict
+        The summary, as returned by get_series_summary
+    """
+    conn = connect(db_path)
+    columns = get_table_schema(table_name, db_path)["types"]
+    value_column = next(column for column, data_type in columns.items() if data_type == "DOUBLE")
+    current = f'"{value_column}" IS NOT NULL'
+    if "realtime_end_date" in columns:
+        current += " AND realtime_end_date IS NULL"
+    periods_table = periods_table_name(table_name)
+    # Whole years are recomputed so quarters and years never straddle the boundary
+    since_year = date(since.year, 1, 1) if since else date.min
+
+    with _summary_lock:
+        _refresh_summary(conn, table_name, value_column, current, periods_table, since_year)
+    logfire.info(f"Refreshed summary of {table_name} from {since_year}")
+    return get_series_summary(table_name, db_path)
+
+
+def _refresh_summary(
+    conn: duckdb.DuckDBPyConnection, table_name: str, value_column: str, current: str, periods_table: str, since_year: date
+) -> None:
+    conn.execute("BEGIN TRANSACTION")
+    try:
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {SUMMARY_TABLE} ("
+            "table_name VARCHAR PRIMARY KEY, value_column VARCHAR, row_count BIGINT, observations BIGINT, "
+            "first_date DATE, last_date DATE, frequency VARCHAR, latest_date DATE, latest_value DOUBLE, refreshed_at TIMESTAMP)"
+        )
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {periods_table} ("
+            "period_type VARCHAR, period_start DATE, observations BIGINT, first_date DATE, last_date DATE, "
+            "average DOUBLE, minimum DOUBLE, minimum_date DATE, maximum DOUBLE, maximum_date DATE, yoy_growth DOUBLE, "
+            "PRIMARY KEY (period_type, period_start))"
+        )
+        conn.execute(f"DELETE FROM {periods_table} WHERE period_start >= ?", [since_year])
+        for period_type in SUMMARY_PERIOD_TYPES:
+            conn.execute(
+                f"INSERT INTO {periods_table} "
+                f"SELECT ?, date_trunc(?, period_start_date)::DATE AS period, COUNT(*), MIN(period_start_date), MAX(period_start_date), "
+                f'AVG("{value_column}"), MIN("{value_column}"), arg_min(period_start_date, "{value_column}"), '
+                f'MAX("{value_column}"), arg_max(period_start_date, "{value_column}"), NULL '
+                f"FROM {table_name} WHERE {current} AND period_start_date >= ? GROUP BY period",
+                [period_type, period_type, since_year],
+            )
+        conn.execute(
+            f"UPDATE {periods_table} SET yoy_growth = {periods_table}.average / previous.average - 1 "
+            f"FROM {periods_table} AS previous WHERE previous.period_type = {periods_table}.period_type "
+            f"AND previous.period_start = {periods_table}.period_start - INTERVAL 1 YEAR "
+            f"AND previous.average <> 0 AND {periods_table}.period_start >= ?",
+            [since_year],
+        )
+
+        row_count, observations, first_date, last_date = conn.execute(
+            f"SELECT (SELECT COUNT(*) FROM {table_name}), SUM(observations), MIN(first_date), MAX(last_date) "
+            f"FROM {periods_table} WHERE period_type = 'year'"
+        ).fetchone()
+        latest = conn.execute(
+            f'SELECT period_start_date, "{value_column}" FROM {table_name} WHERE {current} ORDER BY period_start_date DESC LIMIT 1'
+        ).fetchone() or (None, None)
+        conn.execute(
+            f"INSERT OR REPLACE INTO {SUMMARY_TABLE} VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, now())",
+            [table_name, value_column, row_count, observations or 0, first_date, last_date,
+             _infer_frequency(observations or 0, first_date, last_date), *latest],
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def get_series_summary(table_name: str, db_path: Path = SERIES_DB_PATH) -> dict | None:
+    """
+    Get the materialized summary of a series
+
+    Parameters
+    ----------
+    table_name : str
+        Name of the series table
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    dict | None
+        The columns of SUMMARY_TABLE plus 'periods_table', the name of the table with the
+        per-year and per-quarter aggregates, or None if the series has no summary
+    """
+    if not has_table(SUMMARY_TABLE, db_path):
+        return None
+    cursor = connect(db_path).execute(f"SELECT * FROM {SUMMARY_TABLE} WHERE table_name = ?", [table_name])
+    row = cursor.fetchone()
+    if row is None:
+        return None
+    summary = dict(zip([column[0] for column in cursor.description], row))
+    summary["periods_table"] = periods_table_name(table_name)
+    return summary
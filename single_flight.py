@@ -0,0 +1,62 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Collapse concurrent calls for the same key into one.
+
+    The first caller for a key runs the coroutine; callers arriving while it is still
+    in flight await the same result (or exception) instead of starting their own.
+    If the first caller is cancelled, the others start over rather than being cancelled too.
+    Nothing is kept once the call finishes, so later calls run again.
+    """
+
+    def __init__(self):
+        self._flights: dict[tuple[asyncio.AbstractEventLoop, str], asyncio.Future] = {}
+
+    async def run(self, key: str, coro_factory):
+        """
+        Run `coro_factory()` unless a call for `key` is already in flight
+
+        Parameters
+        ----------
+        key : str
+            Key identifying the work
+        coro_factory : Callable[[], Awaitable]
+            Creates the coroutine to run; only called by the first caller
+
+        Returns
+        -------
+        Any
+            Result of the shared call
+        """
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)   # futures belong to one event loop
+        while (flight := self._flights.get(flight_key)) is not None:
+            try:
+                return await asyncio.shield(flight)
+            except asyncio.CancelledError:
+                # The leader was cancelled, not this caller: run again, leading if nobody else does
+                if flight.cancelled() and not asyncio.current_task().cancelling():
+                    continue
+                raise
+
+        flight = loop.create_future()
+        self._flights[flight_key] = flight
+        try:
+            result = await coro_factory()
+        except asyncio.CancelledError:
+            flight.cancel()
+            raise
+        except BaseException as e:
+            flight.set_exception(e)
+            flight.exception()  # mark retrieved so lone failures are not logged as unhandled
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            del self._flights[flight_key]
+
+    def in_flight(self, key: str) -> bool:
+        return any(flight_key == key for _, flight_key in self._flights)
@@ -0,0 +1,23 @@
+import pytest
+
+import fred_client
+import pull_fred
+import search_agent
+from disk_cache import DiskCache
+from fred_scheduler import RateScheduler
+from series_catalog import SeriesCatalog
+from tests.fred_stub import FredStub
+
+
+@pytest.fixture
+def fred_stub(monkeypatch, tmp_path):
+    stub = FredStub()
+    stub.start()
+    monkeypatch.setattr(fred_client, "FRED_API_URL", stub.url)
+    monkeypatch.setattr(pull_fred, "search_cache", DiskCache(tmp_path / "search.sqlite", ttl=60, max_entries=10))
+    catalog = SeriesCatalog(tmp_path / "catalog.sqlite")
+    monkeypatch.setattr(pull_fred, "series_catalog", catalog)
+    monkeypatch.setattr(search_agent, "series_catalog", catalog)
+    monkeypatch.setattr(fred_client, "fred_scheduler", RateScheduler(1000, 1000, tmp_path / "fred_rate.json"))
+    yield stub
+    stub.stop()
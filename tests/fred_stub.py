@@ -0,0 +1,104 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+import threading
+import json
+import time
+
+
+class FredStub:
+    """
+    Local stand-in for the FRED API.
+
+    Register a handler per endpoint with `route`. A handler receives the query
+    parameters as a dict and returns a dict (sent as JSON), bytes, or a
+    (status, body, headers) tuple. Every request is recorded in `requests`.
+
+    With `throttle`, requests over a rate limit are answered 429 like FRED does,
+    and counted in `throttled`.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.lock = threading.Lock()
+        self.url = ""
+        self.server: ThreadingHTTPServer | None = None
+        self.throttled = 0
+        self._rate: float | None = None
+        self._burst = 1
+        self._retry_after: str | None = None
+        self._tokens = 0.0
+        self._updated = 0.0
+
+    def route(self, endpoint: str, handler) -> None:
+        self.routes[endpoint.strip("/")] = handler
+
+    def throttle(self, rate: float, burst: int = 1, retry_after: str | None = None) -> None:
+        """Answer 429 to requests beyond `rate` per second, with a Retry-After header if given"""
+        with self.lock:
+            self._rate, self._burst, self._retry_after = rate, burst, retry_after
+            self._tokens, self._updated = float(burst), time.monotonic()
+
+    def _admit(self) -> bool:
+        with self.lock:
+            if self._rate is None:
+                return True
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+            self._updated = now
+            if self._tokens < 1:
+                self.throttled += 1
+                return False
+            self._tokens -= 1
+            return True
+
+    def count(self, endpoint: str) -> int:
+        with self.lock:
+            return sum(1 for path, _ in self.requests if path == endpoint)
+
+    def start(self) -> str:
+        """Serve on a free local port in a background thread, returning the base URL"""
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(self))
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        return self.url
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def _make_handler(stub: FredStub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            endpoint = url.path.strip("/")
+            params = dict(parse_qsl(url.query))
+            with stub.lock:
+                stub.requests.append((endpoint, params))
+            handler = stub.routes.get(endpoint)
+            status, headers = 200, {}
+            if not stub._admit():
+                status, body = 429, json.dumps({"error_code": 429, "error_message": "Too Many Requests."}).encode()
+                if stub._retry_after is not None:
+                    headers["Retry-After"] = stub._retry_after
+            elif handler is None:
+                status, body = 404, b"{}"
+            else:
+                result = handler(params)
+                if isinstance(result, tuple):
+                    status, result, headers = result
+                body = result if isinstance(result, bytes) else json.dumps(result).encode()
+            self.send_response(status)
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
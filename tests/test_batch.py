@@ -0,0 +1,83 @@
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+from query_agent import DatabaseInfo
+from batch import LimitedModel, run_batch, read_questions
+import batch
+import asyncio
+import pytest
+
+SERIES = {
+    "unemployment": {"title": "Unemployment Rate", "id": "UNRATE"},
+    "cpi": {"title": "Consumer Price Index", "id": "CPIAUCSL"},
+}
+
+@pytest.fixture
+def fake_pipeline(monkeypatch):
+    calls = {"resolve": 0, "load": 0, "answer": 0}
+
+    async def resolve_series(question):
+        calls["resolve"] += 1
+        await asyncio.sleep(0.01)
+        return SERIES["cpi" if "cpi" in question.lower() else "unemployment"]
+
+    async def load_series(series_id):
+        calls["load"] += 1
+        await asyncio.sleep(0.05)
+        return DatabaseInfo(table_name=series_id.lower(), db_schema={"columns": [], "types": {}})
+
+    async def generate_and_execute_sql(database_info, question):
+        calls["answer"] += 1
+        await asyncio.sleep(0.2 if "slow" in question else 0.01)
+        return f"{database_info.table_name}: {question}"
+
+    monkeypatch.setattr(batch, "resolve_series", resolve_series)
+    monkeypatch.setattr(batch, "load_series", load_series)
+    monkeypatch.setattr(batch, "generate_and_execute_sql", generate_and_execute_sql)
+    return calls
+
+@pytest.mark.asyncio
+async def test_run_batch_shares_work_and_streams(fake_pipeline):
+    questions = [
+        "slow: unemployment rate in 2020",
+        "unemployment rate in 2021",
+        "CPI in 2022",
+        "What is the CPI in 2023?",
+    ]
+    results = [result async for result in run_batch(questions)]
+    assert sorted(result.index for result in results) == [0, 1, 2, 3]
+    assert results[-1].index == 0
+    assert fake_pipeline["load"] == 2
+    assert fake_pipeline["answer"] == 4
+    assert results[-1].answer == "unrate: slow: unemployment rate in 2020"
+    assert set(results[0].timings) == {"resolve", "load", "answer", "total"}
+
+@pytest.mark.asyncio
+async def test_run_batch_reports_errors(fake_pipeline, monkeypatch):
+    async def load_series(series_id):
+        raise RuntimeError("FRED is down")
+    monkeypatch.setattr(batch, "load_series", load_series)
+    results = [result async for result in run_batch(["unemployment rate"])]
+    assert results[0].error == "FRED is down"
+    assert results[0].answer is None
+
+@pytest.mark.asyncio
+async def test_limited_model_caps_concurrency():
+    in_flight, peak = 0, 0
+
+    async def slow_model(messages, info):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        return ModelResponse(parts=[TextPart("ok")])
+
+    agent = Agent(LimitedModel(FunctionModel(slow_model), asyncio.Semaphore(2)))
+    await asyncio.gather(*(agent.run("question") for _ in range(6)))
+    assert peak == 2
+
+def test_read_questions(tmp_path):
+    path = tmp_path / "questions.txt"
+    path.write_text("# report questions\nunemployment rate in 2020\n\nCPI in 2022\n")
+    assert read_questions(path) == ["unemployment rate in 2020", "CPI in 2022"]
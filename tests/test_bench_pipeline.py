@@ -0,0 +1,24 @@
+from pathlib import Path
+import subprocess
+import json
+import sys
+
+BENCHMARK = Path(__file__).resolve().parent.parent / "benchmarks" / "bench_pipeline.py"
+
+
+def test_bench_pipeline_smoke(tmp_path):
+    """Test that the default question shapes run over several series without failures or mixed-up series"""
+    output = tmp_path / "results.json"
+    completed = subprocess.run(
+        [sys.executable, str(BENCHMARK), "--rows", "200", "--concurrency", "1", "2", "--questions", "2",
+         "--model-latency", "0", "-o", str(output)],
+        cwd=tmp_path, capture_output=True, text=True, timeout=300,
+    )
+    assert completed.returncode == 0, completed.stdout + completed.stderr
+    runs = json.loads(output.read_text())["runs"]
+    assert len(runs) == 2
+    for result in runs:
+        assert result["failures"] == []
+        assert result["questions"] == 6
+        assert result["downloads"]["full"] == 2
+        assert result["resolution_cache"].get("hit") == 2
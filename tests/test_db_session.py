@@ -0,0 +1,23 @@
+from db_session import DuckDBSession, get_session
+from series_store import ingest_csv, register_series, get_table_schema
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+def test_get_session_is_shared(tmp_path):
+    assert get_session(tmp_path / "fred.duckdb") is get_session(tmp_path / "fred.duckdb")
+
+def test_session_cursor_pool(tmp_path):
+    session = DuckDBSession(tmp_path / "fred.duckdb", pool_size=2)
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(lambda i: session.execute("SELECT ?", [i])[0][0], range(32)))
+    assert results == list(range(32))
+    assert session._created <= 2
+
+def test_register_series(tmp_path):
+    db_path = tmp_path / "fred.duckdb"
+    ingest_csv(Path("tests/obs._by_real-time_period_LNS14000024.csv"), "LNS14000024", db_path)
+    view_name = register_series("LNS14000024", db_path)
+    assert view_name == "lns14000024_current"
+    assert register_series("LNS14000024", db_path) == view_name
+    assert get_table_schema(view_name, db_path)["columns"][1] == "LNS14000024"
+    assert get_session(db_path).execute(f"SELECT COUNT(*) FROM {view_name}") == [(937,)]
@@ -0,0 +1,52 @@
+from disk_cache import DiskCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def test_disk_cache_hit_and_miss(tmp_path):
+    cache = DiskCache(tmp_path / "cache.sqlite", ttl=60, max_entries=10)
+    assert cache.get("cpi") is None
+    cache.set("cpi", {"seriess": [{"id": "CPIAUCSL"}]})
+    assert cache.get("cpi") == ({"seriess": [{"id": "CPIAUCSL"}]}, True)
+    assert cache.stats() == {"hits": 1, "stale_hits": 0, "misses": 1}
+
+def test_disk_cache_persists(tmp_path):
+    DiskCache(tmp_path / "cache.sqlite", ttl=60, max_entries=10).set("m2", [1, 2])
+    assert DiskCache(tmp_path / "cache.sqlite", ttl=60, max_entries=10).get("m2") == ([1, 2], True)
+
+def test_disk_cache_ttl_and_stale(tmp_path):
+    clock = FakeClock()
+    cache = DiskCache(tmp_path / "cache.sqlite", ttl=60, max_entries=10, stale_ttl=60, clock=clock)
+    cache.set("cpi", "value")
+    clock.now += 90
+    assert cache.get("cpi") == ("value", False)
+    clock.now += 60
+    assert cache.get("cpi") is None
+
+def test_disk_cache_lru_eviction(tmp_path):
+    clock = FakeClock()
+    cache = DiskCache(tmp_path / "cache.sqlite", ttl=60, max_entries=2, clock=clock)
+    cache.set("a", 1)
+    clock.now += 1
+    cache.set("b", 2)
+    clock.now += 1
+    cache.get("a")
+    clock.now += 1
+    cache.set("c", 3)
+    assert len(cache) == 2
+    assert cache.get("b") is None
+    assert cache.get("a") == (1, True)
+
+def test_disk_cache_items_skips_expired(tmp_path):
+    clock = FakeClock()
+    cache = DiskCache(tmp_path / "cache.sqlite", ttl=60, max_entries=10, clock=clock)
+    cache.set("old", 1)
+    clock.now += 90
+    cache.set("new", 2)
+    assert cache.items() == [("new", 2)]
+    cache.delete("new")
+    assert cache.items() == []
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import time
+import pytest
+
+from file_lock import file_lock, async_file_lock
+
+
+def test_file_lock_serializes_holders(tmp_path):
+    """Test that only one holder is inside the lock at a time"""
+    lock_path = tmp_path / "locks" / "series.lock"
+    inside = []
+    overlaps = []
+
+    def hold():
+        with file_lock(lock_path, poll_interval=0.01):
+            inside.append(1)
+            if len(inside) > 1:
+                overlaps.append(1)
+            time.sleep(0.02)
+            inside.pop()
+
+    threads = [threading.Thread(target=hold) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not overlaps
+    assert lock_path.exists()
+
+@pytest.mark.asyncio
+async def test_async_file_lock_waits_for_holder(tmp_path):
+    """Test that the async lock polls without blocking the event loop"""
+    lock_path = tmp_path / "series.lock"
+    order = []
+
+    async def wait_for_lock():
+        async with async_file_lock(lock_path, poll_interval=0.01):
+            order.append("waiter")
+
+    with file_lock(lock_path):
+        task = asyncio.create_task(wait_for_lock())
+        await asyncio.sleep(0.05)
+        order.append("holder")
+    await task
+    assert order == ["holder", "waiter"]
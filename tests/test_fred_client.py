@@ -0,0 +1,58 @@
+import asyncio
+import time
+import pytest
+
+import fred_client
+import pull_fred
+from disk_cache import DiskCache
+from pull_fred import search_keywords, search_keywords_async
+
+DELAY = 0.3
+
+def slow_search(params):
+    time.sleep(DELAY)
+    return {"seriess": [{"title": "Unemployment Rate", "id": "UNRATE"}]}
+
+@pytest.mark.asyncio
+async def test_search_keywords_async_overlaps(fred_stub):
+    """Concurrent searches should take roughly as long as the slowest one, not the sum"""
+    fred_stub.route("series/search", slow_search)
+    start = time.perf_counter()
+    async with asyncio.TaskGroup() as tg:
+        tasks = [tg.create_task(search_keywords_async(f"keyword {i}")) for i in range(5)]
+    elapsed = time.perf_counter() - start
+    assert all(task.result()["seriess"][0]["id"] == "UNRATE" for task in tasks)
+    assert elapsed < DELAY * 3
+
+@pytest.mark.asyncio
+async def test_get_client_is_shared(fred_stub):
+    assert fred_client.get_client() is fred_client.get_client()
+    await fred_client.close_client()
+
+@pytest.mark.asyncio
+async def test_search_keywords_sync_inside_running_loop(fred_stub):
+    fred_stub.route("series/search", slow_search)
+    result = search_keywords("unemployment rate")
+    assert result["seriess"][0]["id"] == "UNRATE"
+
+@pytest.mark.asyncio
+async def test_search_keywords_cached(fred_stub):
+    fred_stub.route("series/search", slow_search)
+    await search_keywords_async("Unemployment+Rate")
+    result = await search_keywords_async(" unemployment rate")
+    assert result["seriess"][0]["id"] == "UNRATE"
+    assert fred_stub.count("series/search") == 1
+
+@pytest.mark.asyncio
+async def test_stale_search_revalidated_once(fred_stub, tmp_path, monkeypatch):
+    now = [1000.0]
+    cache = DiskCache(tmp_path / "search.sqlite", ttl=60, max_entries=10, stale_ttl=600, clock=lambda: now[0])
+    monkeypatch.setattr(pull_fred, "search_cache", cache)
+    fred_stub.route("series/search", slow_search)
+    await search_keywords_async("unemployment rate")
+    now[0] += 90
+    results = await asyncio.gather(*(search_keywords_async("unemployment rate") for _ in range(5)))
+    assert all(result["seriess"][0]["id"] == "UNRATE" for result in results)
+    await asyncio.gather(*pull_fred._revalidations)
+    await search_keywords_async("unemployment rate")
+    assert fred_stub.count("series/search") == 2
@@ -0,0 +1,93 @@
+from fred_scheduler import RateScheduler, Priority, backoff_delay, retry_after
+from email.utils import formatdate
+import fred_client
+import asyncio
+import random
+import pytest
+import time
+
+SEARCH = {"seriess": [{"title": "Unemployment Rate", "id": "UNRATE"}]}
+
+
+@pytest.mark.asyncio
+async def test_scheduler_stays_under_server_limit(fred_stub, tmp_path, monkeypatch):
+    """Test that requests paced below the server's limit, with a token to spare for uneven arrivals, are never throttled"""
+    fred_stub.route("series/search", lambda params: SEARCH)
+    fred_stub.throttle(rate=10, burst=2)
+    monkeypatch.setattr(fred_client, "fred_scheduler", RateScheduler(8, 1, tmp_path / "fred_rate.json"))
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(fred_client.fred_get("series/search", {"search_text": str(i)}) for i in range(12)))
+    elapsed = time.perf_counter() - start
+    assert [response.status_code for response in responses] == [200] * 12
+    assert fred_stub.throttled == 0
+    assert elapsed >= (12 - 1) / 8 * 0.9
+
+
+@pytest.mark.asyncio
+async def test_throttled_requests_honour_retry_after(fred_stub):
+    fred_stub.route("series/search", lambda params: SEARCH)
+    fred_stub.throttle(rate=1, burst=1, retry_after="1")
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(fred_client.fred_get("series/search", {"search_text": str(i)}) for i in range(2)))
+    assert [response.status_code for response in responses] == [200, 200]
+    assert fred_stub.throttled == 1
+    assert time.perf_counter() - start >= 1.0
+
+
+@pytest.mark.asyncio
+async def test_server_errors_are_retried(fred_stub, monkeypatch):
+    statuses = [503, 502]
+    fred_stub.route("series/search", lambda params: (statuses.pop(0), b"{}", {}) if statuses else SEARCH)
+    response = await fred_client.fred_get("series/search", {"search_text": "unemployment"})
+    assert response.json() == SEARCH
+    assert fred_stub.count("series/search") == 3
+
+    monkeypatch.setattr(fred_client, "FRED_MAX_RETRIES", 1)
+    fred_stub.route("series/search", lambda params: (503, b"{}", {}))
+    response = await fred_client.fred_get("series/search", {"search_text": "unemployment"})
+    assert response.status_code == 503
+    assert fred_stub.count("series/search") == 5
+
+
+@pytest.mark.asyncio
+async def test_interactive_requests_jump_the_queue(tmp_path):
+    scheduler = RateScheduler(20, 1, tmp_path / "fred_rate.json")
+    order = []
+
+    async def request(name: str, priority: Priority) -> None:
+        await scheduler.acquire(priority)
+        order.append(name)
+
+    tasks = [asyncio.create_task(request(f"batch {i}", Priority.BATCH)) for i in range(5)]
+    await asyncio.sleep(0.01)
+    tasks.append(asyncio.create_task(request("interactive", Priority.INTERACTIVE)))
+    await asyncio.gather(*tasks)
+    assert order.index("interactive") <= 2
+    assert [name for name in order if name != "interactive"] == [f"batch {i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_bucket_is_shared_through_the_state_file(tmp_path):
+    """Test that schedulers sharing a state file, as separate processes would, split one rate"""
+    schedulers = [RateScheduler(20, 1, tmp_path / "fred_rate.json") for _ in range(2)]
+    start = time.perf_counter()
+    await asyncio.gather(*(scheduler.acquire() for scheduler in schedulers for _ in range(5)))
+    assert time.perf_counter() - start >= 9 / 20 * 0.9
+
+
+@pytest.mark.asyncio
+async def test_penalize_pauses_every_scheduler(tmp_path):
+    first, second = (RateScheduler(100, 10, tmp_path / "fred_rate.json") for _ in range(2))
+    first.penalize(0.3)
+    assert await second.acquire() >= 0.25
+
+
+def test_backoff_delay():
+    random.seed(0)
+    assert all(0 <= backoff_delay(3, base=0.5) <= 4 for _ in range(100))
+    assert all(0 <= backoff_delay(20, base=0.5, cap=10) <= 10 for _ in range(100))
+    assert all(2 <= backoff_delay(0, retry_after_seconds=2, base=0.5) <= 2.5 for _ in range(100))
+    assert retry_after("3") == 3
+    assert retry_after(None) is None
+    assert retry_after("soon") is None
+    assert 8 <= retry_after(formatdate(time.time() + 10, usegmt=True)) <= 10
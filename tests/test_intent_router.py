@@ -0,0 +1,82 @@
+from intent_router import Intent, parse_intent, answer_from_intent
+from series_store import ingest_csv, get_table_schema, get_series_summary, register_series
+from pathlib import Path
+import pytest
+
+
+@pytest.mark.parametrize("question, intent", [
+    ("What is the latest unemployment rate?", Intent("latest")),
+    ("What is the unemployment rate in the US in 2023?", Intent("value_in_year", 2023, 2023)),
+    ("What was the average value between 2010 and 2015?", Intent("average", 2010, 2015)),
+    ("What was the highest rate since 2000?", Intent("maximum", 2000, None)),
+    ("When did unemployment peak?", Intent("maximum")),
+    ("What was the lowest value from 1990 to 1999?", Intent("minimum", 1990, 1999)),
+    ("What is the year-over-year change in CPI?", Intent("yoy_change")),
+    ("What was the minimum wage in 2010?", Intent("value_in_year", 2010, 2010)),
+])
+def test_parse_intent(question, intent):
+    assert parse_intent(question) == intent
+
+@pytest.mark.parametrize("question", [
+    "Compare unemployment in 2020 and 2021",
+    "What was the highest and lowest value in 2020?",
+    "What is the median unemployment rate?",
+    "How did unemployment move after the 2008 crisis?",
+    "Tell me about unemployment",
+    "What was the change in unemployment in 2020?",
+    "How much did GDP fall in 2009?",
+    "What was the percent change in CPI in 2021?",
+    "Did unemployment increase in 2020?",
+    "What was the growth of GDP in 2021?",
+    "What was inflation in 2022?",
+    "What was the difference between unemployment in 2019 and 2020?",
+    "What was the unemployment rate in 2019 compared to 2020?",
+    "What was the highest rate in 2019 and 2020?",
+])
+def test_parse_intent_falls_back(question):
+    assert parse_intent(question) is None
+
+@pytest.mark.parametrize("question", [
+    "What was the unemployment rate in March of 2023?",
+    "What was GDP in the first quarter of 2021?",
+    "What was the unemployment rate at the end of 2020?",
+    "What was the unemployment rate in the summer of 2009?",
+    "What was the fed funds rate at the start of 2008?",
+    "What was the unemployment rate as of 2010?",
+    "What was the average rate in Q1 of 2021?",
+    "What was the highest rate since the beginning of 2015?",
+])
+def test_parse_intent_falls_back_within_a_year(question):
+    assert parse_intent(question) is None
+
+def test_answer_from_intent(tmp_path):
+    """Test the templates against the full vintage table and the current view"""
+    db_path = tmp_path / "fred.duckdb"
+    table_name = ingest_csv(Path('tests/obs._by_real-time_period_LNS14000024.csv'), "LNS14000024", db_path)
+    view_name = register_series("LNS14000024", db_path)
+    for relation_name in (table_name, view_name):
+        db_schema = get_table_schema(relation_name, db_path)
+        answer = answer_from_intent("What is the unemployment rate in 2023?", relation_name, db_schema, db_path)
+        assert answer.startswith("The average value of LNS14000024 in 2023 is 3.")
+        assert "12 observations" in answer
+        assert "The latest value of LNS14000024" in answer_from_intent("latest value?", relation_name, db_schema, db_path)
+        assert "reached on" in answer_from_intent("When did it peak?", relation_name, db_schema, db_path)
+        assert "year over year" in answer_from_intent("What is the yoy change?", relation_name, db_schema, db_path)
+        assert answer_from_intent("What was it in 1800?", relation_name, db_schema, db_path) is None
+        assert answer_from_intent("What is the trend?", relation_name, db_schema, db_path) is None
+
+@pytest.mark.parametrize("question", [
+    "latest value?",
+    "What is the unemployment rate in 2023?",
+    "What was the average between 2010 and 2015?",
+    "When did it peak since 2000?",
+    "What was the lowest value?",
+])
+def test_answer_from_summary(tmp_path, question):
+    """Test that answers read from the materialized summary match answers from the observations"""
+    db_path = tmp_path / "fred.duckdb"
+    ingest_csv(Path('tests/obs._by_real-time_period_LNS14000024.csv'), "LNS14000024", db_path)
+    view_name = register_series("LNS14000024", db_path)
+    db_schema = get_table_schema(view_name, db_path)
+    summary = get_series_summary("lns14000024", db_path)
+    assert answer_from_intent(question, view_name, db_schema, db_path, summary) == answer_from_intent(question, view_name, db_schema, db_path)
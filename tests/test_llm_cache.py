@@ -0,0 +1,128 @@
+from pydantic import BaseModel
+from pydantic_ai import Agent, ModelRetry
+from pydantic_ai.exceptions import UnexpectedModelBehavior
+from pydantic_ai.messages import ModelResponse, TextPart, ToolCallPart
+from pydantic_ai.models.function import FunctionModel
+from llm_cache import CachedModel
+from disk_cache import DiskCache
+import pytest
+
+
+class Keywords(BaseModel):
+    keywords: list[str]
+
+
+def counting_model(calls: list):
+    def model(messages, info):
+        calls.append(messages)
+        if info.output_tools:
+            return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, {"keywords": [f"call {len(calls)}"]})])
+        return ModelResponse(parts=[TextPart(f"call {len(calls)}")])
+    return FunctionModel(model)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return DiskCache(tmp_path / "llm.sqlite", ttl=60, max_entries=100)
+
+
+@pytest.mark.asyncio
+async def test_repeated_request_is_served_from_cache(cache):
+    calls = []
+    model = CachedModel(counting_model(calls), "test_agent", cache=cache)
+    agent = Agent(model, output_type=Keywords, system_prompt="Generate keywords.")
+    first = await agent.run("unemployment rate")
+    second = await agent.run("unemployment rate")
+    assert len(calls) == 1
+    assert second.output == first.output == Keywords(keywords=["call 1"])
+    assert second.usage.output_tokens == 0
+
+    # Anything that can change the answer is part of the key
+    await agent.run("inflation")
+    await Agent(model, output_type=Keywords, system_prompt="Generate other keywords.").run("unemployment rate")
+    await Agent(model, output_type=str, system_prompt="Generate keywords.").run("unemployment rate")
+    assert len(calls) == 4
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_replay(cache):
+    """Test that a run with a tool call is replayed whole, since the replayed tool call ids key the next request"""
+    calls = []
+
+    def model(messages, info):
+        calls.append(messages)
+        if len(messages) == 1:
+            return ModelResponse(parts=[ToolCallPart("lookup", {"series_id": "UNRATE"})])
+        return ModelResponse(parts=[TextPart("4.1")])
+
+    agent = Agent(CachedModel(FunctionModel(model), "test_agent", cache=cache))
+
+    @agent.tool_plain
+    def lookup(series_id: str) -> str:
+        return "4.1"
+
+    assert (await agent.run("latest unemployment rate")).output == "4.1"
+    assert (await agent.run("latest unemployment rate")).output == "4.1"
+    assert len(calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_rejected_responses_are_not_replayed(cache):
+    """Test that a run whose output was rejected leaves nothing cached, so a fixed model can recover"""
+    calls = []
+    fixed = False
+
+    def model(messages, info):
+        calls.append(messages)
+        return ModelResponse(parts=[TextPart("SELECT 1" if fixed else "SELEC 1")])
+
+    agent = Agent(CachedModel(FunctionModel(model), "test_agent", cache=cache), output_type=str, retries=1)
+
+    @agent.output_validator
+    def validate_sql(output: str) -> str:
+        if not output.startswith("SELECT "):
+            raise ModelRetry("Invalid SQL")
+        return output
+
+    with pytest.raises(UnexpectedModelBehavior):
+        await agent.run("question")
+    assert len(calls) == 2
+    assert len(cache) == 0
+
+    fixed = True
+    assert (await agent.run("question")).output == "SELECT 1"
+    assert (await agent.run("question")).output == "SELECT 1"
+    assert len(calls) == 3
+
+
+@pytest.mark.asyncio
+async def test_record_and_replay(cache):
+    calls = []
+    record = Agent(CachedModel(counting_model(calls), "test_agent", cache=cache, mode="record"), output_type=str)
+    await record.run("question")
+    await record.run("question")
+    assert len(calls) == 2
+
+    replay = Agent(CachedModel(counting_model(calls), "test_agent", cache=cache, mode="replay"), output_type=str)
+    assert (await replay.run("question")).output == "call 2"
+    with pytest.raises(LookupError):
+        await replay.run("another question")
+    assert len(calls) == 2
+
+    off = Agent(CachedModel(counting_model(calls), "test_agent", cache=cache, mode="off"), output_type=str)
+    await off.run("question")
+    assert len(calls) == 3
+    with pytest.raises(ValueError):
+        CachedModel(counting_model(calls), "test_agent", cache=cache, mode="sometimes")
+
+
+@pytest.mark.asyncio
+async def test_cache_is_size_bounded(tmp_path):
+    calls = []
+    cache = DiskCache(tmp_path / "llm.sqlite", ttl=60, max_entries=2)
+    agent = Agent(CachedModel(counting_model(calls), "test_agent", cache=cache), output_type=str)
+    for question in ["a", "b", "c"]:
+        await agent.run(question)
+    assert len(cache) == 2
+    await agent.run("a")
+    assert len(calls) == 4
@@ -0,0 +1,60 @@
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+from pydantic_ai.usage import RequestUsage
+from metrics import Metrics, InstrumentedModel, log_payload, metrics, model_retry
+import pytest
+
+
+def test_stage_histogram_and_prometheus_export():
+    registry = Metrics(buckets=(0.1, 1.0))
+    registry.observe("stage_seconds", 0.05, stage="search")
+    registry.observe("stage_seconds", 0.5, stage="search")
+    registry.inc("bytes_downloaded_total", 2048, endpoint="series/search")
+    registry.register_collector("search_cache", lambda: {"cache_hits": 3})
+
+    snapshot = registry.snapshot()
+    assert snapshot["histograms"]["stage_seconds"] == [
+        {"labels": {"stage": "search"}, "count": 2, "sum": 0.55, "buckets": {0.1: 1, 1.0: 2}}
+    ]
+    text = registry.to_prometheus()
+    assert '# TYPE fred_stage_seconds histogram' in text
+    assert 'fred_stage_seconds_bucket{stage="search",le="0.1"} 1' in text
+    assert 'fred_stage_seconds_bucket{stage="search",le="+Inf"} 2' in text
+    assert 'fred_bytes_downloaded_total{endpoint="series/search"} 2048' in text
+    assert 'fred_cache_hits{source="search_cache"} 3' in text
+
+def test_stage_records_errors():
+    registry = Metrics()
+    with pytest.raises(ValueError):
+        with registry.stage("download"):
+            raise ValueError("boom")
+    assert registry.snapshot()["histograms"]["stage_seconds"][0]["labels"] == {"stage": "download", "outcome": "error"}
+
+def test_log_payload_is_lazy():
+    built = []
+    log_payload("payload", lambda: built.append(1), sample_rate=0)
+    assert built == []
+
+@pytest.mark.asyncio
+async def test_instrumented_model_counts_requests_tokens_and_retries():
+    metrics.reset()
+
+    async def model(messages, info):
+        return ModelResponse(parts=[TextPart("ok")], usage=RequestUsage(input_tokens=10, output_tokens=2))
+
+    agent = Agent(InstrumentedModel(FunctionModel(model), "test_agent"))
+    retried = []
+
+    @agent.output_validator
+    async def validate(output: str) -> str:
+        if not retried:
+            retried.append(1)
+            raise model_retry("test_agent", "again")
+        return output
+
+    await agent.run("question")
+    counters = metrics.snapshot()["counters"]
+    assert counters["llm_requests_total"] == [{"labels": {"agent": "test_agent"}, "value": 2}]
+    assert counters["llm_retries_total"] == [{"labels": {"agent": "test_agent"}, "value": 1}]
+    assert {"labels": {"agent": "test_agent", "kind": "input"}, "value": 20} in counters["llm_tokens_total"]
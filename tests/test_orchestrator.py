@@ -1,7 +1,13 @@
-from orchestrator import orchestrator_agent, get_data_from_question, generate_and_execute_sql
-from query_agent import DatabaseInfo, get_csv_schema
+from orchestrator import orchestrator_agent, get_data_from_question, generate_and_execute_sql, stream_question
+from query_agent import DatabaseInfo
+from resolution_cache import ResolutionCache
+from progress import SeriesChosen, SqlGenerated, AnswerDelta, Answer
+from series_store import ingest_csv, get_table_schema
 from pathlib import Path
+import orchestrator
+import asyncio
 import pytest
+import json
 import logfire
 
 logfire.configure(send_to_logfire=True)
@@ -13,11 +19,11 @@ async def test_get_data_from_question():
     assert database_info
 
 @pytest.mark.asyncio
-async def test_generate_and_execute_sql():
+async def test_generate_and_execute_sql(tmp_path):
     question = "What is the unemployment rate in the US in 2023?"
-    csv_path = Path('tests/obs._by_real-time_period_LNS14000024.csv')
-    db_schema = get_csv_schema(Path('tests/obs._by_real-time_period_LNS14000024.csv'))
-    database_info = DatabaseInfo(csv_path=csv_path, db_schema=db_schema)
+    db_path = tmp_path / "fred.duckdb"
+    table_name = ingest_csv(Path('tests/obs._by_real-time_period_LNS14000024.csv'), "LNS14000024", db_path)
+    database_info = DatabaseInfo(table_name=table_name, db_schema=get_table_schema(table_name, db_path), db_path=db_path)
     answer = await generate_and_execute_sql(database_info, question)
     assert answer
 
@@ -25,4 +31,109 @@ async def test_generate_and_execute_sql():
 async def test_orchestrator_agent():
     question = "What is the unemployment rate in the US in 2023?"
     result = await orchestrator_agent.run(question)
-    assert result
\ No newline at end of file
+    assert result
+
+def stream_orchestrator(database_info_args: dict):
+    """Orchestrator model that calls both tools in turn, then streams its answer"""
+    from pydantic_ai.models.function import DeltaToolCall, FunctionModel
+
+    async def stream(messages, info):
+        if len(messages) == 1:
+            yield {0: DeltaToolCall(name="get_data_from_question", json_args='{"question": "latest unemployment rate"}')}
+        elif len(messages) == 3:
+            args = {"database_info": database_info_args, "question": "What is the latest unemployment rate?"}
+            yield {0: DeltaToolCall(name="generate_and_execute_sql", json_args=json.dumps(args))}
+        else:
+            for token in ["The latest ", "rate is ", "3.5%."]:
+                yield token
+
+    return FunctionModel(stream_function=stream)
+
+@pytest.mark.asyncio
+async def test_stream_question(tmp_path, monkeypatch):
+    """Test that the stages are reported in order before the answer is streamed"""
+    db_path = tmp_path / "fred.duckdb"
+    table_name = ingest_csv(Path('tests/obs._by_real-time_period_LNS14000024.csv'), "LNS14000024", db_path)
+    database_info = DatabaseInfo(table_name=table_name, db_schema=get_table_schema(table_name, db_path), db_path=db_path)
+
+    async def find_series(question):
+        return {"title": "Unemployment Rate - 25 Yrs. & over", "id": "LNS14000024"}
+
+    async def load_series(series_id):
+        return database_info
+
+    monkeypatch.setattr(orchestrator, "resolution_cache", ResolutionCache(tmp_path / "resolutions.sqlite"))
+    monkeypatch.setattr(orchestrator, "find_series", find_series)
+    monkeypatch.setattr(orchestrator, "load_series", load_series)
+    database_info_args = {"table_name": table_name, "db_schema": database_info.db_schema, "db_path": str(db_path)}
+    with orchestrator_agent.override(model=stream_orchestrator(database_info_args)):
+        events = [event async for event in stream_question("What is the latest unemployment rate?")]
+
+    assert events[0] == SeriesChosen(series_id="LNS14000024", title="Unemployment Rate - 25 Yrs. & over")
+    assert isinstance(events[1], SqlGenerated) and events[1].source == "template"
+    assert [event.text for event in events[2:-1]] == ["The latest ", "rate is ", "3.5%."]
+    assert all(isinstance(event, AnswerDelta) for event in events[2:-1])
+    assert events[-1] == Answer(text="The latest rate is 3.5%.")
+    assert events[0].to_dict()["event"] == "series_chosen"
+
+@pytest.mark.asyncio
+async def test_stream_question_cancels_remaining_stages(tmp_path, monkeypatch):
+    """Test that closing the stream after the series is chosen cancels the load before returning"""
+    loading = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def find_series(question):
+        return {"title": "Unemployment Rate", "id": "UNRATE"}
+
+    async def pull_observations_async(series_id, incremental=False):
+        loading.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    monkeypatch.setattr(orchestrator, "resolution_cache", ResolutionCache(tmp_path / "resolutions.sqlite"))
+    monkeypatch.setattr(orchestrator, "find_series", find_series)
+    monkeypatch.setattr(orchestrator, "pull_observations_async", pull_observations_async)
+    with orchestrator_agent.override(model=stream_orchestrator({})):
+        stream = stream_question("What is the unemployment rate?")
+        event = await anext(stream)
+        assert isinstance(event, SeriesChosen)
+        await asyncio.wait_for(loading.wait(), 5)
+        await stream.aclose()
+    # The load is cancelled by the time the stream is closed
+    assert cancelled.is_set()
+
+@pytest.mark.asyncio
+async def test_stream_question_consumer_cancellation_propagates(tmp_path, monkeypatch):
+    """Test that cancelling the task consuming the stream cancels the run and leaves the task cancelled"""
+    loading = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def find_series(question):
+        return {"title": "Unemployment Rate", "id": "UNRATE"}
+
+    async def pull_observations_async(series_id, incremental=False):
+        loading.set()
+        try:
+            await asyncio.sleep(60)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def consume():
+        async for _ in stream_question("What is the unemployment rate?"):
+            pass
+
+    monkeypatch.setattr(orchestrator, "resolution_cache", ResolutionCache(tmp_path / "resolutions.sqlite"))
+    monkeypatch.setattr(orchestrator, "find_series", find_series)
+    monkeypatch.setattr(orchestrator, "pull_observations_async", pull_observations_async)
+    with orchestrator_agent.override(model=stream_orchestrator({})):
+        consumer = asyncio.create_task(consume())
+        await asyncio.wait_for(loading.wait(), 5)
+        consumer.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await consumer
+    assert consumer.cancelled()
+    assert cancelled.is_set()
@@ -0,0 +1,52 @@
+from panel import build_panel, describe_panel
+from series_store import ingest_csv, get_table_schema, connect
+from datetime import date
+from pathlib import Path
+
+
+def write_series(path: Path, series_id: str, observations: list[tuple[str, float]]) -> Path:
+    lines = [f"period_start_date,{series_id},realtime_start_date,realtime_end_date"]
+    lines += [f"{period},{value},2024-01-01," for period, value in observations]
+    path.write_text("\n".join(lines) + "\n")
+    return path
+
+def test_build_panel_averages_to_coarsest_frequency(tmp_path):
+    """Test that a monthly series is averaged to quarters next to a quarterly series"""
+    db_path = tmp_path / "fred.duckdb"
+    ingest_csv(Path("tests/obs._by_real-time_period_LNS14000024.csv"), "LNS14000024", db_path)
+    quarterly = [(f"{year}-{month:02d}-01", year + month / 100) for year in range(2020, 2024) for month in (1, 4, 7, 10)]
+    ingest_csv(write_series(tmp_path / "gdp.csv", "GDPTEST", quarterly), "GDPTEST", db_path)
+
+    panel = build_panel([{"title": "Unemployment", "id": "LNS14000024"}, {"title": "GDP", "id": "GDPTEST"}], db_path)
+    assert panel["frequency"] == "Q"
+    assert [series["frequency"] for series in panel["series"]] == ["M", "Q"]
+    assert get_table_schema(panel["table_name"], db_path)["columns"] == ["period_start_date", "LNS14000024", "GDPTEST"]
+
+    conn = connect(db_path)
+    row = conn.execute(f"SELECT * FROM {panel['table_name']} WHERE period_start_date = '2023-04-01'").fetchone()
+    expected = conn.execute(
+        "SELECT AVG(LNS14000024) FROM lns14000024 WHERE realtime_end_date IS NULL "
+        "AND period_start_date BETWEEN '2023-04-01' AND '2023-06-01'"
+    ).fetchone()[0]
+    assert row == (date(2023, 4, 1), expected, 2023.04)
+    # Quarters before the quarterly series starts keep the monthly average and a NULL
+    assert conn.execute(f"SELECT GDPTEST FROM {panel['table_name']} WHERE period_start_date = '2000-01-01'").fetchone() == (None,)
+    assert "averaged to quarterly" in describe_panel(panel)
+
+def test_build_panel_as_of(tmp_path):
+    """Test that daily series are aligned on the dates of the first one with their latest value"""
+    db_path = tmp_path / "fred.duckdb"
+    ingest_csv(write_series(tmp_path / "a.csv", "DAILYA", [("2024-01-01", 1.0), ("2024-01-02", 2.0), ("2024-01-03", 3.0)]), "DAILYA", db_path)
+    ingest_csv(write_series(tmp_path / "b.csv", "DAILYB", [("2023-12-30", 9.0), ("2023-12-31", 10.0), ("2024-01-02", 20.0)]), "DAILYB", db_path)
+    panel = build_panel([{"title": "A", "id": "DAILYA"}, {"title": "B", "id": "DAILYB"}], db_path)
+    assert panel["frequency"] == "D"
+    rows = connect(db_path).execute(f"SELECT DAILYA, DAILYB FROM {panel['table_name']} ORDER BY period_start_date").fetchall()
+    assert rows == [(1.0, 10.0), (2.0, 20.0), (3.0, 20.0)]
+    # A weekly series next to a daily one keeps the daily rows
+    weekly = [(f"2023-12-{day}", float(day)) for day in (3, 10, 17, 24, 31)]
+    ingest_csv(write_series(tmp_path / "w.csv", "WEEKLYC", weekly), "WEEKLYC", db_path)
+    panel = build_panel([{"title": "A", "id": "DAILYA"}, {"title": "C", "id": "WEEKLYC"}], db_path)
+    assert panel["frequency"] == "D"
+    assert panel["row_count"] == 3
+    assert "one row per daily period" in describe_panel(panel)
+    assert '"WEEKLYC": C (weekly, latest value as of each date)' in describe_panel(panel)
@@ -1,4 +1,5 @@
-from process_data import zipfile_to_csv, get_csv_schema, infer_type
+import process_data
+from process_data import zipfile_to_csv, get_csv_schema, infer_type, infer_types
 import duckdb
 from pathlib import Path
 
@@ -37,4 +38,58 @@ def test_db_relation_from_csv():
 
     results = duckdb.sql("SELECT COUNT(*) FROM relation").fetchall()
     print(results)
-    assert(results == [(660,)])
\ No newline at end of file
+    assert(results == [(660,)])
+
+def test_get_csv_schema_cached(tmp_path, monkeypatch):
+    csv_path = tmp_path / "MSIM2.csv"
+    csv_path.write_text(Path("tests/obs._by_real-time_period_MSIM2.csv").read_text())
+    schema = get_csv_schema(csv_path)
+
+    def fail(*args):
+        raise AssertionError("schema should come from the cache")
+    monkeypatch.setattr(process_data, "infer_types", fail)
+    assert get_csv_schema(csv_path) == schema
+
+    csv_path.write_text("period_start_date,value\n2020-01-01,1\n")
+    monkeypatch.undo()
+    assert get_csv_schema(csv_path)['sample_size'] == 1
+
+def test_get_csv_schema_small_file(tmp_path):
+    csv_path = tmp_path / "small.csv"
+    csv_path.write_text("period_start_date,value\n2020-01-01,1\n2020-02-01,2\n")
+    schema = get_csv_schema(csv_path)
+    assert schema['sample_size'] == 2
+    assert schema['types'] == {"period_start_date": "date", "value": "integer"}
+
+def test_infer_types():
+    headers = ["integer", "float", "date", "timestamp", "string", "empty", "missing"]
+    rows = [
+        ["1", "1.5", "2020-01-01", "2020-01-01 09:30:00", "a", "", "."],
+        ["2", "2", "2020-02-01", "2020-02-01", "2020-01-01", ".", ""],
+        ["3", ".", "2020-03-01", "2020-03-01T10:00", "3", "", "4.5"],
+    ]
+    result = infer_types(headers, rows)
+    assert result['types'] == {
+        "integer": "integer",
+        "float": "float",
+        "date": "date",
+        "timestamp": "timestamp",
+        "string": "string",
+        "empty": "empty",
+        "missing": "float",
+    }
+    assert result['nullable'] == {
+        "integer": False,
+        "float": True,
+        "date": False,
+        "timestamp": False,
+        "string": False,
+        "empty": True,
+        "missing": True,
+    }
+
+def test_infer_types_matches_infer_type():
+    values = [['1', '2', '3'], ['1.0', '2.0', '3.0'], ['a', 'b', 'c'], ['2020-01-01', '2020-02-01', '2020-03-01']]
+    headers = [str(i) for i in range(len(values))]
+    rows = list(zip(*values))
+    assert list(infer_types(headers, rows)['types'].values()) == [infer_type(v) for v in values]
@@ -1,4 +1,12 @@
-from pull_fred import search_keywords, pull_observations
+from pull_fred import search_keywords, pull_observations, pull_observations_async
+from file_lock import file_lock
+from series_store import ingest_csv, get_observations_state, connect
+from pathlib import Path
+import asyncio
+import zipfile
+import pytest
+import time
+import io
 
 def test_search_keywords():
     """Test that the search_keywords function returns a dict with no error code"""
@@ -13,4 +21,89 @@ def test_pull_observations():
     series_id = "MSIM2"
     result = pull_observations(series_id)
     assert result
-    assert result["success"]
\ No newline at end of file
+    assert result["success"]
+
+def test_pull_observations_incremental(fred_stub, tmp_path):
+    """Test that an incremental pull only requests and appends observations newer than the series store"""
+    db_path = tmp_path / "fred.duckdb"
+    table_name = ingest_csv(Path("tests/obs._by_real-time_period_LNS14000024.csv"), "LNS14000024", db_path)
+    state = get_observations_state(table_name, db_path)
+    assert state == {"last_period_start_date": "2026-01-01", "realtime_start": "2026-02-26"}
+
+    fred_stub.route("series/observations", lambda params: {"observations": [
+        {"realtime_start": "2026-03-06", "realtime_end": "9999-12-31", "date": "2026-02-01", "value": "4.2"},
+    ]})
+    result = pull_observations("LNS14000024", incremental=True, db_path=db_path)
+    assert result["success"]
+    assert result["appended"] == 1
+    _, params = fred_stub.requests[-1]
+    assert params["observation_start"] == "2026-01-02"
+    assert params["realtime_start"] == "2026-02-26"
+    assert get_observations_state(table_name, db_path)["last_period_start_date"] == "2026-02-01"
+    latest = connect(db_path).execute(f"SELECT * FROM {table_name} ORDER BY period_start_date DESC LIMIT 1").fetchone()
+    assert latest[1] == 4.2
+    assert latest[3] is None
+
+def test_pull_observations_incremental_first_pull(fred_stub, tmp_path, monkeypatch):
+    """Test that the first incremental pull downloads the zip and streams it into the series store"""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_ref:
+        zip_ref.write(Path(__file__).parent / "obs._by_real-time_period_MSIM2.csv", "obs._by_real-time_period.csv")
+    fred_stub.route("series/observations", lambda params: buffer.getvalue())
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path)
+    result = pull_observations("MSIM2", incremental=True, db_path=tmp_path / "fred.duckdb")
+    assert result["success"]
+    assert result["table_name"] == "msim2"
+    assert result["appended"] is None
+
+def observations_zip() -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_ref:
+        zip_ref.write(Path(__file__).parent / "obs._by_real-time_period_MSIM2.csv", "obs._by_real-time_period.csv")
+    return buffer.getvalue()
+
+@pytest.mark.asyncio
+async def test_pull_observations_single_flight(fred_stub, tmp_path, monkeypatch):
+    """Test that concurrent pulls of one series share a single download"""
+    content = observations_zip()
+    def slow_zip(params):
+        time.sleep(0.1)
+        return content
+    fred_stub.route("series/observations", slow_zip)
+    monkeypatch.chdir(tmp_path)
+    results = await asyncio.gather(*(pull_observations_async("MSIM2") for _ in range(4)))
+    assert all(result["success"] for result in results)
+    assert fred_stub.count("series/observations") == 1
+    assert zipfile.ZipFile(tmp_path / "data" / "MSIM2.zip").testzip() is None
+    assert not list((tmp_path / "data").glob("*.tmp"))
+
+def test_pull_observations_rejects_corrupt_zip(fred_stub, tmp_path, monkeypatch):
+    """Test that a truncated download is not published over the last good zip"""
+    content = observations_zip()
+    monkeypatch.chdir(tmp_path)
+    fred_stub.route("series/observations", lambda params: content)
+    assert pull_observations("MSIM2")["success"]
+
+    fred_stub.route("series/observations", lambda params: content[:len(content) // 2])
+    result = pull_observations("MSIM2")
+    assert not result["success"]
+    assert (tmp_path / "data" / "MSIM2.zip").read_bytes() == content
+    assert not list((tmp_path / "data").glob("*.tmp"))
+
+    fred_stub.route("series/observations", lambda params: (429, b'{"error_code": 429}', {}))
+    assert not pull_observations("MSIM2")["success"]
+
+@pytest.mark.asyncio
+async def test_pull_observations_waits_for_other_process(fred_stub, tmp_path, monkeypatch):
+    """Test that a pull waiting on another process's lock reuses the zip it published"""
+    monkeypatch.chdir(tmp_path)
+    fred_stub.route("series/observations", lambda params: observations_zip())
+    zip_path = tmp_path / "data" / "MSIM2.zip"
+    with file_lock(tmp_path / "data" / "MSIM2.zip.lock"):
+        task = asyncio.create_task(pull_observations_async("MSIM2"))
+        await asyncio.sleep(0.1)
+        zip_path.write_bytes(observations_zip())
+    result = await task
+    assert result["success"]
+    assert fred_stub.count("series/observations") == 0
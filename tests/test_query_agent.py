@@ -1,31 +1,61 @@
-from query_agent import DatabaseInfo, sql_agent, execute_sql_agent
-from process_data import get_csv_schema
+from query_agent import DatabaseInfo, sql_agent, answer_agent, answer_with_sql, strip_sql
+from series_store import ingest_csv, get_table_schema, connect
 import logfire
 import pytest
-import duckdb
 
 from pathlib import Path
 
 logfire.configure(send_to_logfire=True)
 
 @pytest.mark.asyncio
-async def test_sql_agent():
-    csv_path = Path('tests/obs._by_real-time_period_MSIM2.csv')
-    db_schema = get_csv_schema(Path('tests/obs._by_real-time_period_MSIM2.csv'))
-    database_info = DatabaseInfo(csv_path=csv_path, db_schema=db_schema)
+async def test_sql_agent(tmp_path):
+    db_path = tmp_path / "fred.duckdb"
+    table_name = ingest_csv(Path('tests/obs._by_real-time_period_MSIM2.csv'), "MSIM2", db_path)
+    database_info = DatabaseInfo(table_name=table_name, db_schema=get_table_schema(table_name, db_path), db_path=db_path)
     result = await sql_agent.run("What is the average value of the MSIM2 series?", deps=database_info)
     logfire.info(result.output)
-    duckdb.execute(result.output)
+    connect(db_path).execute(result.output)
     assert result
     assert result.output.find("SELECT AVG(MSIM2)") >= 0
-    assert result.output.find("FROM read_csv_auto('tests/obs._by_real-time_period_MSIM2.csv')") >= 0
+    assert result.output.find("FROM msim2") >= 0
 
 @pytest.mark.asyncio
-async def test_execute_sql_agent():
-    csv_path = Path('tests/obs._by_real-time_period_MSIM2.csv')
-    db_schema = get_csv_schema(Path('tests/obs._by_real-time_period_MSIM2.csv'))
-    database_info = DatabaseInfo(csv_path=csv_path, db_schema=db_schema)
-    result = await execute_sql_agent.run("What is the average value of the MSIM2 series?", deps=database_info)
-    logfire.info(result.output)
+async def test_answer_with_sql(tmp_path):
+    db_path = tmp_path / "fred.duckdb"
+    table_name = ingest_csv(Path('tests/obs._by_real-time_period_MSIM2.csv'), "MSIM2", db_path)
+    database_info = DatabaseInfo(table_name=table_name, db_schema=get_table_schema(table_name, db_path), db_path=db_path)
+    result = await answer_with_sql(database_info, "What is the average value of the MSIM2 series?")
+    logfire.info(result)
     assert result
-    assert result.output.find("4015") >= 0
\ No newline at end of file
+    assert result.find("4015") >= 0
+
+def test_strip_sql():
+    assert strip_sql("```sql\nSELECT 1 FROM msim2;\n```") == "SELECT 1 FROM msim2"
+
+@pytest.mark.asyncio
+async def test_answer_with_sql_retries_on_binder_error(tmp_path):
+    """Test that DuckDB's binder error is fed back to the SQL model and the answer takes one more call"""
+    from pydantic_ai.messages import ModelResponse, TextPart
+    from pydantic_ai.models.function import FunctionModel
+
+    db_path = tmp_path / "fred.duckdb"
+    table_name = ingest_csv(Path('tests/obs._by_real-time_period_MSIM2.csv'), "MSIM2", db_path)
+    database_info = DatabaseInfo(table_name=table_name, db_schema=get_table_schema(table_name, db_path), db_path=db_path)
+    sql_prompts, answer_prompts = [], []
+
+    def sql_model(messages, info):
+        sql_prompts.append(messages[-1].parts[-1].content)
+        column = "value" if len(sql_prompts) == 1 else "MSIM2"
+        return ModelResponse(parts=[TextPart(f"```sql\nSELECT ROUND(AVG({column})) FROM {table_name};\n```")])
+
+    def answer_model(messages, info):
+        answer_prompts.append(messages[-1].parts[-1].content)
+        return ModelResponse(parts=[TextPart("The average is 4016.")])
+
+    with sql_agent.override(model=FunctionModel(sql_model)), answer_agent.override(model=FunctionModel(answer_model)):
+        answer = await answer_with_sql(database_info, "What is the average value of the MSIM2 series?")
+    assert answer == "The average is 4016."
+    assert len(sql_prompts) == 2
+    assert 'Referenced column "value" not found' in sql_prompts[1]
+    assert len(answer_prompts) == 1
+    assert "[(4016.0,)]" in answer_prompts[0]
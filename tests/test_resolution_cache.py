@@ -0,0 +1,50 @@
+from resolution_cache import ResolutionCache, normalize_question, same_terms
+import pytest
+
+UNRATE = {"title": "Unemployment Rate", "id": "UNRATE"}
+M2SL = {"title": "M2", "id": "M2SL"}
+
+def test_normalize_question():
+    assert normalize_question("What is the US unemployment rate in 2023?") == "rate unemployment us"
+    assert normalize_question("unemployment rate in the US in 2022") == "rate unemployment us"
+    assert normalize_question("M2 money supply") == "m2 money supply"
+
+def test_resolution_cache_exact_and_similar(tmp_path):
+    cache = ResolutionCache(tmp_path / "resolutions.sqlite")
+    cache.put("US unemployment rate 2023", UNRATE)
+    cache.put("What is the M2 money supply?", M2SL)
+    assert cache.get("unemployment rate in the US in 2022") == UNRATE
+    assert cache.get("What was the unemployment rate?") == UNRATE
+    assert cache.get("M1 money supply") is None
+    assert cache.get("Consumer price index") is None
+
+def test_resolution_cache_persists(tmp_path):
+    ResolutionCache(tmp_path / "resolutions.sqlite").put("US unemployment rate 2023", UNRATE)
+    assert ResolutionCache(tmp_path / "resolutions.sqlite").get("the unemployment rate for the US") == UNRATE
+
+def test_resolution_cache_threshold_and_eviction(tmp_path):
+    cache = ResolutionCache(tmp_path / "resolutions.sqlite", threshold=1.0, max_entries=1)
+    cache.put("US unemployment rate", UNRATE)
+    assert cache.get("unemployment rate") is None
+    cache.put("M2 money supply", M2SL)
+    assert cache.get("US unemployment rate") is None
+    assert cache.get("M2 money supply") == M2SL
+
+@pytest.mark.parametrize("cached, question", [
+    ("unemployment rate for women", "What is the unemployment rate for men?"),
+    ("10-year treasury yield", "What is the 2-year treasury yield?"),
+    ("10-year treasury yield", "What is the 30-year treasury yield?"),
+    ("civilian unemployment rate", "What was the civilian unemployment rate in Texas?"),
+    ("What was the average value of the benchmark series R0Q0?", "What was the average value of the benchmark series R0Q1?"),
+])
+def test_resolution_cache_rejects_different_series(tmp_path, cached, question):
+    cache = ResolutionCache(tmp_path / "resolutions.sqlite")
+    cache.put(cached, UNRATE)
+    assert cache.get(question) is None
+
+def test_same_terms():
+    assert same_terms("labor participation rate", "labour participation rate")
+    assert same_terms("rate unemployment", "rate unemploymnet us")
+    assert same_terms("rate unemployment", "rates unemployment")
+    assert not same_terms("rate unemployment women", "men rate unemployment")
+    assert not same_terms("m1 money supply", "m2 money supply")
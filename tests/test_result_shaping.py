@@ -0,0 +1,94 @@
+from result_shaping import execute_shaped, fetch_result
+from db_session import get_session
+import result_shaping
+from series_store import ingest_csv, get_table_schema
+from query_agent import DatabaseInfo, execute_sql
+from pathlib import Path
+import pytest
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    db_path = tmp_path / "fred.duckdb"
+    ingest_csv(Path("tests/obs._by_real-time_period_LNS14000024.csv"), "LNS14000024", db_path)
+    return db_path
+
+
+def test_small_result_is_kept_whole(db_path):
+    result = execute_shaped("SELECT 1 AS a, 'x' AS b UNION ALL SELECT 2, NULL ORDER BY a", db_path)
+    assert not result.truncated
+    assert result.rows == [(1, "x"), (2, None)]
+    assert result.to_prompt() == "[(1, 'x'), (2, None)]"
+
+
+def test_large_result_is_truncated(db_path):
+    sql = "SELECT i, i * 0.5 AS half FROM range(10000) t(i) ORDER BY i"
+    result = execute_shaped(sql, db_path, head_rows=5, tail_rows=3, batch_size=100)
+    assert result.truncated
+    assert result.row_count == 10000
+    assert [row[0] for row in result.head] == [0, 1, 2, 3, 4]
+    assert [row[0] for row in result.tail] == [9997, 9998, 9999]
+    assert result.stats["half"].minimum == 0 and result.stats["half"].maximum == 4999.5
+    assert result.stats["i"].mean == pytest.approx(4999.5)
+    prompt = result.to_prompt()
+    assert "(9992 rows omitted)" in prompt
+    assert "- half: min 0.0, max 4999.5, mean 2499.75" in prompt
+
+
+def test_byte_budget(db_path):
+    result = execute_shaped("SELECT repeat('x', 100) FROM range(1000)", db_path, head_rows=100, tail_rows=100, max_bytes=1000)
+    assert result.truncated
+    assert 0 < len(result.head) < 100
+    assert sum(len(repr(row)) for row in result.rows) <= 1000
+    # A first row over the budget is still kept
+    result = execute_shaped("SELECT repeat('x', 5000)", db_path, max_bytes=1000)
+    assert len(result.head) == 1
+
+
+def test_stats_of_any_column_type(db_path):
+    """Test that nested columns do not break the statistics and NaN does not poison them"""
+    sql = "SELECT {'a': i} AS s, [i] AS l, CASE WHEN i = 5 THEN 'nan'::DOUBLE ELSE i END AS x, 'v' || i AS v FROM range(100) t(i)"
+    result = execute_shaped(sql, db_path, head_rows=2, tail_rows=2)
+    assert result.truncated
+    assert result.stats["s"].count == 100 and result.stats["s"].minimum is None
+    assert (result.stats["x"].minimum, result.stats["x"].maximum) == (0, 99)
+    assert result.stats["x"].mean == pytest.approx((4950 - 5) / 99)
+    assert (result.stats["v"].minimum, result.stats["v"].maximum) == ("v0", "v99")
+    assert "- s: 100 values" in result.to_prompt()
+
+
+def test_fetch_result_by_handle(db_path):
+    sql = "SELECT i FROM range(100) t(i) ORDER BY i"
+    result = execute_shaped(sql, db_path, head_rows=2, tail_rows=2)
+    assert fetch_result(result.handle) == [(i,) for i in range(100)]
+    assert fetch_result(result.handle, offset=10, limit=3) == [(10,), (11,), (12,)]
+    assert fetch_result(result.handle, offset=98) == [(98,), (99,)]
+    with pytest.raises(KeyError):
+        fetch_result("unknown")
+
+
+def test_fetch_result_is_the_result_as_run(db_path, monkeypatch):
+    """Test that a handle keeps the rows its query returned after the store changes, and is dropped on eviction"""
+    monkeypatch.setattr(result_shaping, "RESULT_HANDLES_MAX", 2)
+    session = get_session(db_path)
+    session.execute("CREATE TABLE changing AS SELECT i FROM range(10) t(i)")
+    result = execute_shaped("SELECT i FROM changing", db_path, head_rows=2, tail_rows=2)
+    session.execute("INSERT INTO changing SELECT i FROM range(10, 20) t(i)")
+    session.execute("DELETE FROM changing WHERE i < 5")
+    assert fetch_result(result.handle) == [(i,) for i in range(10)]
+    assert fetch_result(result.handle, offset=4, limit=3) == [(4,), (5,), (6,)]
+    execute_shaped("SELECT 1", db_path)
+    execute_shaped("SELECT 2", db_path)
+    with pytest.raises(KeyError):
+        fetch_result(result.handle)
+    tables = session.execute("SELECT table_name FROM duckdb_tables() WHERE database_name = 'results'")
+    assert len(tables) == 2
+
+
+def test_execute_sql_daily_select_star(db_path):
+    """Test that a SELECT * keeps the answer prompt small however many rows it returns"""
+    database_info = DatabaseInfo(table_name="lns14000024", db_schema=get_table_schema("lns14000024", db_path), db_path=db_path)
+    result = execute_sql(database_info, "SELECT * FROM lns14000024")
+    assert result.row_count == 937
+    assert result.truncated
+    assert len(result.to_prompt()) < 8000
@@ -0,0 +1,55 @@
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+from runtime import LazyModel
+from pathlib import Path
+import subprocess
+import json
+import sys
+import os
+import pytest
+
+# Seconds the import may take; generous by default since shared CI machines vary a lot,
+# set lower to catch smaller regressions on a known machine
+IMPORT_TIME_BUDGET = float(os.getenv("IMPORT_TIME_BUDGET", 10))
+
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import orchestrator, batch
+elapsed = time.perf_counter() - start
+import runtime
+print(json.dumps({
+    "elapsed": elapsed,
+    "openai": "openai" in sys.modules,
+    "process_data": "process_data" in sys.modules,
+    "telemetry_configured": runtime._telemetry_configured,
+}))
+"""
+
+def test_import_is_lazy_and_within_budget():
+    """Test that importing the pipeline builds no model, configures no telemetry and stays within IMPORT_TIME_BUDGET"""
+    env = {name: value for name, value in os.environ.items() if name not in ("OLLAMA_BASE_URL", "LOGFIRE_TOKEN")}
+    probe = subprocess.run(
+        [sys.executable, "-c", IMPORT_PROBE], cwd=Path(__file__).parent.parent, env=env,
+        capture_output=True, text=True, check=True,
+    )
+    result = json.loads(probe.stdout.strip().splitlines()[-1])
+    assert not result["openai"]
+    assert not result["process_data"]
+    assert not result["telemetry_configured"]
+    assert result["elapsed"] < IMPORT_TIME_BUDGET
+
+@pytest.mark.asyncio
+async def test_lazy_model_builds_once_on_first_request():
+    built = []
+
+    def factory():
+        built.append(1)
+        return FunctionModel(lambda messages, info: ModelResponse(parts=[TextPart("ok")]))
+
+    agent = Agent(LazyModel(factory))
+    assert built == []
+    await agent.run("question")
+    await agent.run("question")
+    assert built == [1]
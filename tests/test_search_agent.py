@@ -1,5 +1,8 @@
 import pytest
 from search_agent import search_series, keyword_agent, get_seriess_from_question, sanitize_keywords, pick_series
+from series_catalog import SeriesCatalog
+import search_agent
+import pull_fred
 import logfire
 from pathlib import Path
 import asyncio
@@ -58,3 +61,18 @@ async def test_pick_series_unemployment():
     result = await pick_series(question, seriess_md)
     assert result
     assert result == {"title": "Unemployment Rate", "id": "UNRATE"}
+
+@pytest.mark.asyncio
+async def test_search_series_uses_catalog(fred_stub, tmp_path, monkeypatch):
+    catalog = SeriesCatalog(tmp_path / "catalog.sqlite")
+    monkeypatch.setattr(pull_fred, "series_catalog", catalog)
+    monkeypatch.setattr(search_agent, "series_catalog", catalog)
+    fred_stub.route("series/search", lambda params: {"seriess": [
+        {"title": f"Unemployment Rate {i}", "id": f"UNRATE{i}"} for i in range(5)
+    ]})
+    result = await search_series("unemployment+rate")
+    assert len(result) == 5
+    assert len(catalog) == 5
+    result = await search_series("Unemployment Rate")
+    assert fred_stub.count("series/search") == 1
+    assert {series["id"] for series in result} == {f"UNRATE{i}" for i in range(5)}
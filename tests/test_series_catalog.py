@@ -0,0 +1,51 @@
+from series_catalog import SeriesCatalog
+import json
+
+SERIESS = [
+    {"id": "UNRATE", "title": "Unemployment Rate", "frequency_short": "M", "units_short": "%",
+     "seasonal_adjustment_short": "SA", "popularity": 94, "observation_end": "2026-01-01"},
+    {"id": "UNRATENSA", "title": "Unemployment Rate", "frequency_short": "M", "units_short": "%",
+     "seasonal_adjustment_short": "NSA", "popularity": 60, "observation_end": "2026-01-01"},
+    {"id": "LNS14000024", "title": "Unemployment Rate - 20 Yrs. & over", "frequency_short": "M",
+     "units_short": "%", "seasonal_adjustment_short": "SA", "popularity": 50, "observation_end": "2026-01-01"},
+    {"id": "CPIAUCSL", "title": "Consumer Price Index for All Urban Consumers: All Items in U.S. City Average",
+     "frequency_short": "M", "units_short": "Index 1982-1984=100", "seasonal_adjustment_short": "SA", "popularity": 95},
+    {"id": "M2SL", "title": "M2", "frequency_short": "M", "units_short": "Bil. of $", "popularity": 80},
+]
+
+def test_catalog_search_ranks_with_bm25(tmp_path):
+    catalog = SeriesCatalog(tmp_path / "catalog.sqlite")
+    catalog.add_seriess(SERIESS)
+    results = catalog.search("Unemployment+Rate")
+    assert [entry["id"] for entry, _, _ in results] == ["UNRATE", "UNRATENSA", "LNS14000024"]
+    assert results[0][2] == 1.0
+    assert catalog.search("consumer price")[0][0]["id"] == "CPIAUCSL"
+    assert catalog.search("m2sl")[0][0]["id"] == "M2SL"
+    assert catalog.search("gdp") == []
+
+def test_catalog_persists_and_updates(tmp_path):
+    SeriesCatalog(tmp_path / "catalog.sqlite").add_seriess(SERIESS)
+    catalog = SeriesCatalog(tmp_path / "catalog.sqlite")
+    assert len(catalog) == 5
+    assert catalog.search("m2")[0][0]["popularity"] == 80
+    catalog.add_seriess([{"id": "M2SL", "title": "M2 Money Stock", "popularity": 81}])
+    assert len(catalog) == 5
+    assert catalog.search("money stock")[0][0]["id"] == "M2SL"
+
+def test_catalog_load_seed(tmp_path):
+    seed_path = tmp_path / "seed.json"
+    seed_path.write_text(json.dumps({"seriess": SERIESS}))
+    catalog = SeriesCatalog(tmp_path / "catalog.sqlite")
+    assert catalog.load_seed(seed_path) == 5
+    csv_path = tmp_path / "seed.csv"
+    csv_path.write_text("id,title,frequency,popularity\nGDP,Gross Domestic Product,Quarterly,90\n")
+    assert catalog.load_seed(csv_path) == 1
+    assert catalog.search("gross domestic product")[0][0]["frequency"] == "Quarterly"
+
+def test_catalog_is_confident(tmp_path):
+    catalog = SeriesCatalog(tmp_path / "catalog.sqlite")
+    catalog.add_seriess(SERIESS)
+    assert not catalog.is_confident(catalog.search("unemployment rate"))
+    catalog.add_seriess([{"id": f"UNRATE{i}", "title": f"Unemployment Rate {i}"} for i in range(5)])
+    assert catalog.is_confident(catalog.search("unemployment rate"))
+    assert not catalog.is_confident(catalog.search("unemployment rate women"))
@@ -0,0 +1,109 @@
+import pytest
+from datetime import date
+
+from series_ranker import Candidate, dedupe_candidates, rank_candidates, confident_pick, within_budget
+from search_agent import seriess_to_md
+import search_agent
+
+TODAY = date(2025, 6, 1)
+
+
+def entry(series_id: str, title: str, frequency: str = "M", popularity: int = 50, observation_end: str = "2025-05-01") -> dict:
+    return {"id": series_id, "title": title, "frequency": frequency, "popularity": popularity, "observation_end": observation_end}
+
+
+UNRATE = entry("UNRATE", "Unemployment Rate", popularity=94)
+UNRATE_BLACK = entry("LNS14000006", "Unemployment Rate - Black or African American", popularity=60)
+UNRATE_OECD = entry("LRUN64TTUSM156S", "Unemployment Rate: Aged 15-64: All Persons for United States", popularity=40)
+
+
+def test_dedupe_candidates():
+    candidates = dedupe_candidates([[UNRATE, UNRATE_BLACK, UNRATE], [UNRATE_OECD, UNRATE]])
+    assert [candidate.series["id"] for candidate in candidates] == ["UNRATE", "LNS14000006", "LRUN64TTUSM156S"]
+    assert [candidate.hits for candidate in candidates] == [2, 1, 1]
+
+
+def test_rank_candidates_prefers_matching_popular_series():
+    candidates = dedupe_candidates([[UNRATE_OECD, UNRATE_BLACK, UNRATE]])
+    ranked = rank_candidates("What is the unemployment rate in 2022?", candidates, today=TODAY)
+    assert [candidate.series["id"] for candidate in ranked] == ["UNRATE", "LNS14000006", "LRUN64TTUSM156S"]
+    assert ranked[0].components["title_coverage"] == 1.0
+
+
+def test_rank_candidates_frequency_and_recency():
+    monthly = entry("PAYEMS", "All Employees, Total Nonfarm", frequency="M")
+    quarterly = entry("PAYEMSQ", "All Employees, Total Nonfarm", frequency="Q")
+    ranked = rank_candidates("quarterly total nonfarm employees", dedupe_candidates([[monthly, quarterly]]), today=TODAY)
+    assert ranked[0].series["id"] == "PAYEMSQ"
+
+    discontinued = entry("OLD", "Total Nonfarm Employees", observation_end="1990-01-01")
+    ranked = rank_candidates("total nonfarm employees", dedupe_candidates([[discontinued, monthly]]), today=TODAY)
+    assert ranked[0].series["id"] == "PAYEMS"
+    assert ranked[1].components["recency"] == 0.0
+
+
+def test_confident_pick():
+    ranked = rank_candidates("US unemployment rate", dedupe_candidates([[UNRATE_OECD, UNRATE]]), today=TODAY)
+    assert confident_pick(ranked) == {"title": "Unemployment Rate", "id": "UNRATE"}
+
+    # Two titles covering the question equally well leave the choice to the model
+    ranked = rank_candidates("unemployment rate", dedupe_candidates([[UNRATE, entry("UNRATENSA", "Unemployment Rate", popularity=90)]]), today=TODAY)
+    assert confident_pick(ranked) is None
+    assert confident_pick([]) is None
+
+
+def test_confident_pick_needs_every_question_word():
+    """Test that a generic title is not picked for a question about a state or group, however well it scores"""
+    california = entry("CAUR", "Unemployment Rate in California", popularity=70)
+    candidates = dedupe_candidates([[UNRATE, california], [UNRATE]])
+    ranked = rank_candidates("What was the unemployment rate in California in 2020?", candidates, searches=2, today=TODAY)
+    assert ranked[0].series["id"] == "UNRATE"
+    assert ranked[0].components["query_coverage"] < 1.0
+    assert confident_pick(ranked) is None
+
+    ranked = rank_candidates("Black unemployment rate", dedupe_candidates([[UNRATE, UNRATE_BLACK], [UNRATE]]), searches=2, today=TODAY)
+    assert confident_pick(ranked) is None
+
+
+def test_within_budget():
+    ranked = [Candidate(series=entry(f"S{i}", f"Series number {i}")) for i in range(30)]
+    line_tokens = len(seriess_to_md([ranked[0].series])) / 4
+    selected = within_budget(ranked, seriess_to_md, token_budget=line_tokens * 5.5)
+    assert [series["id"] for series in selected] == [f"S{i}" for i in range(5)]
+    assert len(within_budget(ranked, seriess_to_md, token_budget=0)) == 1
+    assert len(within_budget(ranked, seriess_to_md, token_budget=10_000, max_candidates=20)) == 20
+
+
+@pytest.mark.asyncio
+async def test_find_series_skips_picker_when_confident(monkeypatch, tmp_path):
+    """Test that a clear local winner is returned without calling the picker model, and an unclear one is not"""
+    from pydantic_ai.messages import ModelResponse, ToolCallPart
+    from pydantic_ai.models.function import FunctionModel
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "md_output").mkdir()
+    results = {"unemployment+rate": [UNRATE_OECD, UNRATE], "jobless+rate": [UNRATE_BLACK, UNRATE]}
+    picker_prompts = []
+
+    async def search_series(keywords):
+        return results.get(keywords, [])
+
+    def keyword_model(messages, info):
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, {"keywords": ["unemployment rate", "jobless rate"]})])
+
+    def picker_model(messages, info):
+        picker_prompts.append(messages[-1].parts[-1].content)
+        return ModelResponse(parts=[ToolCallPart(info.output_tools[0].name, {"title": "Unemployment Rate", "id": "UNRATE"})])
+
+    monkeypatch.setattr(search_agent, "search_series", search_series)
+    with search_agent.keyword_agent.override(model=FunctionModel(keyword_model)), \
+            search_agent.series_picker_agent.override(model=FunctionModel(picker_model)):
+        assert await search_agent.find_series("What was the US unemployment rate in 2020?") == {"title": "Unemployment Rate", "id": "UNRATE"}
+        assert picker_prompts == []
+
+        results["unemployment+rate"] = [UNRATE_BLACK, UNRATE_OECD]
+        results["jobless+rate"] = [UNRATE_BLACK]
+        assert await search_agent.find_series("What was the jobless rate?") == {"title": "Unemployment Rate", "id": "UNRATE"}
+    assert len(picker_prompts) == 1
+    assert picker_prompts[0].count("- id: LNS14000006") == 1
+    assert (tmp_path / "md_output" / "seriess.md").is_file()
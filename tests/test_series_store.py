@@ -0,0 +1,72 @@
+from series_store import ingest_csv, ingest_zip, get_table_schema, series_table_name, has_table, connect
+from series_store import append_observations, get_series_summary
+from datetime import date
+from pathlib import Path
+import zipfile
+
+def test_series_table_name():
+    assert series_table_name("LNS14000024") == "lns14000024"
+    assert series_table_name("4BIGEURORECD") == "series_4bigeurorecd"
+
+def test_ingest_csv(tmp_path):
+    db_path = tmp_path / "fred.duckdb"
+    table_name = ingest_csv(Path("tests/obs._by_real-time_period_MSIM2.csv"), "MSIM2", db_path)
+    assert table_name == "msim2"
+    assert has_table(table_name, db_path)
+
+    schema = get_table_schema(table_name, db_path)
+    assert schema["columns"] == ["period_start_date", "MSIM2", "realtime_start_date", "realtime_end_date"]
+    assert schema["types"] == {
+        "period_start_date": "DATE",
+        "MSIM2": "DOUBLE",
+        "realtime_start_date": "DATE",
+        "realtime_end_date": "DATE",
+    }
+
+    results = connect(db_path).execute(f"SELECT COUNT(*), ROUND(AVG(MSIM2)) FROM {table_name}").fetchall()
+    assert results == [(660, 4016.0)]
+
+def test_ingest_zip(tmp_path):
+    """Test that every CSV member of a zip is streamed into one table without extracting it"""
+    zip_path = tmp_path / "MSIM2.zip"
+    with zipfile.ZipFile(zip_path, "w", zipfile.ZIP_DEFLATED) as zip_ref:
+        zip_ref.write("tests/obs._by_real-time_period_MSIM2.csv", "obs._by_real-time_period_1.csv")
+        zip_ref.write("tests/obs._by_real-time_period_MSIM2.csv", "obs._by_real-time_period_2.csv")
+        zip_ref.writestr("README.txt", "not a csv")
+    db_path = tmp_path / "fred.duckdb"
+    table_name = ingest_zip(zip_path, "MSIM2", db_path)
+    assert connect(db_path).execute(f"SELECT COUNT(*) FROM {table_name}").fetchall() == [(1320,)]
+    assert not list(tmp_path.rglob("*.csv"))
+
+def test_series_summary(tmp_path):
+    """Test that the summary is materialized at ingest and refreshed from the first appended period"""
+    db_path = tmp_path / "fred.duckdb"
+    table_name = ingest_csv(Path("tests/obs._by_real-time_period_LNS14000024.csv"), "LNS14000024", db_path)
+    summary = get_series_summary(table_name, db_path)
+    assert summary["frequency"] == "M"
+    assert summary["first_date"] == date(1948, 1, 1)
+    assert (summary["latest_date"], summary["latest_value"]) == (date(2026, 1, 1), 3.9)
+    periods_table = summary["periods_table"]
+    conn = connect(db_path)
+    expected = conn.execute(
+        f"SELECT AVG(LNS14000024), MAX(LNS14000024) FROM {table_name} "
+        "WHERE realtime_end_date IS NULL AND year(period_start_date) = 2023"
+    ).fetchone()
+    assert conn.execute(
+        f"SELECT average, maximum, observations FROM {periods_table} WHERE period_type = 'year' AND period_start = '2023-01-01'"
+    ).fetchone() == (*expected, 12)
+
+    append_observations(table_name, [("2026-02-01", 4.5, "2026-03-06", None)], db_path)
+    summary = get_series_summary(table_name, db_path)
+    assert (summary["latest_date"], summary["latest_value"]) == (date(2026, 2, 1), 4.5)
+    assert summary["observations"] == conn.execute(
+        f"SELECT COUNT(LNS14000024) FROM {table_name} WHERE realtime_end_date IS NULL"
+    ).fetchone()[0]
+    average, growth = conn.execute(
+        f"SELECT average, yoy_growth FROM {periods_table} WHERE period_type = 'quarter' AND period_start = '2026-01-01'"
+    ).fetchone()
+    previous = conn.execute(
+        f"SELECT average FROM {periods_table} WHERE period_type = 'quarter' AND period_start = '2025-01-01'"
+    ).fetchone()[0]
+    assert average == 4.2
+    assert growth == average / previous - 1
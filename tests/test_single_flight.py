@@ -0,0 +1,61 @@
+from single_flight import SingleFlight
+import asyncio
+import pytest
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_concurrent_calls():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "UNRATE"
+
+    results = await asyncio.gather(*(flights.run("unemployment", work) for _ in range(5)))
+    assert results == ["UNRATE"] * 5
+    assert calls == 1
+    assert not flights.in_flight("unemployment")
+    await flights.run("unemployment", work)
+    assert calls == 2
+
+@pytest.mark.asyncio
+async def test_single_flight_shares_errors():
+    flights = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise ValueError("bad series")
+
+    results = await asyncio.gather(*(flights.run("bad", fail) for _ in range(3)), return_exceptions=True)
+    assert all(isinstance(result, ValueError) for result in results)
+
+@pytest.mark.asyncio
+async def test_single_flight_survives_leader_cancellation():
+    flights = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return "UNRATE"
+
+    leader = asyncio.create_task(flights.run("unemployment", work))
+    await asyncio.sleep(0)
+    followers = [asyncio.create_task(flights.run("unemployment", work)) for _ in range(3)]
+    await asyncio.sleep(0.01)
+    leader.cancel()
+    assert await asyncio.gather(*followers) == ["UNRATE"] * 3
+    assert leader.cancelled()
+    assert calls == 2
+
+    # A cancelled follower is still cancelled
+    leader = asyncio.create_task(flights.run("unemployment", work))
+    await asyncio.sleep(0)
+    follower = asyncio.create_task(flights.run("unemployment", work))
+    await asyncio.sleep(0.01)
+    follower.cancel()
+    assert await leader == "UNRATE"
+    assert follower.cancelled()
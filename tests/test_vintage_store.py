@@ -0,0 +1,93 @@
+from vintage_store import ingest_vintages_zip, get_snapshot, get_vintage_dates, checkpoints_table_name, _checkpoint_dates
+from series_store import connect
+from pull_fred import pull_vintages_async
+from datetime import date, timedelta
+import zipfile
+import random
+import pytest
+import io
+
+
+def revised_series(seed: int = 0) -> tuple[str, dict]:
+    """
+    A quarterly series published monthly whose last few quarters are revised at every release,
+    as an "obs. by real-time period" CSV with a row per vintage, and the value of every period
+    in every vintage
+    """
+    rng = random.Random(seed)
+    vintages = [date(2000 + month // 12, month % 12 + 1, 28) for month in range(4, 12 * 12)]
+    published = {}
+    for vintage in vintages:
+        previous = published[vintages[vintages.index(vintage) - 1]] if vintage != vintages[0] else {}
+        values = dict(previous)
+        last_quarter = date(vintage.year, (vintage.month - 1) // 3 * 3 + 1, 1)
+        quarter = date(2000, 1, 1)
+        while quarter < last_quarter:
+            if quarter not in values:
+                values[quarter] = round(rng.uniform(100, 200), 1)
+            elif quarter >= date(last_quarter.year - 1, last_quarter.month, 1) and rng.random() < 0.5:
+                values[quarter] = round(values[quarter] + rng.uniform(-1, 1), 1)
+            quarter = date(quarter.year + (quarter.month + 2) // 12, (quarter.month + 2) % 12 + 1, 1)
+        published[vintage] = values
+
+    lines = ["period_start_date,GDPTEST,realtime_start_date,realtime_end_date\n"]
+    for i, vintage in enumerate(vintages):
+        end = "" if i == len(vintages) - 1 else (vintages[i + 1] - timedelta(days=1)).isoformat()
+        for quarter, value in published[vintage].items():
+            lines.append(f"{quarter},{value},{vintage},{end}\n")
+    return "".join(lines), published
+
+
+def vintages_zip(csv_text: str) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zip_ref:
+        zip_ref.writestr("obs._by_real-time_period.csv", csv_text)
+    return buffer.getvalue()
+
+
+def expected_snapshot(published: dict, as_of: date) -> list[tuple]:
+    vintage = max((vintage for vintage in published if vintage <= as_of), default=None)
+    return [] if vintage is None else sorted(published[vintage].items())
+
+
+def test_snapshots_match_every_vintage(tmp_path):
+    csv_text, published = revised_series()
+    zip_path = tmp_path / "GDPTEST_vintages.zip"
+    zip_path.write_bytes(vintages_zip(csv_text))
+    db_path = tmp_path / "fred.duckdb"
+    table_name = ingest_vintages_zip(zip_path, "GDPTEST", db_path)
+
+    conn = connect(db_path)
+    stored = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    checkpoint_rows = conn.execute(f"SELECT COUNT(*) FROM {checkpoints_table_name('GDPTEST')}").fetchone()[0]
+    assert stored < sum(len(values) for values in published.values()) / 5
+    assert checkpoint_rows <= 2 * stored
+    vintages = sorted(published)
+    changed = [vintages[0]] + [new for old, new in zip(vintages, vintages[1:]) if published[new] != published[old]]
+    assert get_vintage_dates("GDPTEST", db_path) == changed
+
+    for vintage in sorted(published):
+        assert get_snapshot("GDPTEST", vintage, db_path) == expected_snapshot(published, vintage)
+        assert get_snapshot("GDPTEST", vintage + timedelta(days=3), db_path) == expected_snapshot(published, vintage)
+    assert get_snapshot("GDPTEST", date(1999, 1, 1), db_path) == []
+
+
+def test_checkpoint_dates():
+    # 10 periods first published, then 5 revisions a vintage: a checkpoint every third vintage
+    vintages = [(date(2000, 1, 1), 10, 10)] + [(date(2000, 1, 1) + timedelta(days=i), 5, 0) for i in range(1, 7)]
+    assert _checkpoint_dates(vintages) == [date(2000, 1, 1), date(2000, 1, 4), date(2000, 1, 7)]
+
+
+@pytest.mark.asyncio
+async def test_pull_vintages(fred_stub, tmp_path, monkeypatch):
+    csv_text, published = revised_series(seed=1)
+    fred_stub.route("series/observations", lambda params: vintages_zip(csv_text))
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    result = await pull_vintages_async("GDPTEST", tmp_path / "fred.duckdb")
+    assert result["success"] is True
+    assert result["table_name"] == "gdptest_vintages"
+    params = fred_stub.requests[0][1]
+    assert (params["realtime_start"], params["realtime_end"]) == ("1776-07-04", "9999-12-31")
+    as_of = date(2005, 6, 1)
+    assert get_snapshot("GDPTEST", as_of, tmp_path / "fred.duckdb") == expected_snapshot(published, as_of)
@@ -0,0 +1,180 @@
+"""
+Point-in-time (ALFRED) storage of every vintage of a series.
+
+Observations are stored as "obs. by real-time period": one row per value and the real-time
+interval [realtime_start_date, realtime_end_date] it was the published value for, with a NULL
+end while it still is. Consecutive intervals with the same value are merged on ingest, so a
+value is only stored again when a release changed it.
+
+Rows are sorted by realtime_start_date, and an interval index of checkpoints keeps, for a few
+vintage dates, the rows in effect on that date. The snapshot as of a date is the rows of the
+latest checkpoint before it that are still in effect, plus the rows that started between the
+checkpoint and the date. A checkpoint is added once the rows started since the previous one
+outnumber the rows it holds, so the index at most doubles the storage and a snapshot reads
+about twice the rows it returns, however many vintages the series has.
+"""
+from datetime import date
+from pathlib import Path
+import logfire
+
+from series_store import SERIES_DB_PATH, connect, load_zip, series_table_name
+from metrics import metrics
+
+
+def vintages_table_name(series_id: str) -> str:
+    return f"{series_table_name(series_id)}_vintages"
+
+
+def checkpoints_table_name(series_id: str) -> str:
+    return f"{vintages_table_name(series_id)}_checkpoints"
+
+
+def _checkpoint_dates(vintages: list[tuple]) -> list[date]:
+    """Pick checkpoints from (vintage date, rows started, periods first published) in vintage order"""
+    checkpoints, in_effect, since_checkpoint, checkpoint_size = [], 0, 0, 0
+    for vintage, started, new_periods in vintages:
+        in_effect += new_periods
+        since_checkpoint += started
+        if not checkpoints or since_checkpoint > checkpoint_size:
+            checkpoints.append(vintage)
+            since_checkpoint, checkpoint_size = 0, in_effect
+    return checkpoints
+
+
+def ingest_vintages_zip(zip_path: Path, series_id: str, db_path: Path = SERIES_DB_PATH) -> str:
+    """
+    Load an "obs. by real-time period" zip covering every vintage into the vintage store.
+
+    Parameters
+    ----------
+    zip_path : Path
+        Path to the zip file downloaded by pull_fred.pull_vintages
+    series_id : str
+        FRED series ID the zip belongs to
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    str
+        Name of the vintages table
+    """
+    table_name = vintages_table_name(series_id)
+    staging = f"{table_name}_staging"
+    conn = connect(db_path)
+    raw_rows = load_zip(conn, staging, zip_path)
+    value_column = conn.execute(f"DESCRIBE {staging}").fetchall()[1][0]
+    conn.execute(f"""
+        CREATE OR REPLACE TABLE {table_name} AS
+        WITH intervals AS (
+            SELECT period_start_date, "{value_column}" AS value, realtime_start_date,
+                NULLIF(realtime_end_date, DATE '9999-12-31') AS realtime_end_date
+            FROM {staging}
+        ), changes AS (
+            SELECT *, (
+                lag(realtime_end_date) OVER w IS NULL
+                OR value IS DISTINCT FROM lag(value) OVER w
+                OR realtime_start_date <> lag(realtime_end_date) OVER w + 1
+            )::INTEGER AS changed
+            FROM intervals WINDOW w AS (PARTITION BY period_start_date ORDER BY realtime_start_date)
+        ), islands AS (
+            SELECT *, sum(changed) OVER (PARTITION BY period_start_date ORDER BY realtime_start_date) AS island FROM changes
+        )
+        SELECT period_start_date, any_value(value) AS "{value_column}", min(realtime_start_date) AS realtime_start_date,
+            CASE WHEN bool_or(realtime_end_date IS NULL) THEN NULL ELSE max(realtime_end_date) END AS realtime_end_date
+        FROM islands
+        GROUP BY period_start_date, island
+        ORDER BY realtime_start_date, period_start_date
+    """)
+    conn.execute(f"DROP TABLE {staging}")
+
+    vintages = conn.execute(f"""
+        SELECT realtime_start_date, COUNT(*), COUNT(*) FILTER (WHERE first_vintage)
+        FROM (
+            SELECT realtime_start_date,
+                realtime_start_date = min(realtime_start_date) OVER (PARTITION BY period_start_date) AS first_vintage
+            FROM {table_name}
+        )
+        GROUP BY 1 ORDER BY 1
+    """).fetchall()
+    checkpoints = _checkpoint_dates(vintages)
+    conn.execute(
+        f"""
+        CREATE OR REPLACE TABLE {checkpoints_table_name(series_id)} AS
+        SELECT c.checkpoint_date, v.period_start_date, v."{value_column}", v.realtime_end_date
+        FROM (SELECT unnest(?::DATE[]) AS checkpoint_date) AS c
+        JOIN {table_name} AS v
+            ON v.realtime_start_date <= c.checkpoint_date
+            AND (v.realtime_end_date IS NULL OR v.realtime_end_date >= c.checkpoint_date)
+        ORDER BY c.checkpoint_date, v.period_start_date
+        """,
+        [checkpoints],
+    )
+    row_count = conn.execute(f"SELECT COUNT(*) FROM {table_name}").fetchone()[0]
+    metrics.inc("rows_ingested_total", row_count)
+    logfire.info(
+        f"Stored {len(vintages)} vintages of {series_id} as {row_count} intervals "
+        f"(from {raw_rows} rows) with {len(checkpoints)} checkpoints"
+    )
+    return table_name
+
+
+def get_vintage_dates(series_id: str, db_path: Path = SERIES_DB_PATH) -> list[date]:
+    """
+    Dates of every release that changed the series
+
+    Parameters
+    ----------
+    series_id : str
+        FRED series ID
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    list[date]
+        Vintage dates, oldest first
+    """
+    rows = connect(db_path).execute(
+        f"SELECT DISTINCT realtime_start_date FROM {vintages_table_name(series_id)} ORDER BY 1"
+    ).fetchall()
+    return [row[0] for row in rows]
+
+
+def get_snapshot(series_id: str, as_of: date, db_path: Path = SERIES_DB_PATH) -> list[tuple]:
+    """
+    The series as it was published on a date
+
+    Parameters
+    ----------
+    series_id : str
+        FRED series ID, pulled with pull_fred.pull_vintages
+    as_of : date
+        Real-time date to look the series up as of
+    db_path : Path, optional
+        Path to the DuckDB database file. Defaults to SERIES_DB_PATH
+
+    Returns
+    -------
+    list[tuple]
+        Rows of (period_start_date, value) known on that date, by period. Empty before the first vintage.
+    """
+    conn = connect(db_path)
+    table_name = vintages_table_name(series_id)
+    checkpoints = checkpoints_table_name(series_id)
+    checkpoint = conn.execute(f"SELECT max(checkpoint_date) FROM {checkpoints} WHERE checkpoint_date <= ?", [as_of]).fetchone()[0]
+    if checkpoint is None:
+        return []
+    value_column = conn.execute(f"DESCRIBE {table_name}").fetchall()[1][0]
+    # Both tables are sorted on the column compared with a constant here, so DuckDB can skip row groups that cannot match
+    return conn.execute(
+        f"""
+        SELECT period_start_date, "{value_column}" FROM {checkpoints}
+        WHERE checkpoint_date = ? AND (realtime_end_date IS NULL OR realtime_end_date >= ?)
+        UNION ALL
+        SELECT period_start_date, "{value_column}" FROM {table_name}
+        WHERE realtime_start_date > ? AND realtime_start_date <= ? AND (realtime_end_date IS NULL OR realtime_end_date >= ?)
+        ORDER BY period_start_date
+        """,
+        [checkpoint, as_of, checkpoint, as_of, as_of],
+    ).fetchall()